@@ -26,10 +26,13 @@ router = APIRouter(prefix="/api", tags=["Dashboard / 仪表盘"])
 
 
 @router.get("/manual-plans", response_model=list[ManualPlanRead])
-def list_manual_plans(db: Session = Depends(get_db)):
+def list_manual_plans(
+    limit: int | None = Query(None, ge=1, description="返回记录数量，默认全部 / Number of records to return (default: all)"),
+    db: Session = Depends(get_db),
+):
     """获取手动计划列表 / Get Manual Plans List"""
     service = ManualPlanService(db)
-    return service.list_all()
+    return service.list_all(limit=limit)
 
 
 @router.post("/manual-plans", response_model=ManualPlanRead)
@@ -271,16 +274,7 @@ def get_realtime_dashboard(
     
     # 检查是否有待执行的手动计划在1分钟内
     manual_plan_service = ManualPlanService(db)
-    pending_plans = manual_plan_service.get_pending_plans()
-    now = datetime.now(timezone.utc)
-    has_upcoming_trade = False
-    
-    for plan in pending_plans:
-        if plan.listing_time > now:
-            time_diff = (plan.listing_time - now).total_seconds()
-            if 0 < time_diff <= 60.0:  # 1分钟内
-                has_upcoming_trade = True
-                break
+    has_upcoming_trade = manual_plan_service.has_plan_due_within(60.0)  # 1分钟内
     
     # 持仓信息（使用批量获取价格，提高响应速度）
     positions = position_service.get_active_positions()
@@ -539,7 +533,7 @@ def update_position_exit_params(
                 # 检查币安上是否有该持仓
                 found = False
                 for bp in binance_positions:
-                    if bp["symbol"] == position.symbol and bp["side"] == position.side:
+                    if bp.symbol == position.symbol and bp.side == position.side:
                         # 持仓在币安上存在，但数据库状态错误，修复状态
                         old_status = position.status
                         position.status = PositionStatus.ACTIVE
@@ -79,11 +79,18 @@ class Settings(BaseSettings):
     binance_rest_fail_cooldown: float = Field(10.0, description="连续失败后再次记录警告的冷却时间（秒）")
     price_cache_ttl: float = Field(1.0, description="价格缓存时间（秒），默认1秒")
     balance_cache_ttl: float = Field(2.0, description="余额缓存时间（秒），默认2秒")
+    exchange_info_refresh_interval: float = Field(3600.0, description="交易对精度（exchangeInfo）预加载后的刷新间隔（秒），默认1小时，设为0则只在启动时加载一次")
+    leverage_cache_ttl: float = Field(300.0, description="已设置杠杆的缓存时间（秒），期间相同交易对、相同杠杆不再重复请求，设为0则每次下单都设置")
+    position_sync_full_interval: float = Field(30.0, description="币安持仓快照（交易对/方向/数量/入场价）未变化时，跳过数据库对账的最长时间（秒），设为0则每次都完整同步")
+    position_mode_cache_ttl: float = Field(300.0, description="账户持仓模式（单向/双向）缓存时间（秒），默认5分钟")
+    execution_balance_max_age: float = Field(0.5, description="下单前可接受的余额缓存时长（秒），设为0则每次下单都重新查询余额")
     websocket_price_enabled: bool = Field(True, description="是否启用WebSocket价格订阅服务，启用后可大幅降低价格获取延迟")
     websocket_price_symbols: str | None = Field(None, env="WEBSOCKET_PRICE_SYMBOLS", description="WebSocket订阅的交易对列表（逗号分隔），如 'BTCUSDT,ETHUSDT'，如果为空则使用默认列表")
+    user_data_stream_enabled: bool = Field(True, description="是否启用币安用户数据流（ORDER_TRADE_UPDATE），启用后订单成交通过推送确认，断线时回退到REST查单")
     websocket_subscribe_before_minutes: float = Field(5.0, description="在执行交易前多少分钟开始订阅WebSocket价格（默认5分钟）")
     terminal_log_level: str = Field("INFO", env="TERMINAL_LOG_LEVEL", description="终端日志最低级别（INFO/DEBUG/WARNING等）")
     terminal_key_events_only: bool = Field(True, env="TERMINAL_KEY_EVENTS_ONLY", description="是否只在终端输出关键事件（仍会显示WARNING及以上）")
+    execution_detail_logs: bool = Field(True, env="EXECUTION_DETAIL_LOGS", description="是否输出下单前的余额/数量/保证金明细日志（关闭后下单路径不再格式化这些日志）")
     file_log_level: str = Field("DEBUG", env="FILE_LOG_LEVEL", description="写入日志文件的最低级别")
     file_log_rotation: str = Field("1 day", env="FILE_LOG_ROTATION", description="日志文件轮转策略，例如 '1 day' 或 '100 MB'")
     file_log_retention: str = Field("7 days", env="FILE_LOG_RETENTION", description="日志文件的保留时间或数量，例如 '7 days' 或 '10 files'")
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import sys
+from functools import lru_cache
 from pathlib import Path
 from typing import Callable
 
@@ -11,6 +12,8 @@ from loguru import logger
 from app.core.config import get_settings
 
 _LOGGING_CONFIGURED = False
+# 所有输出端中最低的日志级别编号；低于它的关键事件任何地方都不会输出，可以跳过格式化
+_MIN_ENABLED_LEVEL_NO = 0
 
 
 def _project_root() -> Path:
@@ -28,6 +31,14 @@ def _normalize_level(level_name: str | None, fallback: str) -> str:
         return fallback
 
 
+@lru_cache(maxsize=None)
+def _key_event_level(level: str) -> tuple[str, int]:
+    """关键事件级别名称 -> (规范化名称, 级别编号)，避免每条日志都查询 logger.level"""
+
+    normalized = _normalize_level(level, "INFO")
+    return normalized, logger.level(normalized).no
+
+
 def _build_console_filter(min_level_no: int, key_events_only: bool) -> Callable[[dict], bool]:
     warning_no = logger.level("WARNING").no
 
@@ -44,9 +55,15 @@ def _build_console_filter(min_level_no: int, key_events_only: bool) -> Callable[
 
 
 def log_key_event(level: str, message: str, *args, **kwargs) -> None:
-    """用于标记必须输出到终端的关键事件。"""
+    """用于标记必须输出到终端的关键事件。
 
-    normalized = _normalize_level(level, "INFO")
+    参数按 %s 模板传入（log_key_event("INFO", "持仓 %s 已关闭", position_id)），
+    级别低于所有输出端时直接返回，不做任何字符串格式化。
+    """
+
+    normalized, level_no = _key_event_level(level)
+    if level_no < _MIN_ENABLED_LEVEL_NO:
+        return
     if args and "%s" in message:
         try:
             message = message % args
@@ -59,7 +76,7 @@ def log_key_event(level: str, message: str, *args, **kwargs) -> None:
 def configure_logging() -> None:
     """配置 Loguru：终端只显示关键事件/高等级日志，文件保留完整内容。"""
 
-    global _LOGGING_CONFIGURED
+    global _LOGGING_CONFIGURED, _MIN_ENABLED_LEVEL_NO
     if _LOGGING_CONFIGURED:
         return
 
@@ -95,5 +112,6 @@ def configure_logging() -> None:
         diagnose=False,
     )
 
+    _MIN_ENABLED_LEVEL_NO = min(logger.level(console_level).no, logger.level(file_level).no)
     _LOGGING_CONFIGURED = True
 
@@ -2,13 +2,18 @@ import os
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from loguru import logger
+from sqlalchemy import update
 
 from app.core.config import get_settings
 from app.db.session import SessionLocal
 from app.models.enums import ManualPlanStatus
+from app.models.manual_plan import ManualPlan
+from app.services.binance_service import BinanceFuturesClient
+from app.services.binance_websocket_service import get_websocket_price_service
 from app.services.execution_service import ExecutionService
 from app.services.manual_plan_service import ManualPlanService
 from app.services.position_service import PositionService
@@ -75,7 +80,6 @@ def start_scheduler() -> None:
 
     def execute_manual_plans() -> None:
         """执行手动计划，支持精确模式（毫秒级精度）"""
-        from datetime import datetime, timezone
         global _manual_executor_running, _manual_executor_start_time
         
         # 检查调度器是否还在运行，避免在关闭后执行
@@ -103,12 +107,10 @@ def start_scheduler() -> None:
                 # 1. 先处理已到执行时间的计划（立即执行）
                 # 注意：只处理状态为 PENDING 的计划，避免重复执行已失败的计划
                 due_plans = service.due_plans()
+                claimed = []
                 for plan in due_plans:
                     # 使用数据库级别的原子更新来防止并发执行
                     # 尝试将状态从 PENDING 更新为 EXECUTING
-                    from sqlalchemy import update
-                    from app.models.manual_plan import ManualPlan
-                    
                     result = db.execute(
                         update(ManualPlan)
                         .where(ManualPlan.id == plan.id)
@@ -124,7 +126,30 @@ def start_scheduler() -> None:
                     
                     # 重新加载计划以获取最新状态
                     db.refresh(plan)
-                    
+                    claimed.append(plan)
+                
+                if len(claimed) > 1 and settings.order_type.upper() == "MARKET":
+                    # 多个计划同时到期：共享下单前查询并通过批量下单接口提交
+                    try:
+                        outcomes = executor.execute_manual_plans_batch(claimed)
+                    except Exception as exc:
+                        outcomes = {plan.id: exc for plan in claimed}
+                    for plan in claimed:
+                        exc = outcomes.get(plan.id)
+                        if exc is None:
+                            service.mark_status(plan, ManualPlanStatus.EXECUTED)
+                            logger.info("计划 {} 批量执行完成", plan.id)
+                        else:
+                            logger.opt(exception=exc).error("手动计划 {} 执行失败: {}", plan.id, exc)
+                            try:
+                                service.mark_status(plan, ManualPlanStatus.FAILED)
+                            except Exception as status_exc:
+                                logger.error("标记计划 {} 状态失败: {}", plan.id, status_exc)
+                        if plan.id in _precision_threads:
+                            del _precision_threads[plan.id]
+                    claimed = []
+                
+                for plan in claimed:
                     try:
                         executor.execute_manual_plan(plan)
                         service.mark_status(plan, ManualPlanStatus.EXECUTED)
@@ -147,8 +172,6 @@ def start_scheduler() -> None:
                     now = datetime.now(timezone.utc)
                     pending_plans = service.get_pending_plans()
                     
-                    # 导入WebSocket服务
-                    from app.services.binance_websocket_service import get_websocket_price_service
                     ws_service = get_websocket_price_service()
                     
                     for plan in pending_plans:
@@ -207,9 +230,6 @@ def start_scheduler() -> None:
                                         delay = (actual_exec_time - listing_time).total_seconds() * 1000  # 转换为毫秒
                                         
                                         with SessionLocal() as db_exec:
-                                            from app.models.manual_plan import ManualPlan
-                                            from sqlalchemy import update
-                                            
                                             # 使用数据库级别的原子更新来防止并发执行
                                             result = db_exec.execute(
                                                 update(ManualPlan)
@@ -285,6 +305,8 @@ def start_scheduler() -> None:
 
     # 动态刷新频率配置 - 分离监控和同步任务，保证高精度监控
     HIGH_FREQ_INTERVAL = 0.5  # 有持仓时：500ms（高精度监控，不包含同步操作）
+    RELAXED_FREQ_INTERVAL = 1.5  # 所有持仓都远离退出触发价时：1.5秒
+    FAR_FROM_TRIGGER_PCT = 0.03  # 当前价距最近触发价超过3%视为远离
     NORMAL_FREQ_INTERVAL = 2.0  # 无持仓时：2秒（减少不必要的检查）
     BINANCE_SYNC_INTERVAL = 5.0  # 同步币安持仓的间隔（秒），独立任务，不阻塞监控
     
@@ -368,14 +390,16 @@ def start_scheduler() -> None:
                     service = PositionService(db, settings)
                     
                     # 只监控，不同步（同步由独立任务处理）
-                    service.monitor_positions(sync_from_binance=False)
+                    # 返回距最近退出触发价的比例，没有持仓时为 None（用于动态调整刷新频率）
+                    nearest_trigger_pct = service.monitor_positions(sync_from_binance=False)
                     
-                    # 获取活跃持仓数量（用于动态调整刷新频率）
-                    active_positions = service.get_active_positions()
-                    has_positions = len(active_positions) > 0
-                    
-                    # 动态调整刷新频率
-                    base_interval = HIGH_FREQ_INTERVAL if has_positions else NORMAL_FREQ_INTERVAL
+                    # 动态调整刷新频率：有持仓接近触发价时高频，全部远离时放缓，无持仓时正常
+                    if nearest_trigger_pct is None:
+                        base_interval, mode = NORMAL_FREQ_INTERVAL, "正常模式"
+                    elif nearest_trigger_pct >= FAR_FROM_TRIGGER_PCT:
+                        base_interval, mode = RELAXED_FREQ_INTERVAL, "远离触发价"
+                    else:
+                        base_interval, mode = HIGH_FREQ_INTERVAL, "高频模式"
                     new_interval = max(base_interval, MIN_POSITION_MONITOR_INTERVAL)
                     
                     # 如果频率需要改变，更新任务
@@ -389,8 +413,7 @@ def start_scheduler() -> None:
                                 seconds=new_interval
                             )
                             logger.info("持仓监控刷新频率已调整为: {:.3f}秒（{}毫秒） - {}", 
-                                      new_interval, int(new_interval * 1000),
-                                      "高频模式" if has_positions else "正常模式")
+                                      new_interval, int(new_interval * 1000), mode)
             except Exception as exc:
                 if scheduler.running:
                     logger.error("持仓监控任务执行失败: {}", exc, exc_info=True)
@@ -404,6 +427,29 @@ def start_scheduler() -> None:
         # 这样即使执行时间较长，也不会影响下一次调度
         _monitor_executor.submit(_execute_monitor)
 
+    def refresh_exchange_info() -> None:
+        """预加载/刷新全部交易对精度，下单时直接命中缓存"""
+        try:
+            count = BinanceFuturesClient(settings).prefetch_exchange_info()
+            logger.debug("交易对精度已刷新: {} 个交易对", count)
+        except Exception as exc:
+            logger.warning("预加载交易对精度失败（下单时按需获取）: {}", exc)
+
+    # 注册交易对精度预加载任务（启动后立即执行一次，不阻塞启动流程）
+    if not scheduler.get_job("exchange-info-refresh"):
+        if settings.exchange_info_refresh_interval > 0:
+            scheduler.add_job(
+                refresh_exchange_info,
+                "interval",
+                seconds=settings.exchange_info_refresh_interval,
+                id="exchange-info-refresh",
+                replace_existing=True,
+                coalesce=True,
+                next_run_time=datetime.now(timezone.utc),
+            )
+        else:
+            scheduler.add_job(refresh_exchange_info, id="exchange-info-refresh", replace_existing=True)
+
     # 注册独立的币安持仓同步任务（低频，不阻塞监控）
     if not scheduler.get_job("binance-sync"):
         scheduler.add_job(
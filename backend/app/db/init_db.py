@@ -100,6 +100,12 @@ def ensure_execution_log_schema() -> None:
             ADD COLUMN IF NOT EXISTS max_slippage_pct NUMERIC(5, 4) DEFAULT 0.5 NOT NULL
             """
         ),
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_manual_plans_codex_status_listing_time
+            ON manual_plans_codex (status, listing_time)
+            """
+        ),
         text(
             """
             ALTER TABLE trade_plans_codex
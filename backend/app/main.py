@@ -56,6 +56,15 @@ def on_startup() -> None:
                 logger.info("WebSocket价格订阅服务已启动（按需订阅模式：交易前5分钟自动订阅）")
         except Exception as exc:
             logger.error("启动WebSocket价格订阅服务失败: {}", exc, exc_info=True)
+    
+    # 启动用户数据流服务（订单成交通过推送确认，减少REST查单）
+    if settings.user_data_stream_enabled:
+        try:
+            from app.services.binance_user_data_service import get_user_data_stream_service
+            
+            get_user_data_stream_service().start()
+        except Exception as exc:
+            logger.error("启动用户数据流服务失败: {}", exc, exc_info=True)
 
 
 @app.on_event("shutdown")
@@ -102,6 +111,14 @@ def on_shutdown() -> None:
             logger.info("WebSocket价格订阅服务已关闭")
         except Exception as exc:
             logger.warning("关闭WebSocket服务时出错: {}", exc)
+    
+    # 关闭用户数据流服务
+    if settings.user_data_stream_enabled:
+        try:
+            from app.services.binance_user_data_service import get_user_data_stream_service
+            get_user_data_stream_service().stop()
+        except Exception as exc:
+            logger.warning("关闭用户数据流服务时出错: {}", exc)
 
 
 @app.get("/", response_class=HTMLResponse)
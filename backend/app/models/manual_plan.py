@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Enum, Numeric, String, Text
+from sqlalchemy import Column, DateTime, Enum, Index, Numeric, String, Text
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.db.base import Base
@@ -10,6 +10,8 @@ from app.models.enums import ManualPlanStatus
 
 class ManualPlan(Base):
     __tablename__ = "manual_plans_codex"
+    # 调度器每个周期按 status + listing_time 查询到期计划
+    __table_args__ = (Index("ix_manual_plans_codex_status_listing_time", "status", "listing_time"),)
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     symbol = Column(String(50), nullable=False)
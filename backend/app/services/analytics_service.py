@@ -6,8 +6,8 @@ from decimal import Decimal
 
 import httpx
 from loguru import logger
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session, selectinload
 
 from app.core.config import Settings, get_settings
 from app.models.enums import TradePlanStatus
@@ -41,14 +41,18 @@ class HistoricalAnalyzer:
         )
 
     def sync_pending(self) -> None:
-        stmt = select(TradePlan).where(
-            TradePlan.status.in_([TradePlanStatus.QUEUED, TradePlanStatus.ACTIVE, TradePlanStatus.EXITED])
+        # 已有分析结果/没有计划入场时间的计划在 SQL 中过滤，公告一次性预加载，
+        # 避免逐个计划懒加载 analysis 和 announcement（N+1 查询）
+        stmt = (
+            select(TradePlan)
+            .where(
+                TradePlan.status.in_([TradePlanStatus.QUEUED, TradePlanStatus.ACTIVE, TradePlanStatus.EXITED]),
+                TradePlan.planned_entry_time.is_not(None),
+                ~exists().where(TradeAnalysis.trade_plan_id == TradePlan.id),
+            )
+            .options(selectinload(TradePlan.announcement))
         )
-        for plan in self.db.scalars(stmt):
-            if any(plan.analysis):
-                continue
-            if not plan.planned_entry_time:
-                continue
+        for plan in self.db.scalars(stmt).all():
             window_end = plan.planned_entry_time + self._window_delta
             bars = self.fetch_bars(plan, window_end)
             if not bars:
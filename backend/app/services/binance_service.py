@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
 import time
 from collections import defaultdict
-from decimal import Decimal
+from dataclasses import asdict, dataclass
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from datetime import datetime, timezone
+from decimal import ROUND_DOWN, Decimal
 from threading import Lock
-from typing import Any
+from typing import Any, NoReturn
+from urllib.parse import urlencode
 
 import requests
 from requests import RequestException
+from requests.adapters import HTTPAdapter
 from binance.client import Client
 from loguru import logger
 
@@ -15,21 +23,113 @@ from app.core.config import Settings, get_settings
 from app.services.binance_websocket_service import get_websocket_price_service
 
 
+_DECIMAL_ONE = Decimal("1")
+BATCH_ORDERS_LIMIT = 5  # /fapi/v1/batchOrders 单次最多下单数量
+HTTP_POOL_SIZE = 32  # 共享 HTTP 会话的连接池大小（监控/同步/下单线程并发访问）
+KLINES_CACHE_TTL = 60.0  # 中断恢复K线的缓存时间（秒），相邻周期的同一查询只需补拉缓存之后的K线
+
+
+def _power_of_ten_quantum(step: Decimal) -> Decimal | None:
+    """如果 step 是 10 的整数次幂（0.001、0.1、1、10 …），返回可直接用于 quantize 的规范化值，否则返回 None"""
+    if step <= 0:
+        return None
+    normalized = step.normalize()
+    return normalized if normalized.as_tuple().digits == (1,) else None
+
+
+def _symbol_info_from_filters(filters: list[dict]) -> dict:
+    """从 exchangeInfo 的 filters 中提取数量精度（stepSize）和价格精度（tickSize）"""
+    symbol_info = {}
+    for f in filters:
+        if f.get("filterType") == "LOT_SIZE":
+            symbol_info["stepSize"] = Decimal(f.get("stepSize", "1"))
+        elif f.get("filterType") == "PRICE_FILTER":
+            symbol_info["tickSize"] = Decimal(f.get("tickSize", "0.01"))
+    
+    # 如果没找到，使用默认值
+    if "stepSize" not in symbol_info:
+        symbol_info["stepSize"] = Decimal("0.1")  # 默认值
+    if "tickSize" not in symbol_info:
+        symbol_info["tickSize"] = Decimal("0.01")  # 默认值
+    # 大部分交易对的精度是 10 的幂，预先算好 quantize 用的步长
+    symbol_info["stepQuantum"] = _power_of_ten_quantum(symbol_info["stepSize"])
+    symbol_info["tickQuantum"] = _power_of_ten_quantum(symbol_info["tickSize"])
+    return symbol_info
+
+
+def quantize_to_step(value: Decimal, step: Decimal, quantum: Decimal | None = None) -> Decimal:
+    """按 stepSize/tickSize 向下取整（ROUND_DOWN，保证不超额下单）
+
+    quantum 为 get_symbol_info 预先算好的 10 次幂步长，此时只需一次 quantize；
+    否则回退到 除法 → 取整 → 乘法 的通用路径。
+    """
+    if quantum is not None:
+        return value.quantize(quantum, rounding=ROUND_DOWN)
+    return (value / step).quantize(_DECIMAL_ONE, rounding=ROUND_DOWN) * step
+
+
+def format_decimal(value: Decimal) -> str:
+    """格式化为币安接受的定点字符串，只去掉小数部分末尾的 0"""
+    text = format(value, "f")
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text
+
+
+@dataclass(slots=True)
+class BinancePosition:
+    """币安实际持仓（positionRisk 中 positionAmt != 0 的条目）"""
+
+    symbol: str
+    side: str  # BUY（做多）或 SELL（做空）
+    position_side: str  # LONG, SHORT, or BOTH
+    position_amt: Decimal  # 持仓数量（绝对值）
+    entry_price: Decimal
+    mark_price: Decimal
+    unrealized_profit: Decimal
+    leverage: int
+    update_time: int  # 更新时间戳（毫秒）
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def _raise_api_error(response: requests.Response, context: str, symbol: str) -> NoReturn:
+    """非 200 响应的冷路径：记录币安错误信息并抛出 ValueError"""
+    try:
+        error_data = response.json()
+    except ValueError:
+        logger.error("{} {}: HTTP {} - {}", context, symbol, response.status_code, response.text)
+        response.raise_for_status()
+        raise ValueError(f"{context}: HTTP {response.status_code}")
+    error_msg = error_data.get("msg", f"HTTP {response.status_code}")
+    error_code = error_data.get("code", response.status_code)
+    logger.error("{} {}: {} (code: {})", context, symbol, error_msg, error_code)
+    raise ValueError(f"{context}: {error_msg} (code: {error_code})")
+
+
 class BinanceFuturesClient:
     # 类级别的缓存（所有实例共享）
     _price_cache: dict[str, tuple[Decimal, float]] = {}  # {symbol: (price, timestamp)}
     _balance_cache: dict[str, tuple[float, float]] = {}  # {balance_type: (value, timestamp)}
     _all_prices_cache: dict[str, tuple[dict[str, Decimal], float]] = {}  # {"all": ({symbol: price}, timestamp)}
     _symbol_info_cache: dict[str, dict] = {}  # {symbol: {stepSize, tickSize, ...}}
+    _position_mode_cache: tuple[str, float] | None = None  # (mode, timestamp)，持仓模式极少变化
+    _leverage_cache: dict[str, tuple[int, float]] = {}  # {symbol: (leverage, timestamp)}，本进程已设置的杠杆
+    _klines_cache: dict[tuple, tuple[list[list], float]] = {}  # {(symbol, interval, limit, start): (klines, timestamp)}
     _cache_lock = Lock()
     _rest_failure_streak: int = 0
     _rest_last_failure_ts: float = 0.0
     _rest_last_warning_ts: float = 0.0
+    # 批量取价回退时并发请求单个交易对（类级别共享，避免每个实例各建线程池）
+    _single_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mark-price-fetch")
+    # 所有实例共享一个 HTTP 会话：服务对象按任务周期创建，共享后 keep-alive 连接可跨实例复用，
+    # 不必每次重新 TLS 握手（代理按请求传入，因此不同配置的实例也可共用）
+    _shared_http: requests.Session | None = None
     
     def __init__(self, settings: Settings | None = None) -> None:
         self.settings = settings or get_settings()
-        self._http = requests.Session()
-        self._http.headers.update({"User-Agent": "QuantNewsCodex/1.0"})
+        self._http = BinanceFuturesClient._get_http_session()
         
         # 配置代理（如果设置了 HTTP_PROXY，支持 Clash 等 VPN 代理）
         proxies = None
@@ -44,20 +144,47 @@ class BinanceFuturesClient:
                 logger.info("使用代理: {}", proxy_info)
                 BinanceFuturesClient._proxy_logged = True
         self._proxies = proxies
+        self._client: Client | None = None
         
-        # 使用 Client 类，通过 base_endpoint 参数指定合约交易端点
-        # 注意：禁用 ping 以避免初始化时的网络请求
-        self.client = Client(
-            api_key=self.settings.binance_api_key,
-            api_secret=self.settings.binance_api_secret,
-            base_endpoint="https://fapi.binance.com",  # 币安合约交易 API 端点
-            ping=False,  # 禁用初始化时的 ping，避免网络错误
+        # 预先处理 HMAC 密钥（内外层 SHA-256 状态），每次签名只需 copy() 模板
+        self._hmac_template = (
+            hmac.new(self.settings.binance_api_secret.encode("utf-8"), digestmod=hashlib.sha256)
+            if self.settings.binance_api_secret
+            else None
         )
-        
-        # 如果设置了代理，配置 requests session 的代理
-        # binance 库内部使用 requests，需要手动设置 session 的代理
-        if proxies:
-            self.client.session.proxies.update(proxies)
+
+    @classmethod
+    def _get_http_session(cls) -> requests.Session:
+        """获取共享的 HTTP 会话（首次调用时创建）"""
+        if cls._shared_http is None:
+            with cls._cache_lock:
+                if cls._shared_http is None:
+                    session = requests.Session()
+                    session.headers.update({"User-Agent": "QuantNewsCodex/1.0"})
+                    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._shared_http = session
+        return cls._shared_http
+
+    @property
+    def client(self) -> Client:
+        """python-binance 客户端（只有撤单等少数接口使用，按需创建）"""
+        if self._client is None:
+            # 使用 Client 类，通过 base_endpoint 参数指定合约交易端点
+            # 注意：禁用 ping 以避免初始化时的网络请求
+            client = Client(
+                api_key=self.settings.binance_api_key,
+                api_secret=self.settings.binance_api_secret,
+                base_endpoint="https://fapi.binance.com",  # 币安合约交易 API 端点
+                ping=False,  # 禁用初始化时的 ping，避免网络错误
+            )
+            # 如果设置了代理，配置 requests session 的代理
+            # binance 库内部使用 requests，需要手动设置 session 的代理
+            if self._proxies:
+                client.session.proxies.update(self._proxies)
+            self._client = client
+        return self._client
 
     def _build_proxies(self) -> dict[str, str] | None:
         if self._proxies:
@@ -164,27 +291,26 @@ class BinanceFuturesClient:
         params: dict | None = None,
         data: dict | None = None,
     ) -> requests.Response:
-        import hmac
-        import hashlib
-        from urllib.parse import urlencode
-        from datetime import datetime, timezone
-
-        if not self.settings.binance_api_key or not self.settings.binance_api_secret:
+        if not self.settings.binance_api_key or self._hmac_template is None:
             raise ValueError("API密钥未配置")
 
         params = params.copy() if params else {}
         params["timestamp"] = int(datetime.now(timezone.utc).timestamp() * 1000)
 
         query_string = urlencode(params, doseq=True)
-        signature = hmac.new(
-            self.settings.binance_api_secret.encode("utf-8"),
-            query_string.encode("utf-8"),
-            hashlib.sha256,
-        ).hexdigest()
-        params["signature"] = signature
+        mac = self._hmac_template.copy()
+        mac.update(query_string.encode("utf-8"))
+        params["signature"] = mac.hexdigest()
         headers = {"X-MBX-APIKEY": self.settings.binance_api_key}
         return self._send_request(method, url, params=params, data=data, headers=headers)
 
+    @staticmethod
+    def _handle_response(response: requests.Response, context: str, symbol: str) -> Any:
+        """解析下单/查单响应：成功时直接返回 JSON，失败时交给 _raise_api_error"""
+        if response.status_code == 200:
+            return response.json()
+        _raise_api_error(response, context, symbol)
+
     def get_klines(self, symbol: str, interval: str = "1m", limit: int = 500, start_time: int | None = None, end_time: int | None = None) -> list[list]:
         """获取K线数据（用于恢复中断期间的历史最高/最低价）
         
@@ -199,6 +325,38 @@ class BinanceFuturesClient:
             K线数据列表，每个元素格式：[开盘时间, 开盘价, 最高价, 最低价, 收盘价, 成交量, ...]
         """
         symbol = symbol.upper()
+        cache_key = (symbol, interval, limit, start_time)
+        with BinanceFuturesClient._cache_lock:
+            cached = BinanceFuturesClient._klines_cache.get(cache_key)
+        if cached and time.time() - cached[1] < KLINES_CACHE_TTL:
+            klines, cached_at = cached
+            if not end_time:
+                return klines
+            # 缓存命中时按精确的结束时间补拉最后一根（可能尚未收盘的）K线及之后的部分，
+            # 不会丢掉缓存写入之后到现在的价格（中断恢复需要完整的最高/最低价）
+            tail = self._fetch_klines(symbol, interval, limit, klines[-1][0], end_time)
+            if tail is None:
+                return klines
+            klines = klines[:-1] + tail if tail else klines
+        else:
+            klines = self._fetch_klines(symbol, interval, limit, start_time, end_time)
+            if not klines:
+                return []
+            cached_at = time.time()
+        
+        with BinanceFuturesClient._cache_lock:
+            # 顺带清理过期条目，避免缓存无限增长（补拉尾部不延长有效期，过期后重新完整查询）
+            now = time.time()
+            expired = [k for k, (_, ts) in BinanceFuturesClient._klines_cache.items() if now - ts >= KLINES_CACHE_TTL]
+            for k in expired:
+                del BinanceFuturesClient._klines_cache[k]
+            BinanceFuturesClient._klines_cache[cache_key] = (klines, cached_at)
+        return klines
+
+    def _fetch_klines(
+        self, symbol: str, interval: str, limit: int, start_time: int | None, end_time: int | None
+    ) -> list[list] | None:
+        """请求 /fapi/v1/klines，失败时返回 None"""
         try:
             url = "https://fapi.binance.com/fapi/v1/klines"
             params = {
@@ -216,7 +374,7 @@ class BinanceFuturesClient:
             return response.json()
         except Exception as exc:
             logger.warning("获取K线数据失败 ({}): {}", symbol, exc)
-            return []
+            return None
 
     def get_symbol_info(self, symbol: str) -> dict:
         """获取交易对信息（包括 stepSize 等精度参数），带缓存"""
@@ -228,59 +386,97 @@ class BinanceFuturesClient:
                 return BinanceFuturesClient._symbol_info_cache[symbol]
         
         try:
-            # 获取交易对信息（不需要签名）
-            url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-            response = self._send_request("GET", url)
-            data = response.json()
+            # exchangeInfo 一次返回全部交易对，整体写入缓存，后续其他交易对不再请求
+            symbols_info = self._load_exchange_info()
             
-            # 查找目标交易对
-            symbol_info = {}
-            for s in data.get("symbols", []):
-                if s.get("symbol") == symbol:
-                    # 提取数量精度（stepSize）和价格精度（tickSize）
-                    for f in s.get("filters", []):
-                        if f.get("filterType") == "LOT_SIZE":
-                            step_size = f.get("stepSize", "1")
-                            symbol_info["stepSize"] = Decimal(step_size)
-                        elif f.get("filterType") == "PRICE_FILTER":
-                            tick_size = f.get("tickSize", "0.01")
-                            symbol_info["tickSize"] = Decimal(tick_size)
-                    break
-            
-            # 如果没找到，使用默认值
-            if "stepSize" not in symbol_info:
-                symbol_info["stepSize"] = Decimal("0.1")  # 默认值
-            if "tickSize" not in symbol_info:
-                symbol_info["tickSize"] = Decimal("0.01")  # 默认值
-            
-            # 更新缓存
-            with BinanceFuturesClient._cache_lock:
-                BinanceFuturesClient._symbol_info_cache[symbol] = symbol_info
+            # 未找到的交易对使用默认精度
+            symbol_info = symbols_info.get(symbol)
+            if symbol_info is None:
+                symbol_info = _symbol_info_from_filters([])
+                with BinanceFuturesClient._cache_lock:
+                    BinanceFuturesClient._symbol_info_cache[symbol] = symbol_info
             
             return symbol_info
         except Exception as exc:
             logger.warning("获取交易对信息失败 {}，使用默认精度: {}", symbol, exc)
             # 返回默认值
-            default_info = {"stepSize": Decimal("0.1"), "tickSize": Decimal("0.01")}
+            default_info = {
+                "stepSize": Decimal("0.1"),
+                "tickSize": Decimal("0.01"),
+                "stepQuantum": Decimal("0.1"),
+                "tickQuantum": Decimal("0.01"),
+            }
             with BinanceFuturesClient._cache_lock:
                 BinanceFuturesClient._symbol_info_cache[symbol] = default_info
             return default_info
     
+    def prefetch_exchange_info(self) -> int:
+        """预加载全部交易对的精度到缓存（启动时及定期刷新调用），下单路径的 get_symbol_info 不再访问网络
+        
+        Returns:
+            加载的交易对数量
+        """
+        return len(self._load_exchange_info())
+    
+    def _load_exchange_info(self) -> dict[str, dict]:
+        """请求 exchangeInfo（不需要签名），解析所有交易对的精度并写入缓存
+        
+        Returns:
+            {symbol: symbol_info}
+        """
+        url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+        response = self._send_request("GET", url)
+        data = response.json()
+        
+        symbols_info = {
+            s["symbol"]: _symbol_info_from_filters(s.get("filters", []))
+            for s in data.get("symbols", [])
+            if s.get("symbol")
+        }
+        with BinanceFuturesClient._cache_lock:
+            BinanceFuturesClient._symbol_info_cache.update(symbols_info)
+        return symbols_info
+    
     def get_position_mode(self) -> str:
-        """获取账户持仓模式：ONE_WAY_MODE（单向）或 HEDGE_MODE（双向）"""
+        """获取账户持仓模式：ONE_WAY_MODE（单向）或 HEDGE_MODE（双向），带缓存
+        
+        每次下单都需要持仓模式，缓存后下单路径不再额外等待一次签名请求
+        （币安不允许在有持仓时切换模式，position_mode_cache_ttl 内复用是安全的）。
+        """
+        with BinanceFuturesClient._cache_lock:
+            cached = BinanceFuturesClient._position_mode_cache
+            if cached is not None and time.time() - cached[1] < self.settings.position_mode_cache_ttl:
+                return cached[0]
+        
         try:
             url = "https://fapi.binance.com/fapi/v1/positionSide/dual"
             response = self._signed_request("GET", url)
             data = response.json()
             
             # 返回持仓模式：True 表示双向持仓（HEDGE_MODE），False 表示单向持仓（ONE_WAY_MODE）
-            return "HEDGE_MODE" if data.get("dualSidePosition", False) else "ONE_WAY_MODE"
+            mode = "HEDGE_MODE" if data.get("dualSidePosition", False) else "ONE_WAY_MODE"
+            with BinanceFuturesClient._cache_lock:
+                BinanceFuturesClient._position_mode_cache = (mode, time.time())
+            return mode
         except Exception as exc:
             logger.warning("获取持仓模式失败，默认使用单向持仓: {}", exc)
             return "ONE_WAY_MODE"  # 默认单向持仓
 
     def set_leverage(self, symbol: str, leverage: int) -> None:
-        """设置合约杠杆倍数"""
+        """设置合约杠杆倍数
+        
+        币安的杠杆按交易对持久保存，leverage_cache_ttl 内重复设置相同杠杆时直接跳过
+        （TTL 用于兜底在网页端手动修改杠杆的情况）。
+        """
+        with BinanceFuturesClient._cache_lock:
+            cached = BinanceFuturesClient._leverage_cache.get(symbol)
+        if (
+            cached is not None
+            and cached[0] == leverage
+            and time.time() - cached[1] < self.settings.leverage_cache_ttl
+        ):
+            return
+        
         try:
             url = "https://fapi.binance.com/fapi/v1/leverage"
             params = {
@@ -294,26 +490,40 @@ class BinanceFuturesClient:
                 error_msg = response.json().get("msg", "Unauthorized")
                 logger.error("设置杠杆API认证失败: {} (code: {})", error_msg, response.status_code)
                 raise ValueError(f"API认证失败: {error_msg}")
+            
+            with BinanceFuturesClient._cache_lock:
+                BinanceFuturesClient._leverage_cache[symbol] = (leverage, time.time())
         except Exception as exc:  # pragma: no cover - network
+            # 设置失败时服务端杠杆未知，清除缓存，下次重新设置
+            with BinanceFuturesClient._cache_lock:
+                BinanceFuturesClient._leverage_cache.pop(symbol, None)
             logger.error("设置杠杆失败 {}: {}", symbol, exc)
             raise
 
     def _make_signed_request(self, url: str, params: dict | None = None, method: str = "GET") -> dict:
         """通用的签名请求方法"""
         response = self._signed_request(method, url, params=params)
+        if response.status_code == 200:
+            return response.json()
         if response.status_code == 401:
             error_msg = response.json().get("msg", "Unauthorized")
             logger.error("币安API认证失败: {} (code: {})", error_msg, response.status_code)
             raise ValueError(f"API认证失败: {error_msg}")
         return response.json()
 
-    def get_futures_balance(self) -> Decimal:
-        """获取合约账户可用余额（availableBalance，带缓存）"""
+    def get_futures_balance(self, max_age: float | None = None) -> Decimal:
+        """获取合约账户可用余额（availableBalance，带缓存）
+        
+        Args:
+            max_age: 可接受的缓存最大时长（秒），默认使用 balance_cache_ttl；
+                下单前传入更短的时长，既能拿到足够新的余额，又能让连续执行的计划共享一次查询
+        """
+        ttl = self.settings.balance_cache_ttl if max_age is None else max_age
         # 检查缓存
         with BinanceFuturesClient._cache_lock:
             if "futures" in BinanceFuturesClient._balance_cache:
                 value, timestamp = BinanceFuturesClient._balance_cache["futures"]
-                if time.time() - timestamp < self.settings.balance_cache_ttl:
+                if time.time() - timestamp < ttl:
                     return Decimal(str(value))
         
         try:
@@ -347,6 +557,12 @@ class BinanceFuturesClient:
             logger.error("获取合约账户余额失败: {} (类型: {})", exc, type(exc).__name__)
             raise
 
+    @classmethod
+    def invalidate_futures_balance(cls) -> None:
+        """丢弃合约可用余额缓存：下单成交后保证金已变化，之后的计划必须重新查询"""
+        with cls._cache_lock:
+            cls._balance_cache.pop("futures", None)
+
     def get_futures_wallet_balance(self) -> Decimal:
         """获取合约账户的资金账户（钱包）USDT 余额"""
         try:
@@ -505,12 +721,6 @@ class BinanceFuturesClient:
             
             # 使用钱包API获取余额
             # 注意：sapi 使用 POST 方法
-            import requests
-            import hmac
-            import hashlib
-            from urllib.parse import urlencode
-            from datetime import datetime, timezone
-            
             url = "https://api.binance.com/sapi/v3/asset/getUserAsset"
             wallet_data = self._make_signed_request(url, params={"asset": "USDT"}, method="POST")
             
@@ -610,6 +820,58 @@ class BinanceFuturesClient:
         """获取合约账户余额（保持向后兼容）"""
         return self.get_futures_balance()
 
+    def build_market_order_params(
+        self,
+        symbol: str,
+        side: str,
+        quantity: Decimal,
+        reduce_only: bool = False,
+        position_side: str | None = None,
+    ) -> dict[str, Any]:
+        """构造市价单参数：按 stepSize 向下取整数量，并按持仓模式补充 positionSide/reduceOnly"""
+        # 确保数量精度正确（动态获取交易对的 stepSize）
+        quantity_decimal = Decimal(str(quantity))
+        
+        # 获取交易对的 stepSize（数量精度），向下取整到 stepSize 的倍数
+        symbol_info = self.get_symbol_info(symbol)
+        step_size = symbol_info.get("stepSize", Decimal("0.1"))
+        quantity_decimal = quantize_to_step(quantity_decimal, step_size, symbol_info.get("stepQuantum"))
+        
+        # 格式化数量字符串（去掉小数末尾的0）
+        quantity_str = format_decimal(quantity_decimal)
+        
+        # 检查账户持仓模式，如果是双向持仓模式，需要指定 positionSide
+        try:
+            position_mode = self.get_position_mode()
+            logger.debug("账户持仓模式: %s (symbol=%s, side=%s, reduce_only=%s)", position_mode, symbol, side, reduce_only)
+        except Exception as exc:
+            logger.warning("获取持仓模式失败，默认使用单向持仓: %s", exc)
+            position_mode = "ONE_WAY_MODE"
+        
+        params: dict[str, Any] = {
+            "symbol": symbol,
+            "side": side,
+            "type": "MARKET",
+            "quantity": quantity_str,
+        }
+        
+        # 如果是双向持仓模式，需要指定 positionSide（使用调用方提供的真实方向）
+        if position_mode == "HEDGE_MODE":
+            if position_side:
+                params["positionSide"] = position_side.upper()
+            else:
+                # 回退逻辑：按下单方向推断（保持向后兼容）
+                params["positionSide"] = "LONG" if side == "BUY" else "SHORT"
+            # 在双向持仓模式下，平仓通过 positionSide 和反向 side 确定，不需要 reduceOnly
+            # 官方文档并未强制要求 reduceOnly，且部分情况下会报错 code: -1106
+        elif reduce_only:
+            # 单向持仓模式下，如果是平仓操作，必须添加 reduceOnly 参数
+            # 这样可以确保只减仓不加仓
+            params["reduceOnly"] = "true"
+            logger.info("平仓订单（单向持仓模式）: symbol=%s, side=%s, quantity=%s, reduceOnly=true", symbol, side, quantity_str)
+        
+        return params
+
     def place_market_order(
         self,
         symbol: str,
@@ -628,92 +890,52 @@ class BinanceFuturesClient:
             reduce_only: 是否只减仓（平仓时使用，避免需要额外保证金）
         """
         try:
-            import requests
-            import hmac
-            import hashlib
-            from urllib.parse import urlencode
-            from datetime import datetime, timezone
-            
             if not self.settings.binance_api_key or not self.settings.binance_api_secret:
                 raise ValueError("API密钥未配置")
             
             url = "https://fapi.binance.com/fapi/v1/order"
+            params = self.build_market_order_params(symbol, side, quantity, reduce_only, position_side)
+            params["recvWindow"] = 10000  # 增加到10秒的时间窗口，避免时间戳过期
             
-            # 确保数量精度正确（动态获取交易对的 stepSize）
-            from decimal import Decimal, ROUND_DOWN
-            quantity_decimal = Decimal(str(quantity))
-            
-            # 获取交易对的 stepSize（数量精度）
-            symbol_info = self.get_symbol_info(symbol)
-            step_size = symbol_info.get("stepSize", Decimal("0.1"))
-            
-            # 根据 stepSize 调整数量精度
-            if step_size < 1:
-                # 如果 stepSize < 1，需要向下取整到 stepSize 的倍数
-                quantity_decimal = (quantity_decimal / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
-            else:
-                # 如果 stepSize >= 1，直接向下取整
-                quantity_decimal = (quantity_decimal / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
+            response = self._signed_request("POST", url, params=params)
             
-            # 格式化数量字符串（去掉末尾的0）
-            quantity_str = format(quantity_decimal, 'f').rstrip('0').rstrip('.')
+            return self._handle_response(response, "市价单失败", symbol)
+        except Exception as exc:
+            logger.error("市价单失败 {}: {}", symbol, exc)
+            raise
+
+    def place_batch_orders(self, orders: list[dict[str, Any]]) -> list[dict]:
+        """批量下单（POST /fapi/v1/batchOrders，单次最多5个订单）
+        
+        Args:
+            orders: 订单参数列表（如 build_market_order_params 的返回值）
             
-            # 检查账户持仓模式，如果是双向持仓模式，需要指定 positionSide
-            try:
-                position_mode = self.get_position_mode()
-                logger.debug("账户持仓模式: %s (symbol=%s, side=%s, reduce_only=%s)", position_mode, symbol, side, reduce_only)
-            except Exception as exc:
-                logger.warning("获取持仓模式失败，默认使用单向持仓: %s", exc)
-                position_mode = "ONE_WAY_MODE"
+        Returns:
+            与 orders 顺序一致的结果列表；单个订单失败时对应元素为 {"code": ..., "msg": ...}
+        """
+        if not orders:
+            return []
+        if len(orders) > BATCH_ORDERS_LIMIT:
+            raise ValueError(f"批量下单最多 {BATCH_ORDERS_LIMIT} 个订单，实际 {len(orders)} 个")
+        try:
+            if not self.settings.binance_api_key or not self.settings.binance_api_secret:
+                raise ValueError("API密钥未配置")
             
+            url = "https://fapi.binance.com/fapi/v1/batchOrders"
             params = {
-                "symbol": symbol,
-                "side": side,
-                "type": "MARKET",
-                "quantity": quantity_str,
-                "recvWindow": 10000,  # 增加到10秒的时间窗口，避免时间戳过期
+                # 币安要求订单参数值均为字符串
+                "batchOrders": json.dumps(
+                    [{key: str(value) for key, value in order.items()} for order in orders],
+                    separators=(",", ":"),
+                ),
+                "recvWindow": 10000,
             }
-            
-            # 如果是双向持仓模式，需要指定 positionSide（使用调用方提供的真实方向）
-            if position_mode == "HEDGE_MODE":
-                if position_side:
-                    params["positionSide"] = position_side.upper()
-                else:
-                    # 回退逻辑：按下单方向推断（保持向后兼容）
-                    params["positionSide"] = "LONG" if side == "BUY" else "SHORT"
-                
-                # 在双向持仓模式下，平仓通过 positionSide 和反向 side 确定，不需要 reduceOnly
-                # 官方文档并未强制要求 reduceOnly，且部分情况下会报错 code: -1106
-                if "reduceOnly" in params:
-                    del params["reduceOnly"]
-            else:
-                # 单向持仓模式下，如果是平仓操作，必须添加 reduceOnly 参数
-                # 这样可以确保只减仓不加仓
-                if reduce_only:
-                    params["reduceOnly"] = "true"
-                    logger.info("平仓订单（单向持仓模式）: symbol=%s, side=%s, quantity=%s, reduceOnly=true", symbol, side, quantity_str)
-                else:
-                    if "reduceOnly" in params:
-                        del params["reduceOnly"]
-            
             response = self._signed_request("POST", url, params=params)
             
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("msg", f"HTTP {response.status_code}")
-                    error_code = error_data.get("code", response.status_code)
-                    logger.error("市价单失败 {}: {} (code: {})", symbol, error_msg, error_code)
-                    raise ValueError(f"市价单失败: {error_msg} (code: {error_code})")
-                except ValueError:
-                    raise
-                except Exception:
-                    logger.error("市价单失败 {}: HTTP {} - {}", symbol, response.status_code, response.text)
-                    response.raise_for_status()
-            
-            return response.json()
+            symbols = ",".join(order["symbol"] for order in orders)
+            return self._handle_response(response, "批量下单失败", symbols)
         except Exception as exc:
-            logger.error("市价单失败 {}: {}", symbol, exc)
+            logger.error("批量下单失败: {}", exc)
             raise
 
     def place_limit_order(
@@ -726,9 +948,6 @@ class BinanceFuturesClient:
     ) -> dict:
         """下限价单（直接使用 requests，避免 python-binance 库的 URL 拼接问题）"""
         try:
-            from decimal import ROUND_DOWN
-            from datetime import datetime, timezone
-            
             if not self.settings.binance_api_key or not self.settings.binance_api_secret:
                 raise ValueError("API密钥未配置")
             
@@ -737,29 +956,20 @@ class BinanceFuturesClient:
             # 确保数量精度正确（动态获取交易对的 stepSize）
             quantity_decimal = Decimal(str(quantity))
             
-            # 获取交易对的 stepSize（数量精度）
+            # 获取交易对的 stepSize（数量精度），向下取整到 stepSize 的倍数
             symbol_info = self.get_symbol_info(symbol)
             step_size = symbol_info.get("stepSize", Decimal("0.1"))
-            
-            # 根据 stepSize 调整数量精度
-            if step_size < 1:
-                quantity_decimal = (quantity_decimal / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
-            else:
-                quantity_decimal = (quantity_decimal / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
+            quantity_decimal = quantize_to_step(quantity_decimal, step_size, symbol_info.get("stepQuantum"))
             
             # 格式化数量字符串
-            quantity_str = format(quantity_decimal, 'f').rstrip('0').rstrip('.')
+            quantity_str = format_decimal(quantity_decimal)
             
             # 确保价格精度正确（使用 tickSize）
             tick_size = symbol_info.get("tickSize", Decimal("0.01"))
-            price_decimal = Decimal(str(price))
-            if tick_size < 1:
-                price_decimal = (price_decimal / tick_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * tick_size
-            else:
-                price_decimal = (price_decimal / tick_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * tick_size
+            price_decimal = quantize_to_step(Decimal(str(price)), tick_size, symbol_info.get("tickQuantum"))
             
             # 格式化价格字符串
-            price_str = format(price_decimal, 'f').rstrip('0').rstrip('.')
+            price_str = format_decimal(price_decimal)
             
             # 检查账户持仓模式
             position_mode = self.get_position_mode()
@@ -778,20 +988,7 @@ class BinanceFuturesClient:
             
             response = self._signed_request("POST", url, params=params)
             
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("msg", f"HTTP {response.status_code}")
-                    error_code = error_data.get("code", response.status_code)
-                    logger.error("限价单失败 {}: {} (code: {})", symbol, error_msg, error_code)
-                    raise ValueError(f"限价单失败: {error_msg} (code: {error_code})")
-                except ValueError:
-                    raise
-                except Exception:
-                    logger.error("限价单失败 {}: HTTP {} - {}", symbol, response.status_code, response.text)
-                    response.raise_for_status()
-            
-            return response.json()
+            return self._handle_response(response, "限价单失败", symbol)
         except Exception as exc:
             logger.error("限价单失败 {}: {}", symbol, exc)
             raise
@@ -826,24 +1023,28 @@ class BinanceFuturesClient:
             
             response = self._signed_request("GET", url, params=params)
             
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("msg", f"HTTP {response.status_code}")
-                    error_code = error_data.get("code", response.status_code)
-                    logger.error("查询订单状态失败 {}: {} (code: {})", symbol, error_msg, error_code)
-                    raise ValueError(f"查询订单状态失败: {error_msg} (code: {error_code})")
-                except ValueError:
-                    raise
-                except Exception:
-                    logger.error("查询订单状态失败 {}: HTTP {} - {}", symbol, response.status_code, response.text)
-                    response.raise_for_status()
-            
-            return response.json()
+            return self._handle_response(response, "查询订单状态失败", symbol)
         except Exception as exc:
             logger.error("查询订单状态失败 {}: {}", symbol, exc)
             raise
 
+    def create_listen_key(self) -> str:
+        """创建（或复用）合约用户数据流 listenKey，只需 API Key，无需签名"""
+        if not self.settings.binance_api_key:
+            raise ValueError("API密钥未配置")
+        url = "https://fapi.binance.com/fapi/v1/listenKey"
+        headers = {"X-MBX-APIKEY": self.settings.binance_api_key}
+        response = self._send_request("POST", url, headers=headers)
+        return response.json()["listenKey"]
+
+    def keepalive_listen_key(self) -> None:
+        """延长 listenKey 有效期（币安要求 60 分钟内至少续期一次）"""
+        if not self.settings.binance_api_key:
+            raise ValueError("API密钥未配置")
+        url = "https://fapi.binance.com/fapi/v1/listenKey"
+        headers = {"X-MBX-APIKEY": self.settings.binance_api_key}
+        self._send_request("PUT", url, headers=headers)
+
     def get_mark_price(self, symbol: str) -> Decimal | None:
         """获取单个交易对的标记价格（优先使用WebSocket缓存，回退到HTTP API）"""
         symbol = symbol.upper()
@@ -855,6 +1056,8 @@ class BinanceFuturesClient:
                 price = ws_service.get_price(symbol)
                 if price is not None:
                     return price
+                # 缓存未命中时订阅该交易对，后续请求即可走WebSocket
+                ws_service.subscribe_symbol(symbol)
             except Exception as exc:
                 logger.debug("从WebSocket获取价格失败 {}: {}", symbol, exc)
         
@@ -916,12 +1119,13 @@ class BinanceFuturesClient:
                 # 单个结果
                 prices[data.get("symbol", "")] = Decimal(data.get("markPrice", "0"))
             
-            # 更新缓存
+            # 更新缓存（同一批价格共用一个时间戳，在一次加锁内写入）
+            now = time.time()
             with BinanceFuturesClient._cache_lock:
-                BinanceFuturesClient._all_prices_cache["all"] = (prices, time.time())
+                BinanceFuturesClient._all_prices_cache["all"] = (prices, now)
                 # 同时更新单个价格缓存
                 for symbol, price in prices.items():
-                    BinanceFuturesClient._price_cache[symbol] = (price, time.time())
+                    BinanceFuturesClient._price_cache[symbol] = (price, now)
             
             return prices
         except Exception as exc:
@@ -936,17 +1140,23 @@ class BinanceFuturesClient:
         symbols = [s.upper() for s in symbols]
         result: dict[str, Decimal] = {}
         
-        # 1. 尝试 WebSocket 缓存
+        # 1. 尝试 WebSocket 缓存（纯读取），未命中的交易对合并为一次批量订阅
         if self.settings.websocket_price_enabled:
             try:
                 ws_service = get_websocket_price_service()
                 for symbol in symbols:
                     price = ws_service.get_price(symbol)
                     if price is not None:
-                        result[symbol] = Decimal(str(price))
+                        result[symbol] = price
+                if len(result) < len(symbols):
+                    ws_service.subscribe_batch([s for s in symbols if s not in result])
             except Exception as exc:
                 logger.debug("批量获取 WebSocket 价格失败: {}", exc)
         
+        # WebSocket 已覆盖全部交易对时直接返回，跳过 REST 回退
+        if len(result) == len(set(symbols)):
+            return result
+        
         missing = [s for s in symbols if s not in result]
         
         # 2. 使用批量REST接口一次性获取
@@ -965,47 +1175,46 @@ class BinanceFuturesClient:
                     result[symbol] = cached
             missing = [s for s in symbols if s not in result]
         
-        # 4. 少量 Symbol 无法获取时，逐个调用 REST（限制请求数量以避免超时）
+        # 4. 少量 Symbol 无法获取时，并发调用单个 REST（限制请求数量以避免超时，总耗时约为一次往返）
         if missing:
             MAX_SINGLE_FETCH = 3
-            for symbol in missing[:MAX_SINGLE_FETCH]:
-                price = self.get_mark_price(symbol)
-                if price is not None:
-                    result[symbol] = price
+            futures = {
+                BinanceFuturesClient._single_fetch_pool.submit(self.get_mark_price, symbol): symbol
+                for symbol in missing[:MAX_SINGLE_FETCH]
+            }
+            try:
+                for future in as_completed(futures, timeout=2):
+                    try:
+                        price = future.result()
+                    except Exception as exc:
+                        logger.debug("单独获取标记价格失败 {}: {}", futures[future], exc)
+                        continue
+                    if price is not None:
+                        result[futures[future]] = price
+            except FuturesTimeoutError:
+                pending = [symbol for future, symbol in futures.items() if not future.done()]
+                logger.debug("单独获取标记价格超时，{} 个交易对使用回退价格", len(pending))
             # 其余缺失的使用 entry price 回退（由调用方处理）
         
         return result
     
-    def get_positions_from_binance(self) -> list[dict] | None:
+    def get_positions_from_binance(self, symbol: str | None = None) -> list[BinancePosition] | None:
         """
         从币安API获取所有实际持仓（包括非系统下单的持仓）
-        返回格式: [
-            {
-                "symbol": "BTCUSDT",
-                "positionSide": "LONG" or "SHORT" or "BOTH",
-                "positionAmt": "1.5",  # 持仓数量（正数表示做多，负数表示做空）
-                "entryPrice": "50000.0",  # 入场价格
-                "markPrice": "51000.0",  # 标记价格
-                "unRealizedProfit": "1500.0",  # 未实现盈亏
-                "leverage": "5",  # 杠杆
-                "updateTime": 1234567890000,  # 更新时间戳
-            },
-            ...
-        ]
+        
+        指定 symbol 时只查询该交易对（positionRisk 按交易对过滤，响应只有该交易对的条目）。
+        返回 BinancePosition 列表（positionAmt 为 0 的条目已过滤），
+        接口调用失败时返回 None。
         """
         try:
-            import requests
-            import hmac
-            import hashlib
-            from urllib.parse import urlencode
-            from datetime import datetime, timezone
-            
             if not self.settings.binance_api_key or not self.settings.binance_api_secret:
                 raise ValueError("API密钥未配置")
             
             # 使用 fapi/v2/positionRisk 获取所有持仓信息
             url = "https://fapi.binance.com/fapi/v2/positionRisk"
             params = {"recvWindow": 10000}
+            if symbol:
+                params["symbol"] = symbol.upper()
             response = self._signed_request("GET", url, params=params)
             data = response.json()
             
@@ -1013,24 +1222,19 @@ class BinanceFuturesClient:
             positions = []
             for item in data:
                 position_amt = Decimal(str(item.get("positionAmt", "0")))
-                if abs(position_amt) > Decimal("0"):  # 有持仓
-                    position_side = item.get("positionSide", "BOTH")
-                    symbol = item.get("symbol", "")
-                    
-                    # 确定方向：positionAmt > 0 表示做多，< 0 表示做空
-                    side = "BUY" if position_amt > 0 else "SELL"
-                    
-                    positions.append({
-                        "symbol": symbol,
-                        "side": side,
-                        "position_side": position_side,  # LONG, SHORT, or BOTH
-                        "position_amt": abs(position_amt),  # 持仓数量（绝对值）
-                        "entry_price": Decimal(str(item.get("entryPrice", "0"))),
-                        "mark_price": Decimal(str(item.get("markPrice", "0"))),
-                        "unrealized_profit": Decimal(str(item.get("unRealizedProfit", "0"))),
-                        "leverage": int(item.get("leverage", "1")),
-                        "update_time": int(item.get("updateTime", 0)),
-                    })
+                if position_amt:  # 有持仓
+                    positions.append(BinancePosition(
+                        symbol=item.get("symbol", ""),
+                        # 确定方向：positionAmt > 0 表示做多，< 0 表示做空
+                        side="BUY" if position_amt > 0 else "SELL",
+                        position_side=item.get("positionSide", "BOTH"),
+                        position_amt=abs(position_amt),
+                        entry_price=Decimal(str(item.get("entryPrice", "0"))),
+                        mark_price=Decimal(str(item.get("markPrice", "0"))),
+                        unrealized_profit=Decimal(str(item.get("unRealizedProfit", "0"))),
+                        leverage=int(item.get("leverage", "1")),
+                        update_time=int(item.get("updateTime", 0)),
+                    ))
             
             return positions
         except Exception as exc:
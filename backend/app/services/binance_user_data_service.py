@@ -0,0 +1,287 @@
+"""币安合约用户数据流服务：通过 ORDER_TRADE_UPDATE 推送确认订单状态，替代 REST 轮询"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from threading import Lock
+from typing import Any, Iterable
+
+import websockets
+from loguru import logger
+
+from app.core.config import Settings, get_settings
+from app.services.binance_service import BinanceFuturesClient
+
+BINANCE_USER_DATA_STREAM_URL = "wss://fstream.binance.com/ws/{listen_key}"
+LISTEN_KEY_KEEPALIVE_INTERVAL = 30 * 60  # listenKey 续期间隔（秒），币安有效期为 60 分钟
+RECENT_ORDER_EVENTS_LIMIT = 500  # 保留最近的订单事件，覆盖"推送先于等待注册"的情况
+
+
+def _order_from_event(event: dict[str, Any]) -> dict[str, Any]:
+    """把 ORDER_TRADE_UPDATE 事件转换为与 REST 查单接口相同字段名的字典
+
+    事件格式：{"e":"ORDER_TRADE_UPDATE","T":...,"o":{"s":"BTCUSDT","i":8886774,"X":"FILLED","ap":"50000","z":"0.001",...}}
+    """
+    order = event.get("o") or {}
+    return {
+        "orderId": order.get("i"),
+        "clientOrderId": order.get("c"),
+        "symbol": order.get("s"),
+        "side": order.get("S"),
+        "type": order.get("o"),
+        "status": order.get("X", ""),
+        "price": order.get("p"),
+        "avgPrice": order.get("ap"),
+        "origQty": order.get("q"),
+        "executedQty": order.get("z"),
+        "updateTime": event.get("T"),
+    }
+
+
+class BinanceUserDataStreamService:
+    """币安合约用户数据流服务
+
+    功能：
+    1. 申请 listenKey 并每 30 分钟续期
+    2. 订阅用户数据流，解析 ORDER_TRADE_UPDATE 事件
+    3. 按订单ID唤醒等待中的调用方（concurrent.futures.Future，可在任意线程同步等待）
+    4. 断线/listenKey 过期后按指数退避重连
+
+    与价格订阅服务一样，所有 I/O 都在独立的 asyncio 事件循环线程中执行。
+    """
+
+    def __init__(self, settings: Settings | None = None):
+        self.settings = settings or get_settings()
+        self._client = BinanceFuturesClient(self.settings)
+        self._reconnect_interval = 5  # 初始重连间隔（秒）
+        self._max_reconnect_interval = 60  # 最大重连间隔（秒）
+        self._running = False
+        self._connected = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._consumer: asyncio.Task | None = None
+        self._lock = Lock()
+        self._waiters: dict[str, list[tuple[Future, frozenset[str]]]] = {}  # {order_id: [(future, statuses)]}
+        self._recent_orders: OrderedDict[str, dict[str, Any]] = OrderedDict()  # {order_id: order}
+
+    def start(self) -> None:
+        """启动用户数据流服务（未配置 API Key 时不启动）"""
+        if self._running:
+            logger.warning("用户数据流服务已在运行")
+            return
+        if not self.settings.binance_api_key:
+            logger.warning("币安API密钥未配置，跳过用户数据流服务")
+            return
+
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_event_loop,
+            daemon=True,
+            name="BinanceUserDataStreamService"
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_consumer(), self._loop)
+        logger.info("用户数据流服务已启动")
+
+    def stop(self) -> None:
+        """停止用户数据流服务"""
+        self._running = False
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=5)
+            except Exception as exc:
+                logger.debug("关闭用户数据流连接失败: {}", exc)
+            loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._loop = None
+
+        logger.info("用户数据流服务已停止")
+
+    def is_connected(self) -> bool:
+        """用户数据流当前是否已连接（断线期间调用方应回退到 REST 查单）"""
+        return self._connected
+
+    def wait_for_order(self, order_id: str, statuses: Iterable[str]) -> Future:
+        """注册订单状态等待
+
+        Args:
+            order_id: 订单ID
+            statuses: 期望的订单状态（如 {"FILLED", "PARTIALLY_FILLED"}），任一到达即完成
+
+        Returns:
+            完成时结果为 REST 格式的订单字典；若最近事件已满足条件则直接返回已完成的 Future。
+            调用方超时后应 cancel()，等待记录会随之清理。
+        """
+        future: Future = Future()
+        wanted = frozenset(statuses)
+        with self._lock:
+            order = self._recent_orders.get(order_id)
+            if order is not None and order["status"] in wanted:
+                future.set_result(order)
+                return future
+            self._waiters.setdefault(order_id, []).append((future, wanted))
+        future.add_done_callback(lambda done: self._discard_waiter(order_id, done))
+        return future
+
+    def get_status(self) -> dict[str, Any]:
+        with self._lock:
+            pending = sum(len(waiters) for waiters in self._waiters.values())
+        return {
+            "running": self._running,
+            "connected": self._connected,
+            "pending_orders": pending,
+        }
+
+    def _discard_waiter(self, order_id: str, future: Future) -> None:
+        with self._lock:
+            waiters = self._waiters.get(order_id)
+            if not waiters:
+                return
+            remaining = [item for item in waiters if item[0] is not future]
+            if remaining:
+                self._waiters[order_id] = remaining
+            else:
+                del self._waiters[order_id]
+
+    def _handle_message(self, message: str | bytes) -> bool:
+        """解析用户数据流消息并唤醒对应订单的等待方
+
+        Returns:
+            listenKey 已过期需要重连时返回 True
+        """
+        try:
+            event = json.loads(message)
+        except Exception as exc:
+            logger.error("处理用户数据流消息失败: {}", exc)
+            return False
+
+        event_type = event.get("e") if isinstance(event, dict) else None
+        if event_type == "listenKeyExpired":
+            logger.warning("用户数据流 listenKey 已过期，准备重连")
+            return True
+        if event_type != "ORDER_TRADE_UPDATE":
+            return False
+
+        order = _order_from_event(event)
+        if order["orderId"] is None:
+            return False
+        order_id = str(order["orderId"])
+        status = order["status"]
+
+        ready: list[Future] = []
+        with self._lock:
+            self._recent_orders[order_id] = order
+            self._recent_orders.move_to_end(order_id)
+            while len(self._recent_orders) > RECENT_ORDER_EVENTS_LIMIT:
+                self._recent_orders.popitem(last=False)
+            waiters = self._waiters.get(order_id)
+            if waiters:
+                remaining = []
+                for future, wanted in waiters:
+                    (ready if status in wanted else remaining).append((future, wanted))
+                if remaining:
+                    self._waiters[order_id] = remaining
+                else:
+                    del self._waiters[order_id]
+
+        # 在锁外完成 Future：完成回调会再次获取锁
+        for future, _ in ready:
+            try:
+                future.set_result(order)
+            except InvalidStateError:
+                pass  # 调用方已超时取消
+
+        logger.debug("订单推送: {} {} 状态={}", order["symbol"], order_id, status)
+        return False
+
+    def _run_event_loop(self) -> None:
+        """事件循环线程入口（所有WebSocket I/O都在这里执行）"""
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    async def _start_consumer(self) -> None:
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def _shutdown(self) -> None:
+        task = self._consumer
+        self._consumer = None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def _keepalive_listen_key(self) -> None:
+        """定期续期 listenKey（REST 调用放到线程池，避免阻塞事件循环）"""
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE_INTERVAL)
+            try:
+                await asyncio.to_thread(self._client.keepalive_listen_key)
+                logger.debug("用户数据流 listenKey 已续期")
+            except Exception as exc:
+                logger.warning("续期 listenKey 失败: {}", exc)
+
+    async def _consume(self) -> None:
+        """维持用户数据流连接并消费消息，断线后按指数退避重连"""
+        backoff = self._reconnect_interval
+        while self._running:
+            keepalive: asyncio.Task | None = None
+            try:
+                listen_key = await asyncio.to_thread(self._client.create_listen_key)
+                async with websockets.connect(
+                    BINANCE_USER_DATA_STREAM_URL.format(listen_key=listen_key),
+                    ping_interval=20,
+                    ping_timeout=20,
+                ) as ws:
+                    self._connected = True
+                    backoff = self._reconnect_interval
+                    keepalive = asyncio.create_task(self._keepalive_listen_key())
+                    logger.info("用户数据流连接已建立")
+
+                    async for message in ws:
+                        if self._handle_message(message):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("用户数据流连接错误: {}", exc)
+            finally:
+                self._connected = False
+                if keepalive is not None:
+                    keepalive.cancel()
+
+            if not self._running:
+                break
+            logger.info("用户数据流将在 {} 秒后重连", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self._max_reconnect_interval)
+
+
+# 全局单例实例
+_user_data_service: BinanceUserDataStreamService | None = None
+_user_data_service_lock = Lock()
+
+
+def get_user_data_stream_service() -> BinanceUserDataStreamService:
+    """获取用户数据流服务单例（双重检查加锁）"""
+    global _user_data_service
+    if _user_data_service is None:
+        with _user_data_service_lock:
+            if _user_data_service is None:
+                _user_data_service = BinanceUserDataStreamService()
+    return _user_data_service
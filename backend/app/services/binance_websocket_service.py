@@ -2,41 +2,63 @@
 
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
 import threading
 import time
 from decimal import Decimal
 from threading import Lock
-from typing import Set, Any
+from typing import Any, Iterable, Set
 
-import websocket
+import websockets
 from loguru import logger
 
 from app.core.config import Settings, get_settings
 
+# 组合流端点：一条连接通过 SUBSCRIBE/UNSUBSCRIBE 控制帧管理所有交易对
+BINANCE_FUTURES_STREAM_URL = "wss://fstream.binance.com/stream"
+PRICE_TTL_SECONDS = 5.0  # 缓存价格有效期（秒），读取时按时间戳判断，过期条目由清理任务统一删除
+CACHE_JANITOR_INTERVAL = 1.0  # 过期清理任务的执行间隔（秒）
+SUBSCRIBE_BATCH_DELAY = 0.1  # 订阅请求的合并窗口（秒），窗口内的新交易对合并为一个 SUBSCRIBE 帧
+# 预先序列化的控制帧模板，发送时只替换方法、流名与请求ID（交易对名只含字母数字，无需转义）
+_CONTROL_FRAME_TEMPLATE = '{"method":"%s","params":[%s],"id":%d}'
+_MARK_PRICE_STREAM_TEMPLATE = '"%s@markPrice"'
+
 
 class BinanceWebSocketPriceService:
     """币安WebSocket价格订阅服务
     
     功能：
-    1. 订阅币安合约标记价格流
+    1. 订阅币安合约标记价格流（单连接组合流）
     2. 维护实时价格缓存
-    3. 自动重连机制
+    3. 自动重连机制（指数退避）
     4. 线程安全的价格访问
+    
+    所有订阅共用一个 asyncio 事件循环线程，外部线程通过
+    asyncio.run_coroutine_threadsafe 投递订阅/退订请求。
     """
     
     # 类级别的价格缓存（所有实例共享）
-    _price_cache: dict[str, tuple[Decimal, float]] = {}  # {symbol: (price, timestamp)}
+    _price_cache: dict[str, tuple[Decimal, float]] = {}  # {symbol: (price, monotonic 时间戳)}
     _cache_lock = Lock()
-    _ws_connections: dict[str, websocket.WebSocketApp] = {}  # {symbol: ws_connection}
-    _running = False
-    _thread: threading.Thread | None = None
     
     def __init__(self, settings: Settings | None = None):
         self.settings = settings or get_settings()
         self._subscribed_symbols: Set[str] = set()
-        self._reconnect_interval = 5  # 重连间隔（秒）
-        self._max_reconnect_attempts = 10  # 最大重连次数
+        self._reconnect_interval = 5  # 初始重连间隔（秒）
+        self._max_reconnect_interval = 60  # 最大重连间隔（秒）
+        self._running = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._consumer: asyncio.Task | None = None
+        self._janitor: asyncio.Task | None = None
+        self._ws: Any = None  # 当前活跃的WebSocket连接（仅在事件循环线程中读写）
+        self._request_ids = itertools.count(1)
+        self._pending_subscribe: Set[str] = set()  # 等待合并发送的订阅
+        # 保护 _subscribed_symbols 与 _pending_subscribe：调用方线程增删订阅，事件循环线程重连时遍历
+        self._pending_lock = Lock()
+        self._flush_scheduled = False
         
     def start(self, symbols: list[str] | None = None) -> None:
         """启动WebSocket价格订阅服务
@@ -55,28 +77,37 @@ class BinanceWebSocketPriceService:
             # 转换为大写并去重
             symbols = list(set([s.upper() for s in symbols]))
         
-        self._subscribed_symbols = set(symbols)
+        with self._pending_lock:
+            self._subscribed_symbols = set(symbols)
+            self._pending_subscribe.clear()
+            self._flush_scheduled = False
         
         self._running = True
+        self._loop = asyncio.new_event_loop()
         self._thread = threading.Thread(
-            target=self._run_websocket_loop,
+            target=self._run_event_loop,
             daemon=True,
             name="BinanceWebSocketPriceService"
         )
         self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_consumer(), self._loop)
         logger.info("WebSocket价格订阅服务已启动，订阅 {} 个交易对", len(symbols))
     
     def stop(self) -> None:
         """停止WebSocket价格订阅服务"""
         self._running = False
         
-        # 关闭所有WebSocket连接
-        for symbol, ws in list(self._ws_connections.items()):
+        loop = self._loop
+        if loop is not None and loop.is_running():
             try:
-                ws.close()
-            except Exception:
-                pass
-        self._ws_connections.clear()
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=5)
+            except Exception as exc:
+                logger.debug("关闭WebSocket连接失败: {}", exc)
+            loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._loop = None
         
         logger.info("WebSocket价格订阅服务已停止")
     
@@ -87,37 +118,45 @@ class BinanceWebSocketPriceService:
             symbol: 交易对（如 'BTCUSDT'）
         """
         symbol = symbol.upper()
-        if symbol in self._subscribed_symbols:
-            return
-        
-        self._subscribed_symbols.add(symbol)
+        with self._pending_lock:
+            if symbol in self._subscribed_symbols:
+                return
+            self._subscribed_symbols.add(symbol)
         logger.info("动态订阅交易对: {}", symbol)
         
-        # 如果服务正在运行，立即建立连接
-        if self._running:
-            self._connect_symbol(symbol)
+        # 如果服务正在运行，合并到下一个 SUBSCRIBE 帧发送（调用方不等待）
+        self._queue_subscribe([symbol])
     
-    def unsubscribe_symbol(self, symbol: str) -> None:
-        """取消订阅交易对（关闭WebSocket连接）
+    def subscribe_batch(self, symbols: Iterable[str]) -> None:
+        """批量订阅交易对（所有新交易对合并为一个 SUBSCRIBE 控制帧）
         
         Args:
-            symbol: 交易对（如 'BTCUSDT'）
+            symbols: 交易对列表（如 ['BTCUSDT', 'ETHUSDT']）
         """
-        symbol = symbol.upper()
-        if symbol not in self._subscribed_symbols:
+        wanted = {symbol.upper() for symbol in symbols}
+        with self._pending_lock:
+            new_symbols = sorted(wanted - self._subscribed_symbols)
+            self._subscribed_symbols.update(new_symbols)
+        if not new_symbols:
             return
         
-        # 关闭WebSocket连接
-        if symbol in self._ws_connections:
-            try:
-                ws = self._ws_connections[symbol]
-                ws.close()
-            except Exception as exc:
-                logger.debug("关闭WebSocket连接失败 ({}): {}", symbol, exc)
-            del self._ws_connections[symbol]
+        logger.info("批量订阅 {} 个交易对: {}", len(new_symbols), ", ".join(new_symbols[:5]))
+        self._queue_subscribe(new_symbols)
+    
+    def unsubscribe_symbol(self, symbol: str) -> None:
+        """取消订阅交易对（在共享连接上发送退订帧）
         
-        # 从订阅列表中移除
-        self._subscribed_symbols.discard(symbol)
+        Args:
+            symbol: 交易对（如 'BTCUSDT'）
+        """
+        symbol = symbol.upper()
+        # 从订阅列表中移除（尚未发出的订阅一并撤销）
+        with self._pending_lock:
+            if symbol not in self._subscribed_symbols:
+                return
+            self._subscribed_symbols.discard(symbol)
+            self._pending_subscribe.discard(symbol)
+        self._submit_control("UNSUBSCRIBE", [symbol])
         
         # 清理价格缓存（可选，保留也可以）
         # with self._cache_lock:
@@ -129,26 +168,20 @@ class BinanceWebSocketPriceService:
     def get_price(self, symbol: str) -> Decimal | None:
         """从WebSocket缓存获取价格
         
+        读取时比较一次时间戳，超过 PRICE_TTL_SECONDS 的价格视为不可用：
+        清理任务随事件循环运行，服务停止或事件循环线程退出后不会再淘汰旧价格。
+        只读不订阅：需要订阅时由调用方显式调用 subscribe_symbol/subscribe_batch。
+        
         Args:
             symbol: 交易对（如 'BTCUSDT'）
             
         Returns:
             标记价格，如果未订阅或缓存中没有则返回None
         """
-        symbol = symbol.upper()
-        
-        with self._cache_lock:
-            if symbol in self._price_cache:
-                price, timestamp = self._price_cache[symbol]
-                # 如果缓存超过5秒，认为数据可能过期
-                if time.time() - timestamp < 5.0:
-                    return price
-        
-        # 如果未订阅，尝试订阅
-        if symbol not in self._subscribed_symbols and self._running:
-            self.subscribe_symbol(symbol)
-        
-        return None
+        entry = self._price_cache.get(symbol.upper())
+        if entry is None or time.monotonic() - entry[1] > PRICE_TTL_SECONDS:
+            return None
+        return entry[0]
     
     def get_all_prices(self) -> dict[str, Decimal]:
         """获取所有已订阅交易对的价格
@@ -156,19 +189,18 @@ class BinanceWebSocketPriceService:
         Returns:
             {symbol: price} 字典
         """
-        result = {}
+        cutoff = time.monotonic() - PRICE_TTL_SECONDS
         with self._cache_lock:
-            for symbol, (price, timestamp) in self._price_cache.items():
-                # 只返回5秒内的有效价格
-                if time.time() - timestamp < 5.0:
-                    result[symbol] = price
-        return result
+            return {
+                symbol: price for symbol, (price, timestamp) in self._price_cache.items() if timestamp >= cutoff
+            }
     
     def get_status(self) -> dict[str, Any]:
         with self._cache_lock:
             cache_size = len(self._price_cache)
         return {
             "running": self._running,
+            "connected": self._ws is not None,
             "subscribed_symbols": len(self._subscribed_symbols),
             "cached_symbols": cache_size,
         }
@@ -182,127 +214,179 @@ class BinanceWebSocketPriceService:
         Returns:
             如果价格可用且未过期则返回True
         """
-        symbol = symbol.upper()
-        with self._cache_lock:
-            if symbol in self._price_cache:
-                _, timestamp = self._price_cache[symbol]
-                return time.time() - timestamp < 5.0
-        return False
-    
-    def _run_websocket_loop(self) -> None:
-        """WebSocket主循环（在后台线程中运行）"""
-        while self._running:
-            try:
-                # 为每个交易对建立WebSocket连接
-                for symbol in list(self._subscribed_symbols):
-                    if not self._running:
-                        break
-                    
-                    if symbol not in self._ws_connections:
-                        self._connect_symbol(symbol)
-                    
-                    # 检查连接是否还活着（通过价格缓存时间判断）
-                    # 如果价格缓存超过10秒未更新，认为连接可能断开
-                    with self._cache_lock:
-                        if symbol in self._price_cache:
-                            _, timestamp = self._price_cache[symbol]
-                            if time.time() - timestamp > 10.0:
-                                logger.warning("交易对 {} 的价格缓存已过期，尝试重连", symbol)
-                                if symbol in self._ws_connections:
-                                    del self._ws_connections[symbol]
-                                self._connect_symbol(symbol)
-                
-                # 每10秒检查一次连接状态
-                time.sleep(10)
-                
-            except Exception as exc:
-                logger.error("WebSocket主循环错误: {}", exc, exc_info=True)
-                time.sleep(self._reconnect_interval)
+        return self.get_price(symbol) is not None
     
-    def _connect_symbol(self, symbol: str) -> None:
-        """为指定交易对建立WebSocket连接
+    def _handle_message(self, message: str | bytes) -> None:
+        """解析标记价格消息并批量写入缓存
         
-        Args:
-            symbol: 交易对
+        兼容三种格式：单交易对流（对象）、组合流（{"stream": ..., "data": ...}）
+        以及全市场流 !markPrice@arr（数组）。先在锁外解析完整个消息，
+        再在一次加锁内写入全部交易对，避免每个交易对单独加锁。
         """
-        if symbol in self._ws_connections:
+        try:
+            data = json.loads(message)
+        except Exception as exc:
+            logger.error("处理WebSocket消息失败: {}", exc)
             return
         
-        # 币安WebSocket URL：单个标记价格流
-        ws_url = f"wss://fstream.binance.com/ws/{symbol.lower()}@markPrice"
+        # 组合流会把原始事件包在 data 字段里
+        if isinstance(data, dict) and "stream" in data and "data" in data:
+            data = data["data"]
+        events = data if isinstance(data, list) else [data]
         
-        def on_message(ws, message):
-            """处理WebSocket消息"""
+        # 币安标记价格更新格式：
+        # {"e":"markPriceUpdate","E":1234567890,"s":"BTCUSDT","p":"50000.00","r":"0.0001","T":1234567890}
+        now = time.monotonic()
+        batch: list[tuple[str, Decimal, float]] = []
+        for event in events:
+            if not isinstance(event, dict) or event.get("e") != "markPriceUpdate":
+                continue
+            msg_symbol = event.get("s", "").upper()
+            price_str = event.get("p")
+            if not msg_symbol or not price_str:
+                continue
             try:
-                data = json.loads(message)
-                
-                # 币安标记价格更新格式：
-                # {"e":"markPriceUpdate","E":1234567890,"s":"BTCUSDT","p":"50000.00","r":"0.0001","T":1234567890}
-                if data.get("e") == "markPriceUpdate":
-                    msg_symbol = data.get("s", "").upper()
-                    price_str = data.get("p", "0")
-                    
-                    if msg_symbol and price_str:
-                        price = Decimal(price_str)
-                        with self._cache_lock:
-                            self._price_cache[msg_symbol] = (price, time.time())
-                        
-                        logger.debug("价格更新: {} = {}", msg_symbol, price)
-                
+                batch.append((msg_symbol, Decimal(price_str), now))
             except Exception as exc:
-                logger.error("处理WebSocket消息失败: {}", exc)
-        
-        def on_error(ws, error):
-            """处理WebSocket错误"""
-            logger.warning("WebSocket错误 ({}): {}", symbol, error)
+                logger.debug("解析标记价格失败 ({}): {}", msg_symbol, exc)
         
-        def on_close(ws, close_status_code, close_msg):
-            """WebSocket连接关闭"""
-            logger.info("WebSocket连接已关闭: {} (code: {}, msg: {})", symbol, close_status_code, close_msg)
-            if symbol in self._ws_connections:
-                del self._ws_connections[symbol]
-            
-            # 如果服务还在运行，尝试重连
-            if self._running and symbol in self._subscribed_symbols:
-                time.sleep(self._reconnect_interval)
-                self._connect_symbol(symbol)
+        if not batch:
+            return
         
-        def on_open(ws):
-            """WebSocket连接打开"""
-            logger.info("WebSocket连接已建立: {}", symbol)
+        with self._cache_lock:
+            for symbol, price, timestamp in batch:
+                self._price_cache[symbol] = (price, timestamp)
         
+        if len(batch) == 1:
+            logger.debug("价格更新: {} = {}", batch[0][0], batch[0][1])
+        else:
+            logger.debug("批量价格更新: {} 个交易对", len(batch))
+    
+    def _run_event_loop(self) -> None:
+        """事件循环线程入口（所有WebSocket I/O都在这里执行）"""
+        loop = self._loop
+        asyncio.set_event_loop(loop)
         try:
-            # 创建WebSocket连接
-            ws = websocket.WebSocketApp(
-                ws_url,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close,
-                on_open=on_open
-            )
-            
-            # 在后台线程中运行WebSocket
-            ws_thread = threading.Thread(
-                target=ws.run_forever,
-                daemon=True,
-                name=f"WS-{symbol}"
-            )
-            ws_thread.start()
-            
-            self._ws_connections[symbol] = ws
-            
+            loop.run_forever()
+        finally:
+            loop.close()
+    
+    def _submit_control(self, method: str, symbols: Iterable[str]) -> None:
+        """从任意线程投递订阅/退订请求到事件循环"""
+        loop = self._loop
+        if not self._running or loop is None or not loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._send_control(method, list(symbols)), loop)
+    
+    def _queue_subscribe(self, symbols: Iterable[str]) -> None:
+        """把订阅请求放入合并窗口，窗口结束时在事件循环中发送一个 SUBSCRIBE 帧"""
+        loop = self._loop
+        if not self._running or loop is None or not loop.is_running():
+            return
+        with self._pending_lock:
+            self._pending_subscribe.update(symbols)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        loop.call_soon_threadsafe(loop.call_later, SUBSCRIBE_BATCH_DELAY, self._flush_pending_subscribe)
+    
+    def _flush_pending_subscribe(self) -> None:
+        """（事件循环线程）发送合并窗口内累积的订阅"""
+        with self._pending_lock:
+            symbols = sorted(self._pending_subscribe)
+            self._pending_subscribe.clear()
+            self._flush_scheduled = False
+        if symbols:
+            asyncio.ensure_future(self._send_control("SUBSCRIBE", symbols))
+    
+    async def _send_control(self, method: str, symbols: list[str]) -> None:
+        """在当前连接上发送控制帧；未连接时由重连逻辑统一补订阅"""
+        ws = self._ws
+        if ws is None or not symbols:
+            return
+        params = ",".join(_MARK_PRICE_STREAM_TEMPLATE % symbol.lower() for symbol in symbols)
+        frame = _CONTROL_FRAME_TEMPLATE % (method, params, next(self._request_ids))
+        try:
+            await ws.send(frame)
         except Exception as exc:
-            logger.error("建立WebSocket连接失败 ({}): {}", symbol, exc, exc_info=True)
+            logger.warning("发送WebSocket控制帧失败 ({} {}): {}", method, symbols, exc)
+    
+    async def _start_consumer(self) -> None:
+        self._consumer = asyncio.create_task(self._consume())
+        self._janitor = asyncio.create_task(self._evict_expired_prices())
+    
+    async def _shutdown(self) -> None:
+        tasks = [task for task in (self._consumer, self._janitor) if task is not None]
+        self._consumer = None
+        self._janitor = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+    
+    async def _evict_expired_prices(self) -> None:
+        """定期删除超过有效期的价格，避免已取消订阅的交易对一直留在缓存里"""
+        while True:
+            await asyncio.sleep(CACHE_JANITOR_INTERVAL)
+            cutoff = time.monotonic() - PRICE_TTL_SECONDS
+            with self._cache_lock:
+                expired = [symbol for symbol, (_, timestamp) in self._price_cache.items() if timestamp < cutoff]
+                for symbol in expired:
+                    del self._price_cache[symbol]
+            if expired:
+                logger.debug("已淘汰 {} 个过期的WebSocket价格", len(expired))
+    
+    async def _consume(self) -> None:
+        """维持组合流连接并消费消息，断线后按指数退避重连"""
+        backoff = self._reconnect_interval
+        while self._running:
+            try:
+                async with websockets.connect(
+                    BINANCE_FUTURES_STREAM_URL,
+                    ping_interval=20,
+                    ping_timeout=20,
+                ) as ws:
+                    self._ws = ws
+                    backoff = self._reconnect_interval
+                    logger.info("WebSocket连接已建立: {}", BINANCE_FUTURES_STREAM_URL)
+                    
+                    # 连接（或重连）后一次性恢复全部订阅（在锁内取快照，调用方线程可能同时增删订阅）
+                    with self._pending_lock:
+                        symbols = sorted(self._subscribed_symbols)
+                    await self._send_control("SUBSCRIBE", symbols)
+                    
+                    async for message in ws:
+                        self._handle_message(message)
+                    
+                    logger.info("WebSocket连接已关闭 (code: {})", ws.close_code)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("WebSocket连接错误: {}", exc)
+            finally:
+                self._ws = None
+            
+            if not self._running:
+                break
+            logger.info("WebSocket将在 {} 秒后重连", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self._max_reconnect_interval)
 
 
 # 全局单例实例
 _websocket_service: BinanceWebSocketPriceService | None = None
+_websocket_service_lock = Lock()
 
 
 def get_websocket_price_service() -> BinanceWebSocketPriceService:
-    """获取WebSocket价格订阅服务单例"""
+    """获取WebSocket价格订阅服务单例（双重检查加锁，避免并发启动时重复创建）"""
     global _websocket_service
     if _websocket_service is None:
-        _websocket_service = BinanceWebSocketPriceService()
+        with _websocket_service_lock:
+            if _websocket_service is None:
+                _websocket_service = BinanceWebSocketPriceService()
     return _websocket_service
 
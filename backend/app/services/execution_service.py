@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from decimal import Decimal
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Optional
 import time
 
 from loguru import logger
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 
 from app.core.config import Settings, get_settings
@@ -15,41 +17,112 @@ from app.models.execution_log import ExecutionLog
 from app.models.manual_plan import ManualPlan
 from app.models.position import Position
 from app.models.trade_plan import TradePlan
-from app.services.binance_service import BinanceFuturesClient
+from app.services.binance_service import BATCH_ORDERS_LIMIT, BinanceFuturesClient
+from app.services.binance_user_data_service import get_user_data_stream_service
+from app.services.binance_websocket_service import get_websocket_price_service
+
+_ORDER_QUANTITY_STEP = Decimal("0.001")
+_MARGIN_BUFFER = Decimal("0.99")  # 保证金检查留1%的余量，避免精度问题
+_FALLBACK_MARK_PRICE = Decimal("1")  # 获取不到标记价格时的兜底值
+# 订单状态集合（模块级 frozenset，成员判断无需每次构造列表）
+_FILLED_STATUSES = frozenset({"FILLED", "PARTIALLY_FILLED"})
+_TERMINAL_STATUSES = frozenset({"CANCELED", "REJECTED", "EXPIRED"})
+_LIMIT_WAIT_STATUSES = _TERMINAL_STATUSES | {"FILLED"}
+# REST 查单回退轮询的指数退避间隔（秒）：0.1 → 0.2 → 0.4 → 0.8 → 1.0 …
+_ORDER_POLL_INITIAL_INTERVAL = 0.1
+_ORDER_POLL_MAX_INTERVAL = 1.0
+# 执行日志 payload 只保留这些订单字段（历史页面与排查只用到它们）
+_ORDER_PAYLOAD_KEYS = (
+    "orderId",
+    "clientOrderId",
+    "symbol",
+    "side",
+    "type",
+    "status",
+    "price",
+    "avgPrice",
+    "origQty",
+    "executedQty",
+    "cumQuote",
+    "updateTime",
+)
+
+
+def _to_decimal(value: Decimal | float | int | str) -> Decimal:
+    """转换为 Decimal：Decimal 原样返回，int/str 直接构造，只有 float 经 str() 取最短十进制表示
+    
+    不使用 Decimal.from_float：它会保留二进制误差（0.1 → 0.1000000000000000055…），
+    再 quantize 又会截断币安返回的高精度价格。
+    """
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
+
+def _compact_order(order_result: dict) -> dict:
+    """裁剪下单/查单响应，减少 JSON 编码开销与执行日志行大小"""
+    return {key: order_result[key] for key in _ORDER_PAYLOAD_KEYS if key in order_result}
+
+
+def _manual_plan_symbol(plan: ManualPlan) -> str:
+    """确保symbol格式正确，如果没有USDT后缀则自动添加"""
+    symbol = plan.symbol.upper()
+    if not symbol.endswith("USDT"):
+        symbol = f"{symbol}USDT"
+    return symbol
 
 
 class ExecutionService:
     """封装与币安合约交互的关键步骤，下单逻辑集中在此。"""
 
+    # 下单前的设置杠杆/查余额/查价格互不依赖，并发执行（类级别共享，避免每次执行新建线程池）
+    _pretrade_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="pretrade")
+
     def __init__(self, db: Session, settings: Settings | None = None) -> None:
         self.db = db
         self.settings = settings or get_settings()
         self.client = BinanceFuturesClient(self.settings)
+        # 预先转换下单计算用到的配置（Decimal(str(float)) 在每次下单时重复执行没有意义）
+        self._position_pct = _to_decimal(self.settings.position_pct)
+        self._max_order_amount = (
+            _to_decimal(self.settings.max_order_amount) if self.settings.max_order_amount else None
+        )
+        self._default_leverage = Decimal(self.settings.leverage)
 
-    def calculate_order_size(self, symbol_price: Decimal, available_balance: Decimal, leverage: int | None = None) -> Decimal:
+    def calculate_order_size(
+        self,
+        symbol_price: Decimal,
+        available_balance: Decimal,
+        leverage: Decimal | float | int | None = None,
+        *,
+        position_pct: Decimal | float | None = None,
+    ) -> Decimal:
         """根据可用保证金 * 配置比例来计算下单张数，并应用最大购买金额限制。
         
         Args:
             symbol_price: 交易对价格
             available_balance: 可用保证金
             leverage: 杠杆倍数，如果为None则使用系统默认杠杆
+            position_pct: 仓位比例，如果为None则使用系统默认比例
         """
 
-        allocation = available_balance * Decimal(str(self.settings.position_pct))
+        pct = self._position_pct if position_pct is None else _to_decimal(position_pct)
+        allocation = available_balance * pct
         if allocation <= 0 or symbol_price <= 0:
             raise ValueError("无法计算下单数量")
         
         # 应用最大购买金额限制
-        if self.settings.max_order_amount:
-            max_amount = Decimal(str(self.settings.max_order_amount))
-            if allocation > max_amount:
-                log_key_event("INFO", "购买金额 %s 超过最大限制 %s，已限制为最大金额", allocation, max_amount)
-                allocation = max_amount
+        max_amount = self._max_order_amount
+        if max_amount is not None and allocation > max_amount:
+            log_key_event("INFO", "购买金额 %s 超过最大限制 %s，已限制为最大金额", allocation, max_amount)
+            allocation = max_amount
         
         # 使用传入的杠杆，如果没有则使用系统默认杠杆
-        leverage_to_use = Decimal(str(leverage)) if leverage is not None else Decimal(self.settings.leverage)
+        leverage_to_use = self._default_leverage if leverage is None else _to_decimal(leverage)
         quantity = allocation * leverage_to_use / symbol_price
-        return quantity.quantize(Decimal("0.001"))
+        return quantity.quantize(_ORDER_QUANTITY_STEP)
 
     def _check_slippage(
         self,
@@ -63,19 +136,77 @@ class ExecutionService:
         Returns:
             (is_valid, slippage_pct): (是否在允许范围内, 滑点百分比)
         """
-        if expected_price <= 0:
+        # 直接用 float 计算：结果本就要与 float 类型的滑点阈值比较
+        expected = float(expected_price)
+        if expected <= 0:
             return True, 0.0
+        actual = float(actual_price)
         
         if side == "BUY":
-            slippage_pct = float((actual_price - expected_price) / expected_price * 100)
+            slippage_pct = (actual - expected) / expected * 100.0
         else:  # SELL
-            slippage_pct = float((expected_price - actual_price) / expected_price * 100)
+            slippage_pct = (expected - actual) / expected * 100.0
         
         max_slippage = max_slippage_pct if max_slippage_pct is not None else self.settings.max_slippage_pct
         is_valid = slippage_pct <= max_slippage
         
         return is_valid, slippage_pct
 
+    def wait_for_order(
+        self,
+        symbol: str,
+        order_id: str,
+        statuses: frozenset[str],
+        timeout: float,
+    ) -> dict | None:
+        """等待订单进入指定状态之一，返回最后一次获取到的订单信息（可能仍未满足条件）
+        
+        用户数据流已连接时只等待 ORDER_TRADE_UPDATE 推送，超时后用一次 REST 查单兜底；
+        断线时回退到指数退避的 REST 轮询，轮询间隔内仍等待推送。
+        """
+        stream = get_user_data_stream_service() if self.settings.user_data_stream_enabled else None
+        waiter = stream.wait_for_order(order_id, statuses) if stream is not None else None
+        try:
+            if waiter is not None and stream.is_connected():
+                try:
+                    return waiter.result(timeout=timeout)
+                except FuturesTimeoutError:
+                    pass
+                try:
+                    return self.client.get_order_status(symbol, order_id)
+                except Exception as exc:
+                    logger.debug("查询订单状态失败: {}", exc)
+                    return None
+            
+            # 提交后立即查一次（快速成交的订单无需等待第一个轮询间隔），之后在
+            # 轮询间隔内等待推送而不是 sleep：用户数据流重连后到达的推送会立即结束等待
+            latest: dict | None = None
+            deadline = time.monotonic() + timeout
+            interval = _ORDER_POLL_INITIAL_INTERVAL
+            while True:
+                try:
+                    latest = self.client.get_order_status(symbol, order_id)
+                    if latest.get("status", "").upper() in statuses:
+                        break
+                except Exception as exc:
+                    logger.debug("查询订单状态失败: {}", exc)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = min(interval, remaining)
+                if waiter is not None:
+                    try:
+                        return waiter.result(timeout=wait)
+                    except FuturesTimeoutError:
+                        pass
+                else:
+                    time.sleep(wait)
+                interval = min(interval * 2, _ORDER_POLL_MAX_INTERVAL)
+            return latest
+        finally:
+            if waiter is not None:
+                waiter.cancel()
+
     def _place_order_with_slippage_check(
         self,
         symbol: str,
@@ -97,39 +228,51 @@ class ExecutionService:
             log_key_event("INFO", "使用市价单下单 {} {}", symbol, side)
             order_result = self.client.place_market_order(symbol, side, quantity)
             
-            # 对于市价单，如果状态是 NEW，等待一下然后查询订单状态
-            order_status = order_result.get("status", "").upper()
-            if order_status == "NEW":
-                order_id = str(order_result.get("orderId", ""))
-                if order_id:
-                    log_key_event("INFO", "市价单已提交，等待成交，订单ID: {}", order_id)
-                    # 等待最多3秒，每0.5秒检查一次
-                    import time
-                    for _ in range(6):
-                        time.sleep(0.5)
-                        try:
-                            order_result = self.client.get_order_status(symbol, order_id)
-                            order_status = order_result.get("status", "").upper()
-                            if order_status in ["FILLED", "PARTIALLY_FILLED"]:
-                                log_key_event("INFO", "市价单已成交，订单ID: {}", order_id)
-                                break
-                        except Exception as exc:
-                            logger.debug("查询订单状态失败: {}", exc)
+            order_result = self._finalize_market_order(
+                symbol, side, order_result, expected_price, max_slippage_pct=max_slippage_pct
+            )
+        
+        return order_result
+
+    def _finalize_market_order(
+        self,
+        symbol: str,
+        side: str,
+        order_result: dict,
+        expected_price: Decimal,
+        *,
+        max_slippage_pct: float | None = None,
+    ) -> dict:
+        """市价单提交后的处理：状态为 NEW 时等待成交（最多3秒），成交后检查滑点"""
+        # 对于市价单，如果状态是 NEW，等待一下然后查询订单状态
+        order_status = order_result.get("status", "").upper()
+        if order_status == "NEW":
+            order_id = str(order_result.get("orderId", ""))
+            if order_id:
+                log_key_event("INFO", "市价单已提交，等待成交，订单ID: {}", order_id)
+                # 最多等待3秒（优先等待用户数据流推送）
+                latest = self.wait_for_order(symbol, order_id, _FILLED_STATUSES, 3.0)
+                if latest is not None:
+                    order_result = latest
+                    order_status = order_result.get("status", "").upper()
+                    if order_status in _FILLED_STATUSES:
+                        log_key_event("INFO", "市价单已成交，订单ID: {}", order_id)
+        
+        # 检查滑点（如果订单已成交）
+        if order_status in _FILLED_STATUSES:
+            avg_price = order_result.get("avgPrice")
+            actual_price = _to_decimal(avg_price) if avg_price else expected_price
+            is_valid, slippage_pct = self._check_slippage(
+                expected_price, actual_price, side, max_slippage_pct=max_slippage_pct
+            )
             
-            # 检查滑点（如果订单已成交）
-            if order_result.get("status", "").upper() in ["FILLED", "PARTIALLY_FILLED"]:
-                actual_price = Decimal(str(order_result.get("avgPrice", expected_price))) if order_result.get("avgPrice") else expected_price
-                is_valid, slippage_pct = self._check_slippage(
-                    expected_price, actual_price, side, max_slippage_pct=max_slippage_pct
+            if not is_valid:
+                logger.warning(
+                    "市价单滑点超过限制: 预期价格={}, 实际价格={}, 滑点={:.2f}%, 最大允许={:.2f}%",
+                    expected_price, actual_price, slippage_pct, self.settings.max_slippage_pct
                 )
-                
-                if not is_valid:
-                    logger.warning(
-                        "市价单滑点超过限制: 预期价格={}, 实际价格={}, 滑点={:.2f}%, 最大允许={:.2f}%",
-                        expected_price, actual_price, slippage_pct, self.settings.max_slippage_pct
-                    )
-                else:
-                    logger.debug("市价单滑点检查通过: 滑点={:.2f}%", slippage_pct)
+            else:
+                logger.debug("市价单滑点检查通过: 滑点={:.2f}%", slippage_pct)
         
         return order_result
 
@@ -158,42 +301,35 @@ class ExecutionService:
             
             # 等待订单成交
             timeout = self.settings.limit_order_timeout_seconds
-            start_time = time.time()
             
             # 先检查初始订单状态
             initial_status = order_result.get("status", "").upper()
             if initial_status == "FILLED":
                 log_key_event("INFO", "限价单立即成交: {}", order_id)
                 return order_result
-            elif initial_status in ["CANCELED", "REJECTED", "EXPIRED"]:
+            elif initial_status in _TERMINAL_STATUSES:
                 logger.warning("限价单被拒绝/取消/过期: {}, 状态: {}", order_id, initial_status)
                 # 立即转为市价单
                 return self._place_order_with_slippage_check(
                     symbol, side, quantity, expected_price, max_slippage_pct=max_slippage_pct
                 )
             
-            # 如果订单状态是 NEW 或 PARTIALLY_FILLED，等待成交
-            while time.time() - start_time < timeout:
-                try:
-                    order_status = self.client.get_order_status(symbol, order_id)
-                    status = order_status.get("status", "").upper()
-                    
-                    if status == "FILLED":
-                        log_key_event("INFO", "限价单已成交: {}", order_id)
-                        return order_status
-                    elif status == "PARTIALLY_FILLED":
-                        # 部分成交，继续等待
-                        logger.debug("限价单部分成交: {}, 已成交: {}/{}", 
-                                   order_id, 
-                                   order_status.get("executedQty", "0"),
-                                   order_status.get("origQty", "0"))
-                    elif status in ["CANCELED", "REJECTED", "EXPIRED"]:
-                        logger.warning("限价单被取消/拒绝/过期: {}, 状态: {}", order_id, status)
-                        break
-                except Exception as exc:
-                    logger.debug("查询限价单状态失败: {}", exc)
-                
-                time.sleep(0.5)  # 每0.5秒检查一次
+            # 如果订单状态是 NEW 或 PARTIALLY_FILLED，等待成交或终态
+            order_status = self.wait_for_order(
+                symbol, order_id, _LIMIT_WAIT_STATUSES, timeout
+            )
+            if order_status is not None:
+                status = order_status.get("status", "").upper()
+                if status == "FILLED":
+                    log_key_event("INFO", "限价单已成交: {}", order_id)
+                    return order_status
+                elif status == "PARTIALLY_FILLED":
+                    logger.debug("限价单部分成交: {}, 已成交: {}/{}", 
+                               order_id, 
+                               order_status.get("executedQty", "0"),
+                               order_status.get("origQty", "0"))
+                elif status in _TERMINAL_STATUSES:
+                    logger.warning("限价单被取消/拒绝/过期: {}, 状态: {}", order_id, status)
             
             # 超时或取消，转为市价单
             try:
@@ -212,6 +348,140 @@ class ExecutionService:
                 symbol, side, quantity, expected_price, max_slippage_pct=max_slippage_pct
             )
 
+    def _ws_mark_price(self, symbol: str) -> Decimal | None:
+        """从WebSocket缓存读取标记价格（价格服务不返回过期价格），未启用或未命中时返回None"""
+        if not self.settings.websocket_price_enabled:
+            return None
+        try:
+            return get_websocket_price_service().get_price(symbol)
+        except Exception as exc:
+            logger.debug("从WebSocket获取价格失败 {}: {}", symbol, exc)
+            return None
+
+    def _prepare_order(
+        self,
+        symbol: str,
+        leverage: int,
+        get_balance: Callable[[], Decimal],
+        price_hint: Decimal | None = None,
+    ) -> tuple[Decimal, Decimal]:
+        """并发执行下单前的 REST 调用：设置杠杆、查询余额、查询标记价格
+        
+        同时预热下单时要用到的交易对精度与持仓模式缓存，使它们与前三个请求
+        重叠完成，而不是在下单时再串行等待。
+        
+        Returns:
+            (balance, mark_price)；任一调用失败时通过 result() 抛出原异常
+        """
+        warmups = (
+            self._pretrade_pool.submit(self.client.get_symbol_info, symbol),
+            self._pretrade_pool.submit(self.client.get_position_mode),
+        )
+        leverage_future = self._pretrade_pool.submit(self.client.set_leverage, symbol, leverage)
+        balance_future = self._pretrade_pool.submit(get_balance)
+        # WebSocket 已有价格时直接读取缓存，不再占用线程池提交 REST 查询
+        price_hint = price_hint or self._ws_mark_price(symbol)
+        price_future = None if price_hint else self._pretrade_pool.submit(self.client.get_mark_price, symbol)
+        for warmup in warmups:
+            warmup.result()  # 两者失败时都回退到默认值，不会抛出
+        leverage_future.result()
+        balance = balance_future.result()
+        mark_price = price_hint or price_future.result() or _FALLBACK_MARK_PRICE
+        return balance, mark_price
+
+    def _record_fill(
+        self,
+        plan: TradePlan | ManualPlan,
+        *,
+        symbol: str,
+        side: str,
+        order_result: dict,
+        mark_price: Decimal,
+        quantity: Decimal,
+        now: datetime,
+        trade_plan_id: str | None = None,
+        manual_plan_id: str | None = None,
+    ) -> tuple[str, str]:
+        """校验成交结果，写入持仓记录与执行日志（不提交事务，由调用方统一提交）
+        
+        Returns:
+            (order_id, position_id)
+        """
+        # 订单已提交，保证金随之变化：丢弃可用余额缓存，
+        # 之后的计划（包括批量执行后逐个执行的同交易对计划）必须按下单后的余额计算数量
+        self.client.invalidate_futures_balance()
+        order_id = str(order_result.get("orderId") or order_result.get("order_id") or order_result.get("clientOrderId", ""))
+        
+        # 检查订单状态，确保订单已成交
+        order_status = order_result.get("status", "").upper()
+        if order_status not in _FILLED_STATUSES:
+            # 如果订单未成交，抛出异常
+            raise ValueError(f"订单未成交，状态: {order_status}, 订单ID: {order_id}")
+        
+        # 获取实际成交价格和数量
+        # 对于市价单，使用 avgPrice 或 price；对于限价单，使用 avgPrice（平均成交价）
+        avg_price = order_result.get("avgPrice")
+        if avg_price:
+            actual_price = _to_decimal(avg_price)
+        else:
+            price = order_result.get("price")
+            actual_price = _to_decimal(price) if price else mark_price
+        
+        # 获取实际成交数量
+        actual_quantity = _to_decimal(order_result.get("executedQty", "0"))
+        if actual_quantity <= 0:
+            # 如果成交数量为0，使用原始数量（部分成交的情况）
+            actual_quantity = _to_decimal(order_result.get("origQty", quantity))
+        
+        if actual_quantity <= 0:
+            raise ValueError(f"订单成交数量无效: {actual_quantity}, 订单ID: {order_id}")
+        
+        if manual_plan_id:
+            # 创建持仓记录，使用手动计划中的参数
+            log_key_event("INFO", "创建持仓记录: 杠杆=%sx, 止损=%s%%, 滑动退出=%s%% (来自手动计划 %s)", 
+                         plan.leverage, float(plan.stop_loss_pct) * 100, float(plan.trailing_exit_pct) * 100, plan.id)
+        # 直接用 Core insert 写入两行（无需 ORM 对象构造与 identity map），RETURNING 取回持仓ID
+        position_id = self.db.execute(
+            insert(Position)
+            .values(
+                trade_plan_id=trade_plan_id,
+                manual_plan_id=manual_plan_id,
+                symbol=symbol,
+                side=side,
+                status=PositionStatus.ACTIVE,
+                order_id=order_id,
+                entry_price=actual_price,
+                entry_quantity=actual_quantity,
+                entry_time=now,
+                leverage=plan.leverage,
+                trailing_exit_pct=plan.trailing_exit_pct,
+                stop_loss_pct=plan.stop_loss_pct,
+                max_slippage_pct=plan.max_slippage_pct,
+                highest_price=actual_price,
+                lowest_price=actual_price,
+                last_check_time=now,
+            )
+            .returning(Position.id)
+        ).scalar_one()
+        
+        # 记录执行日志
+        self.db.execute(
+            insert(ExecutionLog).values(
+                trade_plan_id=trade_plan_id,
+                manual_plan_id=manual_plan_id,
+                position_id=position_id,
+                event_type="order_filled",
+                order_id=order_id,
+                symbol=symbol,
+                side=side,
+                price=actual_price,
+                quantity=actual_quantity,
+                status=order_result.get("status", "FILLED"),
+                payload=_compact_order(order_result),
+            )
+        )
+        return order_id, position_id
+
     def execute_plan(self, plan: TradePlan, side: str = "BUY", price_hint: Optional[Decimal] = None) -> None:
         """执行交易计划（市价单建仓），记录订单详情并创建持仓。"""
 
@@ -222,15 +492,14 @@ class ExecutionService:
         # 确保WebSocket已订阅（如果启用）
         if self.settings.websocket_price_enabled:
             try:
-                from app.services.binance_websocket_service import get_websocket_price_service
                 ws_service = get_websocket_price_service()
                 ws_service.subscribe_symbol(symbol)
             except Exception as exc:
                 logger.debug("订阅WebSocket失败 ({}): {}", symbol, exc)
         
-        self.client.set_leverage(symbol, int(plan.leverage))
-        balance = self.client.get_account_balance()
-        mark_price = price_hint or self.client.get_mark_price(symbol) or Decimal("1")
+        balance, mark_price = self._prepare_order(
+            symbol, int(plan.leverage), self.client.get_account_balance, price_hint=price_hint
+        )
         # 使用计划中的杠杆计算订单数量
         quantity = self.calculate_order_size(mark_price, balance, leverage=plan.leverage)
         
@@ -242,210 +511,255 @@ class ExecutionService:
         order_result = self._place_order_with_timeout(
             symbol, side, quantity, mark_price, max_slippage_pct=plan_slippage_pct
         )
-        order_id = str(order_result.get("orderId") or order_result.get("order_id") or order_result.get("clientOrderId", ""))
-        
-        # 检查订单状态，确保订单已成交
-        order_status = order_result.get("status", "").upper()
-        if order_status not in ["FILLED", "PARTIALLY_FILLED"]:
-            # 如果订单未成交，抛出异常
-            raise ValueError(f"订单未成交，状态: {order_status}, 订单ID: {order_id}")
-        
-        # 获取实际成交价格和数量
-        # 对于市价单，使用 avgPrice 或 price；对于限价单，使用 avgPrice（平均成交价）
-        actual_price = None
-        if order_result.get("avgPrice"):
-            actual_price = Decimal(str(order_result.get("avgPrice")))
-        elif order_result.get("price"):
-            actual_price = Decimal(str(order_result.get("price")))
-        else:
-            actual_price = mark_price
-        
-        # 获取实际成交数量
-        actual_quantity = Decimal(str(order_result.get("executedQty", "0")))
-        if actual_quantity <= 0:
-            # 如果成交数量为0，使用原始数量（部分成交的情况）
-            actual_quantity = Decimal(str(order_result.get("origQty", quantity)))
-        
-        if actual_quantity <= 0:
-            raise ValueError(f"订单成交数量无效: {actual_quantity}, 订单ID: {order_id}")
-        
-        # 创建持仓记录
-        position = Position(
-            trade_plan_id=plan.id,
+        # 入场时间、检查时间与计划实际入场时间共用一个时间戳
+        now = datetime.now(timezone.utc)
+        order_id, position_id = self._record_fill(
+            plan,
             symbol=symbol,
             side=side,
-            status=PositionStatus.ACTIVE,
-            order_id=order_id,
-            entry_price=actual_price,
-            entry_quantity=actual_quantity,
-            entry_time=datetime.now(timezone.utc),
-            leverage=plan.leverage,
-            trailing_exit_pct=plan.trailing_exit_pct,
-            stop_loss_pct=plan.stop_loss_pct,
-             max_slippage_pct=plan.max_slippage_pct,
-            highest_price=actual_price,
-            lowest_price=actual_price,
-            last_check_time=datetime.now(timezone.utc),
-        )
-        self.db.add(position)
-        
-        # 记录执行日志
-        log = ExecutionLog(
+            order_result=order_result,
+            mark_price=mark_price,
+            quantity=quantity,
+            now=now,
             trade_plan_id=plan.id,
-            position_id=position.id,
-            event_type="order_filled",
-            order_id=order_id,
-            symbol=symbol,
-            side=side,
-            price=actual_price,
-            quantity=actual_quantity,
-            status=order_result.get("status", "FILLED"),
-            payload=order_result,
         )
-        self.db.add(log)
         
-        plan.status = TradePlanStatus.ACTIVE
-        plan.actual_entry_time = datetime.now(timezone.utc)
+        # 两列状态更新直接发 UPDATE，不经过 ORM 脏检查；commit 后 plan 过期，再次访问会重新加载
+        self.db.execute(
+            update(TradePlan)
+            .where(TradePlan.id == plan.id)
+            .values(status=TradePlanStatus.ACTIVE, actual_entry_time=now)
+        )
         self.db.commit()
-        log_key_event("INFO", "计划 %s 执行完成，订单ID: %s，持仓ID: %s", plan.id, order_id, position.id)
+        log_key_event("INFO", "计划 %s 执行完成，订单ID: %s，持仓ID: %s", plan.id, order_id, position_id)
 
     def execute_manual_plan(self, plan: ManualPlan) -> None:
-        # 确保symbol格式正确，如果没有USDT后缀则自动添加
-        symbol = plan.symbol.upper()
-        if not symbol.endswith("USDT"):
-            symbol = f"{symbol}USDT"
+        symbol = _manual_plan_symbol(plan)
         
         # 确保WebSocket已订阅（如果启用）
         if self.settings.websocket_price_enabled:
             try:
-                from app.services.binance_websocket_service import get_websocket_price_service
                 ws_service = get_websocket_price_service()
                 ws_service.subscribe_symbol(symbol)
             except Exception as exc:
                 logger.debug("订阅WebSocket失败 ({}): {}", symbol, exc)
         
-        self.client.set_leverage(symbol, int(plan.leverage))
-        # 清除余额缓存，确保获取最新的可用保证金
-        # 防止因为缓存导致使用过期的余额信息
-        from app.services.binance_service import BinanceFuturesClient
-        with BinanceFuturesClient._cache_lock:
-            if "futures" in BinanceFuturesClient._balance_cache:
-                del BinanceFuturesClient._balance_cache["futures"]
-        
         # 使用合约账户余额（可用保证金）
-        balance = self.client.get_futures_balance()
-        mark_price = self.client.get_mark_price(symbol) or Decimal("1")
-        
-        # 记录余额和价格信息
-        log_key_event("INFO", "执行计划 {}: 可用保证金={} USDT, 标记价格={}, 杠杆={}x, 仓位比例={}", 
-                   plan.id, balance, mark_price, plan.leverage, plan.position_pct)
-        
-        # 使用计划中的仓位比例，而不是设置中的默认值
-        # 临时覆盖设置中的 position_pct
-        original_position_pct = self.settings.position_pct
-        self.settings.position_pct = plan.position_pct
-        
-        try:
-            # 传递计划中的杠杆参数，确保使用正确的杠杆计算订单数量
-            quantity = self.calculate_order_size(mark_price, balance, leverage=plan.leverage)
-            
-            # 计算实际需要的保证金
-            # 订单价值 = quantity * mark_price
-            order_value = quantity * mark_price
-            # 需要的保证金 = 订单价值 / 杠杆 = allocation（应该等于 balance * position_pct）
-            required_margin = order_value / Decimal(str(plan.leverage))
-            
-            log_key_event("INFO", "计划 {}: 计算数量={}, 订单价值={} USDT, 需要保证金={} USDT, 可用保证金={} USDT", 
-                       plan.id, quantity, order_value, required_margin, balance)
-            
-            # 检查保证金是否足够（留一点余量，避免精度问题）
-            if required_margin > balance * Decimal("0.99"):  # 留1%的余量
-                error_msg = f"保证金不足: 需要 {required_margin} USDT, 可用 {balance} USDT"
-                logger.error("计划 {}: {}", plan.id, error_msg)
-                raise ValueError(error_msg)
-        finally:
-            # 恢复原始设置
-            self.settings.position_pct = original_position_pct
+        # 只接受足够新的缓存（execution_balance_max_age），避免使用过期余额，
+        # 同时让短时间内连续执行的计划共享一次余额查询（任何订单成交后缓存即被丢弃，不会跨成交复用）
+        max_age = self.settings.execution_balance_max_age
+        balance, mark_price = self._prepare_order(
+            symbol, int(plan.leverage), lambda: self.client.get_futures_balance(max_age=max_age)
+        )
+        quantity, _ = self._size_manual_plan(plan, balance, mark_price)
         
         # 执行订单（根据配置选择市价单或限价单，并检查滑点）
-        plan_slippage_pct = (
-            float(plan.max_slippage_pct)
-            if getattr(plan, "max_slippage_pct", None) is not None
-            else self.settings.max_slippage_pct
-        )
         order_result = self._place_order_with_timeout(
             symbol,
             plan.side.upper(),
             quantity,
             mark_price,
-            max_slippage_pct=plan_slippage_pct,
+            max_slippage_pct=self._plan_slippage_pct(plan),
+        )
+        order_id, position_id = self._record_fill(
+            plan,
+            symbol=symbol,
+            side=plan.side.upper(),
+            order_result=order_result,
+            mark_price=mark_price,
+            quantity=quantity,
+            now=datetime.now(timezone.utc),
+            manual_plan_id=plan.id,
         )
-        order_id = str(order_result.get("orderId") or order_result.get("order_id") or order_result.get("clientOrderId", ""))
-        
-        # 检查订单状态，确保订单已成交
-        order_status = order_result.get("status", "").upper()
-        if order_status not in ["FILLED", "PARTIALLY_FILLED"]:
-            # 如果订单未成交，抛出异常
-            raise ValueError(f"订单未成交，状态: {order_status}, 订单ID: {order_id}")
         
-        # 获取实际成交价格和数量
-        # 对于市价单，使用 avgPrice 或 price；对于限价单，使用 avgPrice（平均成交价）
-        actual_price = None
-        if order_result.get("avgPrice"):
-            actual_price = Decimal(str(order_result.get("avgPrice")))
-        elif order_result.get("price"):
-            actual_price = Decimal(str(order_result.get("price")))
-        else:
-            actual_price = mark_price
+        self.db.commit()
+        self._log_manual_plan_done(plan, order_id, position_id)
+
+    def execute_manual_plans_batch(self, plans: list[ManualPlan]) -> dict[str, Exception | None]:
+        """批量执行同时到期的手动计划（仅市价单）
         
-        # 获取实际成交数量
-        actual_quantity = Decimal(str(order_result.get("executedQty", "0")))
-        if actual_quantity <= 0:
-            # 如果成交数量为0，使用原始数量（部分成交的情况）
-            actual_quantity = Decimal(str(order_result.get("origQty", quantity)))
+        下单前查询（杠杆、余额、标记价格）并发执行且余额只查询一次，
+        订单按每批 BATCH_ORDERS_LIMIT 个通过 batchOrders 接口提交，最后统一提交数据库。
+        同一交易对只有第一个计划参与批量下单（杠杆是按交易对设置的），其余计划在批量完成后逐个执行。
         
-        if actual_quantity <= 0:
-            raise ValueError(f"订单成交数量无效: {actual_quantity}, 订单ID: {order_id}")
+        Returns:
+            {计划ID: None 表示执行成功，否则为失败原因}
+        """
+        results: dict[str, Exception | None] = {}
+        batch: dict[str, ManualPlan] = {}  # {symbol: plan}
+        deferred: list[ManualPlan] = []
+        for plan in plans:
+            symbol = _manual_plan_symbol(plan)
+            if symbol in batch:
+                deferred.append(plan)
+            else:
+                batch[symbol] = plan
         
-        # 创建持仓记录，使用手动计划中的参数
-        log_key_event("INFO", "创建持仓记录: 杠杆=%sx, 止损=%s%%, 滑动退出=%s%% (来自手动计划 %s)", 
-                     plan.leverage, float(plan.stop_loss_pct) * 100, float(plan.trailing_exit_pct) * 100, plan.id)
-        position = Position(
-            manual_plan_id=plan.id,
-            symbol=symbol,
-            side=plan.side.upper(),
-            status=PositionStatus.ACTIVE,
-            order_id=order_id,
-            entry_price=actual_price,
-            entry_quantity=actual_quantity,
-            entry_time=datetime.now(timezone.utc),
-            leverage=plan.leverage,
-            trailing_exit_pct=plan.trailing_exit_pct,
-            stop_loss_pct=plan.stop_loss_pct,
-            max_slippage_pct=plan.max_slippage_pct,
-            highest_price=actual_price,
-            lowest_price=actual_price,
-            last_check_time=datetime.now(timezone.utc),
+        if self.settings.websocket_price_enabled:
+            try:
+                get_websocket_price_service().subscribe_batch(list(batch))
+            except Exception as exc:
+                logger.debug("批量订阅WebSocket失败: {}", exc)
+        
+        # 1. 所有下单前查询一次性提交到线程池（余额只查一次）
+        pool = self._pretrade_pool
+        warmups = [pool.submit(self.client.get_symbol_info, symbol) for symbol in batch]
+        warmups.append(pool.submit(self.client.get_position_mode))
+        leverage_futures = {
+            symbol: pool.submit(self.client.set_leverage, symbol, int(plan.leverage))
+            for symbol, plan in batch.items()
+        }
+        balance_future = pool.submit(
+            self.client.get_futures_balance, max_age=self.settings.execution_balance_max_age
         )
-        self.db.add(position)
+        ws_prices = {symbol: self._ws_mark_price(symbol) for symbol in batch}
+        price_futures = {
+            symbol: pool.submit(self.client.get_mark_price, symbol)
+            for symbol, price in ws_prices.items()
+            if price is None
+        }
+        try:
+            for warmup in warmups:
+                warmup.result()
+            balance = balance_future.result()
+        except Exception as exc:
+            logger.error("批量执行手动计划的下单前查询失败: {}", exc)
+            for plan in plans:
+                results[plan.id] = exc
+            return results
+        
+        # 2. 依次计算每个计划的下单数量，可用保证金逐个扣减
+        orders: list[tuple[ManualPlan, str, Decimal, Decimal, dict]] = []
+        for symbol, plan in batch.items():
+            try:
+                leverage_futures[symbol].result()
+                mark_price = (
+                    ws_prices[symbol] or price_futures[symbol].result() or _FALLBACK_MARK_PRICE
+                )
+                quantity, required_margin = self._size_manual_plan(plan, balance, mark_price)
+                params = self.client.build_market_order_params(symbol, plan.side.upper(), quantity)
+            except Exception as exc:
+                results[plan.id] = exc
+                continue
+            balance -= required_margin
+            orders.append((plan, symbol, quantity, mark_price, params))
+        
+        # 3. 分批提交订单，逐个记录成交
+        completed: list[tuple[ManualPlan, str, str]] = []
+        for start in range(0, len(orders), BATCH_ORDERS_LIMIT):
+            chunk = orders[start:start + BATCH_ORDERS_LIMIT]
+            try:
+                responses = self.client.place_batch_orders([item[4] for item in chunk])
+            except Exception as exc:
+                logger.error("批量下单失败: {}", exc)
+                for item in chunk:
+                    results[item[0].id] = exc
+                continue
+            
+            now = datetime.now(timezone.utc)
+            for (plan, symbol, quantity, mark_price, _), response in zip(chunk, responses):
+                side = plan.side.upper()
+                savepoint = None
+                try:
+                    if "orderId" not in response:
+                        raise ValueError(
+                            f"下单失败: {response.get('msg', 'Unknown error')} (code: {response.get('code')})"
+                        )
+                    order_result = self._finalize_market_order(
+                        symbol, side, response, mark_price, max_slippage_pct=self._plan_slippage_pct(plan)
+                    )
+                    # 所有计划共用一个事务：每个计划的写入放在各自的 SAVEPOINT 里，
+                    # 写到一半失败时只回滚这个计划，不会把半条记录和成功的计划一起提交
+                    savepoint = self.db.begin_nested()
+                    order_id, position_id = self._record_fill(
+                        plan,
+                        symbol=symbol,
+                        side=side,
+                        order_result=order_result,
+                        mark_price=mark_price,
+                        quantity=quantity,
+                        now=now,
+                        manual_plan_id=plan.id,
+                    )
+                    savepoint.commit()
+                except Exception as exc:
+                    if savepoint is not None and savepoint.is_active:
+                        savepoint.rollback()
+                    logger.error("手动计划 {} 批量下单失败: {}", plan.id, exc)
+                    results[plan.id] = exc
+                    continue
+                completed.append((plan, order_id, position_id))
+        
+        # 4. 统一提交数据库
+        if completed:
+            try:
+                self.db.commit()
+            except Exception as exc:
+                self.db.rollback()
+                logger.error("批量执行手动计划提交数据库失败: {}", exc)
+                for plan, _, _ in completed:
+                    results[plan.id] = exc
+                completed = []
+        for plan, order_id, position_id in completed:
+            results[plan.id] = None
+            self._log_manual_plan_done(plan, order_id, position_id)
+        
+        # 5. 同一交易对的其余计划逐个执行
+        for plan in deferred:
+            try:
+                self.execute_manual_plan(plan)
+                results[plan.id] = None
+            except Exception as exc:
+                results[plan.id] = exc
+        return results
+
+    def _size_manual_plan(
+        self, plan: ManualPlan, balance: Decimal, mark_price: Decimal
+    ) -> tuple[Decimal, Decimal]:
+        """按计划的杠杆与仓位比例计算下单数量，并检查保证金是否足够
         
-        # 记录执行日志
-        log = ExecutionLog(
-            trade_plan_id=None,  # 手动计划没有 trade_plan
-            manual_plan_id=plan.id,
-            position_id=position.id,
-            event_type="order_filled",
-            order_id=order_id,
-            symbol=symbol,
-            side=plan.side.upper(),
-            price=actual_price,
-            quantity=actual_quantity,
-            status=order_result.get("status", "FILLED"),
-            payload=order_result,
+        Returns:
+            (下单数量, 需要的保证金)
+        """
+        # 记录余额和价格信息（明细日志可通过 execution_detail_logs 关闭）
+        detail_logs = self.settings.execution_detail_logs
+        if detail_logs:
+            log_key_event("INFO", "执行计划 {}: 可用保证金={} USDT, 标记价格={}, 杠杆={}x, 仓位比例={}", 
+                       plan.id, balance, mark_price, plan.leverage, plan.position_pct)
+        
+        # 计划杠杆只转换一次，下单数量与保证金计算共用
+        leverage = _to_decimal(plan.leverage)
+        
+        # 使用计划中的杠杆与仓位比例（作为参数传入，不修改共享的 settings）
+        quantity = self.calculate_order_size(
+            mark_price, balance, leverage=leverage, position_pct=plan.position_pct
         )
-        self.db.add(log)
         
-        self.db.commit()
+        # 计算实际需要的保证金
+        # 订单价值 = quantity * mark_price
+        order_value = quantity * mark_price
+        # 需要的保证金 = 订单价值 / 杠杆 = allocation（应该等于 balance * position_pct）
+        required_margin = order_value / leverage
+        
+        if detail_logs:
+            log_key_event("INFO", "计划 {}: 计算数量={}, 订单价值={} USDT, 需要保证金={} USDT, 可用保证金={} USDT", 
+                       plan.id, quantity, order_value, required_margin, balance)
+        
+        # 检查保证金是否足够（留一点余量，避免精度问题）
+        if required_margin > balance * _MARGIN_BUFFER:
+            error_msg = f"保证金不足: 需要 {required_margin} USDT, 可用 {balance} USDT"
+            logger.error("计划 {}: {}", plan.id, error_msg)
+            raise ValueError(error_msg)
+        return quantity, required_margin
+
+    def _plan_slippage_pct(self, plan: ManualPlan) -> float:
+        """计划自定义的最大滑点，未设置时使用系统配置"""
+        if getattr(plan, "max_slippage_pct", None) is not None:
+            return float(plan.max_slippage_pct)
+        return self.settings.max_slippage_pct
+
+    @staticmethod
+    def _log_manual_plan_done(plan: ManualPlan, order_id: str, position_id: str) -> None:
         log_key_event("INFO", "手动计划 %s 执行完成，订单ID: %s，持仓ID: %s，杠杆=%sx，止损=%s%%，滑动退出=%s%%", 
-                     plan.id, order_id, position.id, plan.leverage, 
+                     plan.id, order_id, position_id, plan.leverage, 
                      float(plan.stop_loss_pct) * 100, float(plan.trailing_exit_pct) * 100)
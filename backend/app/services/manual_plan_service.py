@@ -1,14 +1,30 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from loguru import logger
-from sqlalchemy import select
+from sqlalchemy import bindparam, exists, select
 from sqlalchemy.orm import Session
 
 from app.models.enums import ManualPlanStatus
 from app.models.manual_plan import ManualPlan
 
+# 调度器每个周期都会执行的查询在模块加载时构造一次，执行时只绑定参数
+_LIST_ALL_STMT = select(ManualPlan).order_by(ManualPlan.listing_time.asc())
+_PENDING_STMT = (
+    select(ManualPlan)
+    .where(ManualPlan.status == ManualPlanStatus.PENDING)
+    .order_by(ManualPlan.listing_time.asc())
+)
+_DUE_STMT = _PENDING_STMT.where(ManualPlan.listing_time <= bindparam("now"))
+_DUE_WITHIN_STMT = select(
+    exists().where(
+        ManualPlan.status == ManualPlanStatus.PENDING,
+        ManualPlan.listing_time > bindparam("now"),
+        ManualPlan.listing_time <= bindparam("until"),
+    )
+)
+
 
 class ManualPlanService:
     def __init__(self, db: Session) -> None:
@@ -21,29 +37,22 @@ class ManualPlanService:
         self.db.refresh(plan)
         return plan
 
-    def list_all(self) -> list[ManualPlan]:
-        stmt = select(ManualPlan).order_by(ManualPlan.listing_time.asc())
+    def list_all(self, limit: int | None = None) -> list[ManualPlan]:
+        stmt = _LIST_ALL_STMT if limit is None else _LIST_ALL_STMT.limit(limit)
         return list(self.db.scalars(stmt))
 
     def get_pending_plans(self) -> list[ManualPlan]:
         """获取所有待执行的计划（包括未到时间的）"""
-        stmt = (
-            select(ManualPlan)
-            .where(ManualPlan.status == ManualPlanStatus.PENDING)
-            .order_by(ManualPlan.listing_time.asc())
-        )
-        return list(self.db.scalars(stmt))
+        return list(self.db.scalars(_PENDING_STMT))
+
+    def has_plan_due_within(self, seconds: float) -> bool:
+        """是否有待执行的计划将在 seconds 秒内到达执行时间（EXISTS 查询，不加载计划）"""
+        now = datetime.now(timezone.utc)
+        return bool(self.db.scalar(_DUE_WITHIN_STMT, {"now": now, "until": now + timedelta(seconds=seconds)}))
 
     def due_plans(self) -> list[ManualPlan]:
         """获取已到执行时间的计划"""
-        now = datetime.now(timezone.utc)
-        stmt = (
-            select(ManualPlan)
-            .where(ManualPlan.status == ManualPlanStatus.PENDING)
-            .where(ManualPlan.listing_time <= now)
-            .order_by(ManualPlan.listing_time.asc())
-        )
-        return list(self.db.scalars(stmt))
+        return list(self.db.scalars(_DUE_STMT, {"now": datetime.now(timezone.utc)}))
 
     def mark_status(self, plan: ManualPlan, status: ManualPlanStatus) -> ManualPlan:
         plan.status = status
@@ -3,61 +3,209 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
-import os
+from itertools import groupby
+from operator import attrgetter
 import time
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 
 from loguru import logger
-from sqlalchemy import select, update
+from sqlalchemy import DateTime, Numeric, String, cast, column, exists, func, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.core.config import Settings, get_settings
 from app.core.logging_config import log_key_event
-from app.models.enums import PositionStatus, ManualPlanStatus
+from app.models.enums import PositionStatus, ManualPlanStatus, TradePlanStatus
 from app.models.manual_plan import ManualPlan
 from app.models.position import Position
 from app.models.execution_log import ExecutionLog
-from app.services.binance_service import BinanceFuturesClient
+from app.models.trade_plan import TradePlan
+from app.services.binance_service import BinanceFuturesClient, BinancePosition, quantize_to_step
+from app.services.binance_websocket_service import get_websocket_price_service
 from app.services.execution_service import ExecutionService
 
-_closing_positions: set[str] = set()
+_SYSTEM_EXECUTION_EVENTS = ("order_filled", "position_closed")  # 系统下单成交/系统平仓
+_DECIMAL_ONE = Decimal("1")
+_DECIMAL_EPSILON = Decimal("0.0001")  # 退出参数比较容差
+_CLOSE_FILLED_STATUSES = frozenset({"FILLED", "COMPLETED"})
+_CLOSE_FAILED_STATUSES = frozenset({"CANCELED", "REJECTED", "EXPIRED"})
+_CLOSE_FILL_TIMEOUT = 7.5  # 平仓单等待成交的最长时间（秒）
+_TRACKING_ATTRS = ("highest_price", "lowest_price", "last_check_time")  # 每次同步/监控都会写入的追踪字段
+_INTERRUPT_THRESHOLD = 300  # 距上次检查超过5分钟认为系统可能中断过，需要从K线恢复最高/最低价
+_closing_positions: dict[str, float] = {}  # {position_id: 开始平仓的 monotonic 时间}
 _closing_lock = Lock()
+_CLOSING_STALE_AFTER = 120.0  # 平仓登记的最长有效期（秒），超过仍未移除视为平仓线程已异常退出
+_ERROR_TRACE_INTERVAL = 60.0  # 同类循环错误输出完整堆栈的最小间隔（秒）
+_error_trace_ts: dict[str, float] = {}  # {错误类别: 上次输出堆栈的时间}
+
+
+def _log_loop_error(context: str, message: str, *args, exc: Exception) -> None:
+    """逐持仓循环里的错误日志：同类错误每 _ERROR_TRACE_INTERVAL 秒只输出一次完整堆栈，其余只记录错误信息
+
+    币安故障时每个持仓每个周期都会报错，逐条格式化堆栈的开销会超过监控本身。
+    """
+    key = f"{context}:{type(exc).__name__}"
+    now = time.monotonic()
+    if now - _error_trace_ts.get(key, 0.0) >= _ERROR_TRACE_INTERVAL:
+        _error_trace_ts[key] = now
+        logger.opt(exception=exc).error(message, *args)
+    else:
+        logger.error(message, *args)
+
+
+def _begin_closing(position_id: str) -> float | None:
+    """登记正在平仓的持仓，返回登记时间（结束时交给 _end_closing）；已在平仓中则返回 None
+
+    超过 _CLOSING_STALE_AFTER 秒仍未移除的登记（平仓线程崩溃等）视为失效，由本次调用接管，
+    否则该持仓会被永久跳过，既不平仓也不参与同步对账。
+    """
+    started = time.monotonic()
+    with _closing_lock:
+        previous = _closing_positions.get(position_id)
+        if previous is not None and started - previous < _CLOSING_STALE_AFTER:
+            return None
+        _closing_positions[position_id] = started
+    if previous is not None:
+        logger.warning("持仓 {} 的平仓登记已超过 {:.0f} 秒未结束，视为失效并重新平仓", position_id, started - previous)
+    return started
+
+
+def _end_closing(position_id: str, started: float) -> None:
+    """平仓结束（提交或失败回滚）后移除登记；登记已被其他线程接管时保留"""
+    with _closing_lock:
+        if _closing_positions.get(position_id) == started:
+            del _closing_positions[position_id]
+
+
+def _is_closing(position_id: str) -> bool:
+    """该持仓是否正在平仓（失效的登记不算）"""
+    started = _closing_positions.get(position_id)
+    return started is not None and time.monotonic() - started < _CLOSING_STALE_AFTER
+
+
+def _as_decimal(value: Decimal | float | int | str) -> Decimal:
+    """转换为 Decimal：Numeric 列和价格缓存本来就是 Decimal，直接返回，避免 Decimal(str(...)) 重复构造"""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def _decimal_close(d1: Decimal, d2: Decimal) -> bool:
+    """比较两个Decimal是否相等（处理精度问题）"""
+    return -_DECIMAL_EPSILON < d1 - d2 < _DECIMAL_EPSILON
+
+
+def _kline_high_low(klines: list) -> tuple[Decimal | None, Decimal | None]:
+    """取K线区间的最高价/最低价（K线格式：[开盘时间, 开盘价, 最高价, 最低价, ...]）
+
+    按 float 比较找出极值所在的K线，只对这两个值构造 Decimal，而不是每根K线都转换一次。
+    """
+    if not klines:
+        return None, None
+    high_kline = max(klines, key=lambda k: float(k[2]))
+    low_kline = min(klines, key=lambda k: float(k[3]))
+    return Decimal(str(high_kline[2])), Decimal(str(low_kline[3]))
+
+
+def _kline_recovery_window(start_time: datetime, now: datetime) -> tuple[int, int, str, int]:
+    """计算中断恢复要查询的K线范围，返回 (start_ms, end_ms, interval, limit)
+
+    根据中断时长动态选择K线精度（精度很重要，滑动退出需要精确的最高/最低价）。
+    """
+    start_time_ms = int(start_time.timestamp() * 1000)
+    end_time_ms = int(now.timestamp() * 1000)
+    time_range_hours = (end_time_ms - start_time_ms) / (1000 * 3600)
+    if time_range_hours <= 1:
+        # 1小时内：使用1分钟K线，最多1000条（约16.7小时）
+        return start_time_ms, end_time_ms, "1m", 1000
+    if time_range_hours <= 8:
+        # 1-8小时：使用1分钟K线，最多500条（约8.3小时）
+        return start_time_ms, end_time_ms, "1m", 500
+    if time_range_hours <= 24:
+        # 8-24小时：使用5分钟K线，最多500条（约41.7小时）
+        return start_time_ms, end_time_ms, "5m", 500
+    # 超过24小时：使用15分钟K线，最多500条（约125小时）
+    return start_time_ms, end_time_ms, "15m", 500
 
 
 class PositionService:
     """实时监控持仓并执行退出策略"""
 
+    # 中断恢复时并发拉取多个持仓的K线（纯 I/O，线程等待网络时会释放 GIL）
+    _kline_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="kline-recovery")
+    # 上次完整同步时的指纹：(币安持仓快照哈希, 数据库活跃持仓签名)（类级别共享，同步任务每次新建服务对象）
+    _sync_fingerprint: tuple[int, tuple[int, datetime | None]] | None = None
+    _sync_fingerprint_ts: float = 0.0
+    _sync_state_lock = Lock()
+
     def __init__(self, db: Session, settings: Settings | None = None) -> None:
         self.db = db
         self.settings = settings or get_settings()
         self.client = BinanceFuturesClient(self.settings)
         self.executor = ExecutionService(db, settings)
+        self._execution_record_cache: dict[str, bool] = {}  # {position_id: 是否有系统成交/关闭记录}
+        self._recent_closes: dict[str, ExecutionLog] | None = None  # 批量平仓前预加载的最近系统关闭记录
 
     def _has_system_execution_record(self, position: Position) -> bool:
-        """判断该持仓是否有系统成交记录（order_filled）或系统关闭记录（position_closed）"""
-        # 检查是否有 order_filled 记录（系统下单成交）
+        """判断该持仓是否有系统成交记录（order_filled）或系统关闭记录（position_closed）
+        
+        两类记录用一次 IN 查询判断；结果按持仓缓存在本服务实例上（实例随每个任务周期创建）。
+        """
+        position_id = str(position.id)
+        cached = self._execution_record_cache.get(position_id)
+        if cached is not None:
+            return cached
         stmt = (
             select(ExecutionLog.id)
             .where(ExecutionLog.position_id == position.id)
-            .where(ExecutionLog.event_type == "order_filled")
+            .where(ExecutionLog.event_type.in_(_SYSTEM_EXECUTION_EVENTS))
             .limit(1)
         )
-        if self.db.scalar(stmt) is not None:
-            return True
-        
-        # 检查是否有 position_closed 记录（系统关闭订单）
-        stmt = (
-            select(ExecutionLog.id)
-            .where(ExecutionLog.position_id == position.id)
+        has_record = self.db.scalar(stmt) is not None
+        self._execution_record_cache[position_id] = has_record
+        return has_record
+
+    def _active_positions_signature(self) -> tuple[int, datetime | None]:
+        """数据库侧活跃持仓的签名（数量, 最新创建时间），一次聚合查询
+
+        执行服务新建持仓、平仓或其他会话修改状态都会改变它；
+        追踪字段（最高/最低价、检查时间）的更新不影响它，不会让同步指纹频繁失效。
+        """
+        count, newest = self.db.execute(
+            select(func.count(), func.max(Position.created_at))
+            .where(Position.status == PositionStatus.ACTIVE)
+        ).one()
+        return count, newest
+
+    def _load_recent_close_logs(
+        self, position_ids: list[str], now: datetime | None = None
+    ) -> dict[str, ExecutionLog]:
+        """一次查询取出这些持仓最近5分钟内最新的系统关闭记录（position_closed），按持仓ID返回"""
+        if not position_ids:
+            return {}
+        recent_time = (now or datetime.now(timezone.utc)) - timedelta(minutes=5)
+        logs = self.db.scalars(
+            select(ExecutionLog)
+            .where(ExecutionLog.position_id.in_(position_ids))
             .where(ExecutionLog.event_type == "position_closed")
-            .limit(1)
+            .where(ExecutionLog.created_at >= recent_time)
+            .order_by(ExecutionLog.position_id, ExecutionLog.created_at.desc())
+            .distinct(ExecutionLog.position_id)
         )
-        return self.db.scalar(stmt) is not None
+        return {log.position_id: log for log in logs}
 
-    def _finalize_missing_position(self, position: Position, exit_price: Decimal | None, default_reason: str = "external_closed") -> str:
+    def _finalize_missing_position(
+        self,
+        position: Position,
+        exit_price: Decimal | None,
+        default_reason: str = "external_closed",
+        now: datetime | None = None,
+    ) -> str:
         """当币安上找不到持仓时，更新本地持仓的退出信息"""
         reason = default_reason
         if default_reason == "external_closed" and not self._has_system_execution_record(position):
@@ -65,19 +213,19 @@ class PositionService:
         position.status = PositionStatus.CLOSED
         position.exit_price = exit_price or position.exit_price or position.entry_price
         position.exit_quantity = position.exit_quantity or Decimal("0")
-        position.exit_time = datetime.now(timezone.utc)
+        position.exit_time = now or datetime.now(timezone.utc)
         position.exit_reason = reason
         return reason
 
     def _confirm_position_absent_on_binance(self, symbol: str, side: str, attempts: int = 2, delay: float = 0.2) -> bool:
-        """通过多次查询币安持仓确认该交易对确实不存在"""
+        """通过多次查询币安持仓确认该交易对确实不存在（只查询该交易对）"""
         for attempt in range(attempts):
-            binance_positions = self.client.get_positions_from_binance()
+            binance_positions = self.client.get_positions_from_binance(symbol)
             if binance_positions is None:
                 logger.warning("第%d次检查币安持仓失败，无法确认 %s %s 是否存在", attempt + 1, symbol, side)
                 return False
             for bp in binance_positions:
-                if bp["symbol"] == symbol and bp["side"] == side:
+                if bp.symbol == symbol and bp.side == side:
                     logger.debug("二次确认：持仓 %s %s 在币安仍存在", symbol, side)
                     return False
             if attempt < attempts - 1:
@@ -111,12 +259,43 @@ class PositionService:
         plan.updated_at = datetime.now(timezone.utc)
         logger.info("手动计划 %s 已全部执行完成，状态更新为 EXECUTED", plan.id)
 
-    def monitor_positions(self, sync_from_binance: bool = True) -> None:
+    def _finalize_manual_plans(self, manual_plan_ids: set[str]) -> None:
+        """批量版 _finalize_manual_plan_if_needed：一次 GROUP BY 找出仍有活跃持仓的计划，一条 UPDATE 完成其余计划"""
+        still_active = set(self.db.scalars(
+            select(Position.manual_plan_id)
+            .where(Position.status == PositionStatus.ACTIVE)
+            .where(Position.manual_plan_id.in_(manual_plan_ids))
+            .group_by(Position.manual_plan_id)
+        ))
+        to_finalize = manual_plan_ids - still_active
+        if not to_finalize:
+            return
+        finalized = list(self.db.scalars(
+            update(ManualPlan)
+            .where(ManualPlan.id.in_(to_finalize))
+            .where(ManualPlan.status.not_in([
+                ManualPlanStatus.CANCELLED,
+                ManualPlanStatus.FAILED,
+                ManualPlanStatus.EXECUTED,
+            ]))
+            .values(status=ManualPlanStatus.EXECUTED, updated_at=datetime.now(timezone.utc))
+            .returning(ManualPlan.id)
+            .execution_options(synchronize_session=False)
+        ))
+        self.db.commit()
+        for plan_id in finalized:
+            logger.info("手动计划 {} 已全部执行完成，状态更新为 EXECUTED", plan_id)
+
+    def monitor_positions(self, sync_from_binance: bool = True) -> float | None:
         """
         监控所有活跃持仓，检查是否需要退出
         
         Args:
             sync_from_binance: 是否在监控前同步币安持仓（默认True，确保监控所有持仓包括非系统下单的）
+        
+        Returns:
+            当前价格距最近退出触发价的比例（所有持仓中的最小值，0.01 表示 1%），
+            没有活跃持仓时返回 None。调度器据此调整监控频率。
         """
         # 定期同步币安持仓（确保监控所有持仓，包括非系统下单的）
         if sync_from_binance:
@@ -130,110 +309,60 @@ class PositionService:
         positions = list(self.db.scalars(stmt))
         
         if not positions:
-            return
+            return None
         
-        # 批量获取所有持仓的价格（一次API调用，大幅提升性能）
+        # 批量获取所有持仓的价格（WebSocket 缓存 -> 批量 REST -> 并发单个 REST，均在客户端内处理）
         symbols = list(set(pos.symbol for pos in positions))
-        prices = {}
         try:
-            # 优先使用批量获取价格（如果支持）
-            if hasattr(self.client, 'get_mark_prices_batch'):
-                prices = self.client.get_mark_prices_batch(symbols)
-            else:
-                # 降级：逐个获取（但尽量减少调用）
-                for symbol in symbols:
-                    try:
-                        price = self.client.get_mark_price(symbol)
-                        if price:
-                            prices[symbol] = price
-                    except Exception:
-                        pass  # 单个价格获取失败不影响其他
+            prices = self.client.get_mark_prices_batch(symbols)
         except Exception as exc:
             logger.debug("批量获取价格失败: {}", exc)
             prices = {}
         
-        # 并行处理持仓（充分利用多核CPU）
-        CPU_COUNT = os.cpu_count() or 4
-        PARALLEL_THRESHOLD = 2  # 持仓数>=2时使用并行处理
-        
         positions_to_update = []  # 需要更新最高/最低价的持仓
         positions_to_close = []  # 需要关闭的持仓
         
         fallback_symbols: set[str] = set()
         
-        def _resolve_price(position: Position) -> Decimal | None:
-            current_price = prices.get(position.symbol)
+        # 每个交易对只解析一次价格（同一交易对的多个持仓共用），缺价的交易对在这里一次性确定回退值
+        symbol_prices: dict[str, Decimal | None] = {}
+        for symbol in symbols:
+            current_price = prices.get(symbol)
             if current_price:
-                return Decimal(str(current_price))
-            cached_price = self.client.get_cached_price(position.symbol)
-            if cached_price:
-                fallback_symbols.add(position.symbol)
-                return Decimal(str(cached_price))
-            # 缺少实时价格时，使用入场价作为保守值
-            fallback_symbols.add(position.symbol)
-            return position.entry_price
+                symbol_prices[symbol] = _as_decimal(current_price)
+                continue
+            fallback_symbols.add(symbol)
+            cached_price = self.client.get_cached_price(symbol)
+            # 缺少实时价格时，按持仓使用入场价作为保守值
+            symbol_prices[symbol] = _as_decimal(cached_price) if cached_price else None
         
-        if len(positions) >= PARALLEL_THRESHOLD:
-            # 多个持仓时并行处理（充分利用CPU资源）
-            max_workers = min(len(positions), CPU_COUNT, 8)  # 最多8个并发，避免过多线程
-            
-            def _check_single_position(pos_data: tuple) -> tuple:
-                """检查单个持仓（用于并行处理）"""
-                position, current_price = pos_data
-                try:
-                    current_price_decimal = Decimal(str(current_price))
-                    should_exit, exit_reason = self._should_exit_position(position, current_price_decimal)
-                    
-                    if should_exit:
-                        return ("close", position, current_price_decimal, exit_reason, None)
-                    elif self._should_update_high_low(position, current_price_decimal):
-                        return ("update", position, current_price_decimal, None, None)
-                    else:
-                        return ("none", position, None, None, None)
-                except Exception as exc:
-                    logger.error("并行检查持仓 %s 时出错: %s", position.id, exc, exc_info=True)
-                    return ("error", position, None, None, exc)
-            
-            # 准备数据
-            position_data = []
-            for position in positions:
-                current_price = _resolve_price(position)
-                if current_price:
-                    position_data.append((position, current_price))
-            
-            # 并行处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(_check_single_position, data): data[0] 
-                          for data in position_data}
+        # 退出判断是纯 Decimal 计算、没有 I/O，受 GIL 限制线程池并不能并行，
+        # 单次串行遍历即可（省去每个周期创建线程池和调度 Future 的开销）
+        nearest_trigger_pct = 1.0
+        for position in positions:
+            try:
+                current_price_decimal = symbol_prices[position.symbol] or position.entry_price
+                if current_price_decimal is None:
+                    logger.debug("无法获取 %s 的标记价格，跳过本次检查", position.symbol)
+                    continue
+                should_exit, exit_reason = self._should_exit_position(position, current_price_decimal)
                 
-                for future in as_completed(futures):
-                    position = futures[future]
-                    try:
-                        action, pos, price, reason, error = future.result()
-                        if action == "close":
-                            positions_to_close.append((pos, price, reason))
-                        elif action == "update":
-                            positions_to_update.append((pos, price))
-                        elif action == "error":
-                            logger.error("持仓 %s 检查失败", position.id)
-                    except Exception as exc:
-                        logger.error("获取持仓 %s 检查结果失败: %s", position.id, exc)
-        else:
-            # 单个持仓时串行处理（避免线程开销）
-            for position in positions:
-                try:
-                    current_price_decimal = _resolve_price(position)
-                    if current_price_decimal is None:
-                        logger.debug("无法获取 %s 的标记价格，跳过本次检查", position.symbol)
-                        continue
-                    should_exit, exit_reason = self._should_exit_position(position, current_price_decimal)
-                    
-                    if should_exit:
-                        positions_to_close.append((position, current_price_decimal, exit_reason))
-                    elif self._should_update_high_low(position, current_price_decimal):
-                        positions_to_update.append((position, current_price_decimal))
-                except Exception as exc:
-                    logger.error("监控持仓 %s 时出错: %s", position.id, exc, exc_info=True)
+                if should_exit:
+                    positions_to_close.append((position, current_price_decimal, exit_reason))
+                    nearest_trigger_pct = 0.0
+                    continue
+                if self._should_update_high_low(position, current_price_decimal):
+                    positions_to_update.append((position, current_price_decimal))
+                if symbol_prices[position.symbol] is None:
+                    # 没有实时价格时无法判断距离，按最近处理（保持高频）
+                    nearest_trigger_pct = 0.0
+                else:
+                    nearest_trigger_pct = min(
+                        nearest_trigger_pct, self._trigger_distance_pct(position, current_price_decimal)
+                    )
+            except Exception as exc:
+                _log_loop_error("monitor", "监控持仓 {} 时出错: {}", position.id, exc, exc=exc)
+                nearest_trigger_pct = 0.0
         
         if fallback_symbols:
             symbols_preview = ", ".join(sorted(fallback_symbols)[:5])
@@ -246,17 +375,58 @@ class PositionService:
             )
         
         # 执行关闭操作（串行执行，避免并发问题）
-        for position, current_price, exit_reason in positions_to_close:
+        # 手动计划的完成状态在全部平仓后一次性判断，避免每个持仓各查一次计划和剩余持仓
+        closed_manual_plan_ids: set[str] = set()
+        binance_snapshot = None
+        if len(positions_to_close) > 1:
+            # 多个持仓同时平仓时只查询一次币安持仓（不同交易对/方向的平仓不会影响彼此的数量）
+            binance_positions = self.client.get_positions_from_binance()
+            if binance_positions is not None:
+                binance_snapshot = {(bp.symbol, bp.side): bp for bp in binance_positions}
+        if positions_to_close:
+            # 币安上已无持仓时需要查最近的系统关闭记录，这里一次性预加载，避免逐个持仓查询
+            try:
+                self._recent_closes = self._load_recent_close_logs([position.id for position, _, _ in positions_to_close])
+            except Exception as exc:
+                logger.debug("预加载系统关闭记录失败（平仓时逐个查询）: {}", exc)
+                self.db.rollback()
+        # 平仓期间每个持仓各自提交，提交时不让其他持仓过期（否则后面的最高/最低价更新会逐个重新加载）
+        expire_on_commit = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        # 数据库里可能有同一 (symbol, side) 的重复持仓（同步任务稍后才合并）：
+        # 该方向平过一次仓后快照已过期，后面同方向的持仓改为按交易对重新查询，避免再发一笔平仓单
+        snapshot_used_keys: set[tuple[str, str]] = set()
+        try:
+            for position, current_price, exit_reason in positions_to_close:
+                key = (position.symbol, position.side)
+                snapshot = binance_snapshot if key not in snapshot_used_keys else None
+                snapshot_used_keys.add(key)
+                try:
+                    closed = self._close_position(
+                        position, current_price, exit_reason,
+                        finalize_manual_plan=False, binance_snapshot=snapshot,
+                    )
+                    # 只有本次下单平仓并已提交的持仓才会更新手动计划状态（与单个平仓的路径一致）
+                    if closed and position.manual_plan_id:
+                        closed_manual_plan_ids.add(position.manual_plan_id)
+                except Exception as exc:
+                    _log_loop_error("close", "关闭持仓 {} 失败: {}", position.id, exc, exc=exc)
+        finally:
+            self.db.expire_on_commit = expire_on_commit
+            self._recent_closes = None
+        if closed_manual_plan_ids:
             try:
-                self._close_position(position, current_price, exit_reason)
+                self._finalize_manual_plans(closed_manual_plan_ids)
             except Exception as exc:
-                logger.error("关闭持仓 %s 失败: %s", position.id, exc, exc_info=True)
+                logger.error("更新手动计划完成状态失败: {}", exc)
+                self.db.rollback()
         
         # 批量更新最高/最低价（优化：使用SQL批量更新减少数据库往返）
         if positions_to_update:
             try:
                 now = datetime.now(timezone.utc)
-                INTERRUPT_THRESHOLD = 300  # 5分钟
+                # 中断判定的时间点只算一次，循环里直接比较 datetime，不再逐个做减法和 total_seconds()
+                interrupt_threshold_time = now - timedelta(seconds=_INTERRUPT_THRESHOLD)
                 
                 # 分离需要中断恢复的持仓和正常更新的持仓
                 normal_updates = {}  # {position_id: (position, current_price, new_high, new_low)}
@@ -265,8 +435,7 @@ class PositionService:
                 for position, current_price in positions_to_update:
                     # 检测系统中断
                     last_check = position.last_check_time or position.entry_time or now
-                    time_since_last_check = (now - last_check).total_seconds()
-                    is_likely_interrupted = time_since_last_check > INTERRUPT_THRESHOLD
+                    is_likely_interrupted = last_check < interrupt_threshold_time
                     
                     # 需要中断恢复的持仓单独处理（需要查询K线数据）
                     if is_likely_interrupted and (position.highest_price is None or position.lowest_price is None):
@@ -277,51 +446,29 @@ class PositionService:
                         new_low = min(position.lowest_price or position.entry_price, current_price)
                         normal_updates[position.id] = (position, current_price, new_high, new_low)
                 
-                # 处理中断恢复（需要逐个处理，因为需要查询K线）
+                # 处理中断恢复：先并发提交所有K线请求（各自一次 REST 往返，互不依赖），再逐个应用结果
+                kline_futures = {}
+                for position, current_price in interrupt_recovery_needed:
+                    # 计算需要查询的时间范围
+                    start_time = position.entry_time or position.last_check_time or (now - timedelta(hours=8))
+                    start_time_ms, end_time_ms, interval, limit = _kline_recovery_window(start_time, now)
+                    logger.info("从K线数据恢复历史价格: %s %s, 中断时间=%.1f小时, 使用K线间隔=%s, limit=%d", 
+                              position.id, position.symbol, (end_time_ms - start_time_ms) / (1000 * 3600), interval, limit)
+                    kline_futures[position.id] = self._kline_pool.submit(
+                        self.client.get_klines,
+                        symbol=position.symbol,
+                        interval=interval,
+                        limit=limit,
+                        start_time=start_time_ms,
+                        end_time=end_time_ms,
+                    )
+                
                 for position, current_price in interrupt_recovery_needed:
                     try:
-                        # 计算需要查询的时间范围
-                        start_time = position.entry_time or position.last_check_time or (now - timedelta(hours=8))
-                        start_time_ms = int(start_time.timestamp() * 1000)
-                        end_time_ms = int(now.timestamp() * 1000)
-                        
-                        # 根据中断时间动态选择K线精度（精度很重要，滑动退出需要精确的最高/最低价）
-                        time_range_hours = (end_time_ms - start_time_ms) / (1000 * 3600)
-                        if time_range_hours <= 1:
-                            # 1小时内：使用1分钟K线，最多1000条（约16.7小时）
-                            interval = "1m"
-                            limit = 1000
-                        elif time_range_hours <= 8:
-                            # 1-8小时：使用1分钟K线，最多500条（约8.3小时）
-                            interval = "1m"
-                            limit = 500
-                        elif time_range_hours <= 24:
-                            # 8-24小时：使用5分钟K线，最多500条（约41.7小时）
-                            interval = "5m"
-                            limit = 500
-                        else:
-                            # 超过24小时：使用15分钟K线，最多500条（约125小时）
-                            interval = "15m"
-                            limit = 500
-                        
-                        logger.info("从K线数据恢复历史价格: %s %s, 中断时间=%.1f小时, 使用K线间隔=%s, limit=%d", 
-                                  position.id, position.symbol, time_range_hours, interval, limit)
-                        
-                        # 获取K线数据（使用动态选择的精度）
-                        klines = self.client.get_klines(
-                            symbol=position.symbol,
-                            interval=interval,
-                            limit=limit,
-                            start_time=start_time_ms,
-                            end_time=end_time_ms
-                        )
+                        klines = kline_futures[position.id].result()
                         
                         if klines:
-                            kline_highs = [Decimal(str(k[2])) for k in klines]
-                            kline_lows = [Decimal(str(k[3])) for k in klines]
-                            
-                            recovered_high = max(kline_highs) if kline_highs else None
-                            recovered_low = min(kline_lows) if kline_lows else None
+                            recovered_high, recovered_low = _kline_high_low(klines)
                             
                             # 使用恢复的数据更新最高/最低价
                             if recovered_high and (position.highest_price is None or recovered_high > position.highest_price):
@@ -345,27 +492,50 @@ class PositionService:
                     new_low = min(position.lowest_price or position.entry_price, current_price)
                     normal_updates[position.id] = (position, current_price, new_high, new_low)
                 
-                # SQL批量更新（大幅减少数据库往返）
+                # SQL批量更新：UPDATE ... FROM (VALUES ...) 一条语句更新所有持仓
+                # （bulk_update_mappings 仍会逐行执行 UPDATE）
                 if normal_updates:
-                    # 使用SQLAlchemy的bulk_update_mappings进行批量更新
-                    update_mappings = []
-                    for pos_id, (position, current_price, new_high, new_low) in normal_updates.items():
-                        update_mappings.append({
-                            'id': pos_id,
-                            'highest_price': new_high,
-                            'lowest_price': new_low,
-                            'last_check_time': now
-                        })
-                    
-                    # 批量更新
-                    self.db.bulk_update_mappings(Position, update_mappings)
+                    self._bulk_update_tracking([
+                        (pos_id, new_high, new_low, now)
+                        for pos_id, (_, _, new_high, new_low) in normal_updates.items()
+                    ])
                     self.db.commit()
                     
-                    logger.debug("批量更新了 {} 个持仓的最高/最低价", len(update_mappings))
+                    logger.debug("批量更新了 {} 个持仓的最高/最低价", len(normal_updates))
             except Exception as exc:
                 logger.error("批量更新持仓最高/最低价失败: {}", exc, exc_info=True)
                 self.db.rollback()
+        
+        return nearest_trigger_pct
     
+    def _bulk_update_tracking(self, rows: list[tuple[str, Decimal | None, Decimal | None, datetime]]) -> None:
+        """一条 UPDATE ... FROM (VALUES ...) 批量写入 (id, highest_price, lowest_price, last_check_time)
+
+        最高/最低价与库中当前值取 GREATEST/LEAST（两者都忽略 NULL）：监控与同步在各自的会话里运行，
+        同步写入时用的是它开始时加载的值，不能覆盖监控在此期间刚推高的最高价或压低的最低价，
+        否则滑动止损的基准会倒退。
+        （逐对象修改再 flush 会逐行执行 UPDATE；调用方负责提交）
+        """
+        if not rows:
+            return
+        tracking = values(
+            column("id", String),
+            column("highest_price", Numeric(32, 8)),
+            column("lowest_price", Numeric(32, 8)),
+            column("last_check_time", DateTime(timezone=True)),
+            name="position_updates",
+        ).data(rows)
+        self.db.execute(
+            update(Position)
+            .where(Position.id == cast(tracking.c.id, UUID(as_uuid=False)))
+            .values(
+                highest_price=func.greatest(Position.highest_price, tracking.c.highest_price),
+                lowest_price=func.least(Position.lowest_price, tracking.c.lowest_price),
+                last_check_time=tracking.c.last_check_time,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
     def _should_exit_position(self, position: Position, current_price: Decimal) -> tuple[bool, str]:
         """快速检查持仓是否需要退出（不执行退出，只返回结果）
         
@@ -376,35 +546,48 @@ class PositionService:
         Returns:
             (should_exit, exit_reason): (是否需要退出, 退出原因)
         """
-        # 检查止损
+        stop_loss_price, trailing_stop_price = self._exit_trigger_prices(position)
         if position.side == "BUY":
-            stop_loss_price = position.entry_price * (Decimal("1") - Decimal(str(position.stop_loss_pct)))
+            # 检查止损
             if current_price <= stop_loss_price:
                 return True, "stop_loss"
+            # 检查滑动退出
+            if trailing_stop_price is not None and current_price <= trailing_stop_price:
+                return True, "trailing_stop"
         else:
-            stop_loss_price = position.entry_price * (Decimal("1") + Decimal(str(position.stop_loss_pct)))
             if current_price >= stop_loss_price:
                 return True, "stop_loss"
+            if trailing_stop_price is not None and current_price >= trailing_stop_price:
+                return True, "trailing_stop"
         
-        # 检查滑动退出（使用保守的默认值策略）
-        # 改进1：如果 highest_price 为 None，使用 entry_price 而不是 current_price（更保守）
-        # 这样可以避免从当前价格开始计算，保持保守策略
+        return False, ""
+    
+    def _exit_trigger_prices(self, position: Position) -> tuple[Decimal, Decimal | None]:
+        """计算持仓的止损触发价和滑动退出触发价（无基准价时滑动退出触发价为 None）"""
         if position.side == "BUY":
-            # 做多：使用历史最高价，如果没有则使用入场价（保守策略）
+            stop_loss_price = position.entry_price * (_DECIMAL_ONE - _as_decimal(position.stop_loss_pct))
+            # 滑动退出（使用保守的默认值策略）：
+            # 如果 highest_price 为 None，使用 entry_price 而不是 current_price（更保守）
             highest = position.highest_price if position.highest_price is not None else position.entry_price
-            if highest:
-                trailing_stop_price = highest * (Decimal("1") - Decimal(str(position.trailing_exit_pct)))
-                if current_price <= trailing_stop_price:
-                    return True, "trailing_stop"
+            trailing_stop_price = highest * (_DECIMAL_ONE - _as_decimal(position.trailing_exit_pct)) if highest else None
         else:
+            stop_loss_price = position.entry_price * (_DECIMAL_ONE + _as_decimal(position.stop_loss_pct))
             # 做空：使用历史最低价，如果没有则使用入场价（保守策略）
             lowest = position.lowest_price if position.lowest_price is not None else position.entry_price
-            if lowest:
-                trailing_stop_price = lowest * (Decimal("1") + Decimal(str(position.trailing_exit_pct)))
-                if current_price >= trailing_stop_price:
-                    return True, "trailing_stop"
-        
-        return False, ""
+            trailing_stop_price = lowest * (_DECIMAL_ONE + _as_decimal(position.trailing_exit_pct)) if lowest else None
+        return stop_loss_price, trailing_stop_price
+    
+    def _trigger_distance_pct(self, position: Position, current_price: Decimal) -> float:
+        """当前价格距最近退出触发价的比例（只用于调整监控频率，float 精度足够）"""
+        if not current_price:
+            return 0.0
+        price = float(current_price)
+        distance = min(
+            abs(price - float(trigger))
+            for trigger in self._exit_trigger_prices(position)
+            if trigger is not None
+        )
+        return distance / price
     
     def _should_update_high_low(self, position: Position, current_price: Decimal) -> bool:
         """检查是否需要更新最高/最低价"""
@@ -419,7 +602,7 @@ class PositionService:
         
         Args:
             position: 持仓对象
-            current_price: 当前价格（可选，如果提供则跳过API调用，提高性能）
+            current_price: 当前价格（Decimal，可选，如果提供则跳过API调用，提高性能）
         """
         # 获取当前价格（如果未提供）
         if current_price is None:
@@ -427,9 +610,7 @@ class PositionService:
             if not price_result:
                 logger.warning("无法获取 %s 的标记价格", position.symbol)
                 return
-            current_price = Decimal(str(price_result))
-        else:
-            current_price = Decimal(str(current_price))
+            current_price = _as_decimal(price_result)
         now = datetime.now(timezone.utc)
         
         # 重要：在更新最高价/最低价之前，先保存用于滑动退出计算的基准价格
@@ -470,7 +651,7 @@ class PositionService:
         # 检查止损
         if position.side == "BUY":
             # 做多：价格下跌触发止损
-            stop_loss_price = position.entry_price * (Decimal("1") - Decimal(str(position.stop_loss_pct)))
+            stop_loss_price = position.entry_price * (_DECIMAL_ONE - _as_decimal(position.stop_loss_pct))
             if current_price <= stop_loss_price:
                 log_key_event("INFO", "持仓 %s (%s) 触发止损: 当前价 %s <= 止损价 %s (止损百分比: %s%%, 当前盈亏: %.2f%%, %.2f USDT)", 
                           position.id, position.symbol, current_price, stop_loss_price, 
@@ -484,7 +665,7 @@ class PositionService:
                            pnl_pct, pnl_value, float(position.stop_loss_pct) * 100)
         else:
             # 做空：价格上涨触发止损
-            stop_loss_price = position.entry_price * (Decimal("1") + Decimal(str(position.stop_loss_pct)))
+            stop_loss_price = position.entry_price * (_DECIMAL_ONE + _as_decimal(position.stop_loss_pct))
             if current_price >= stop_loss_price:
                 log_key_event("INFO", "持仓 %s (%s) 触发止损: 当前价 %s >= 止损价 %s (止损百分比: %s%%, 当前盈亏: %.2f%%, %.2f USDT)", 
                           position.id, position.symbol, current_price, stop_loss_price,
@@ -501,7 +682,7 @@ class PositionService:
         # 重要：使用更新前的历史最高价计算滑动止损价，避免在本次检查中更新最高价后立即触发
         if position.side == "BUY" and highest_for_trailing:
             # 基于历史最高价和当前滑动退出百分比计算退出价格
-            trailing_stop_price = highest_for_trailing * (Decimal("1") - Decimal(str(position.trailing_exit_pct)))
+            trailing_stop_price = highest_for_trailing * (_DECIMAL_ONE - _as_decimal(position.trailing_exit_pct))
             # 重要：只有当当前价格严格小于等于滑动止损价时才触发（避免浮点数精度问题）
             if current_price <= trailing_stop_price:
                 log_key_event("INFO", "持仓 %s (%s) 触发滑动退出: 当前价 %s <= 滑动止损价 %s (历史最高价: %s, 滑动退出百分比: %s%%, 当前盈亏: %.2f%%, %.2f USDT)", 
@@ -525,7 +706,7 @@ class PositionService:
         # 重要：使用更新前的历史最低价计算滑动止损价，避免在本次检查中更新最低价后立即触发
         if position.side == "SELL" and lowest_for_trailing:
             # 基于历史最低价和当前滑动退出百分比计算退出价格
-            trailing_stop_price = lowest_for_trailing * (Decimal("1") + Decimal(str(position.trailing_exit_pct)))
+            trailing_stop_price = lowest_for_trailing * (_DECIMAL_ONE + _as_decimal(position.trailing_exit_pct))
             # 重要：只有当当前价格严格大于等于滑动止损价时才触发（避免浮点数精度问题）
             if current_price >= trailing_stop_price:
                 log_key_event("INFO", "持仓 %s (%s) 触发滑动退出: 当前价 %s >= 滑动止损价 %s (历史最低价: %s, 滑动退出百分比: %s%%, 当前盈亏: %.2f%%, %.2f USDT)", 
@@ -547,163 +728,169 @@ class PositionService:
         
         self.db.commit()
 
-    def _close_position(self, position: Position, exit_price: Decimal, reason: str) -> None:
-        """关闭持仓"""
+    def _close_position(
+        self,
+        position: Position,
+        exit_price: Decimal,
+        reason: str,
+        finalize_manual_plan: bool = True,
+        binance_snapshot: dict[tuple[str, str], BinancePosition] | None = None,
+    ) -> bool:
+        """关闭持仓
+
+        finalize_manual_plan=False 时由调用方在批量平仓后统一调用 _finalize_manual_plans。
+        binance_snapshot 为批量平仓前一次查询的币安持仓 {(symbol, side): 持仓}，提供时不再逐个查询。
+        返回 True 表示本次调用下单平仓并已提交（只有这种情况才需要更新手动计划状态），
+        跳过、等待确认或按外部关闭处理时返回 False。
+        """
+        savepoint = None
+        closing_started = None
         try:
             # 重要：检查持仓状态，避免重复关闭（并行处理可能导致多个线程同时尝试关闭）
             if position.status == PositionStatus.CLOSED:
                 logger.debug("持仓 %s 已经关闭，跳过重复关闭操作", position.id)
-                return
+                return False
             
             position_id = str(position.id)
-            with _closing_lock:
-                if position_id in _closing_positions:
-                    logger.debug("持仓 %s 正在平仓，跳过重复请求", position_id)
-                    return
-                _closing_positions.add(position_id)
+            closing_started = _begin_closing(position_id)
+            if closing_started is None:
+                logger.debug("持仓 {} 正在平仓，跳过重复请求", position_id)
+                return False
+            # 失败时只回滚到这个 SAVEPOINT：整体 rollback 会让会话里其他持仓的已加载状态全部过期
+            savepoint = self.db.begin_nested()
+            # 行锁（FOR UPDATE NOWAIT）下一次性重新读取持仓，确认仍未关闭后立即回滚到内层 SAVEPOINT 释放锁：
+            # 行锁只覆盖这次检查，不会在下单/等待成交的网络 I/O 期间持有；
+            # 之后由 _closing_positions 登记防止本进程重复平仓，后面不必再反复 refresh
+            lock_savepoint = self.db.begin_nested()
             try:
-                # 平仓（反向操作）
-                close_side = "SELL" if position.side == "BUY" else "BUY"
-                
-                # 重要：从币安获取实际持仓数量，而不是使用数据库中的entry_quantity
-                # 因为实际持仓可能已经变化（部分平仓、加仓等）
-                actual_quantity = None
-                position_found_on_binance = False
-                positions_fetch_failed = False
-                binance_positions = self.client.get_positions_from_binance()
+                locked = self.db.scalar(
+                    select(Position)
+                    .where(Position.id == position.id)
+                    .with_for_update(nowait=True)
+                    .execution_options(populate_existing=True)
+                )
+            except OperationalError:
+                # 其他会话正在写这条持仓（同步任务提交中等），本次跳过，下个监控周期重试
+                logger.debug("持仓 {} 正被其他会话锁定，本次跳过平仓，下次检查时重试", position_id)
+                return False
+            finally:
+                lock_savepoint.rollback()
+            if locked is None or position.status == PositionStatus.CLOSED:
+                logger.debug("持仓 {} 已经关闭，跳过重复关闭操作", position_id)
+                return False
+            
+            # 平仓（反向操作）
+            close_side = "SELL" if position.side == "BUY" else "BUY"
+            
+            # 重要：从币安获取实际持仓数量，而不是使用数据库中的entry_quantity
+            # 因为实际持仓可能已经变化（部分平仓、加仓等）
+            actual_quantity = None
+            position_found_on_binance = False
+            positions_fetch_failed = False
+            # 没有传入快照时这里会刚查过一次币安，后面的二次确认可以少查一次
+            fetched_fresh = binance_snapshot is None
+            if binance_snapshot is None:
+                # 单独平仓时只查询该交易对
+                binance_positions = self.client.get_positions_from_binance(position.symbol)
                 if binance_positions is None:
                     positions_fetch_failed = True
                     binance_positions = []
-                for binance_pos in binance_positions:
-                    if (binance_pos["symbol"] == position.symbol and 
-                        binance_pos["side"] == position.side):
-                        actual_quantity = Decimal(str(binance_pos["position_amt"]))
-                        position_found_on_binance = True
-                        logger.info("从币安获取实际持仓数量: %s %s = %s (数据库数量: %s)", 
-                                   position.symbol, position.side, actual_quantity, position.entry_quantity)
-                        break
-                
-                # 如果币安上已经没有这个持仓了，需要判断是系统刚关闭还是外部关闭
-                if not position_found_on_binance:
-                    if positions_fetch_failed:
-                        logger.warning("无法获取币安持仓状态，暂不标记 %s %s 为外部关闭，等待下次检查", 
-                                     position.symbol, position.side)
-                        return
-                    # 再次检查持仓状态（可能在检查币安持仓时，其他线程已经关闭了）
-                    self.db.refresh(position)
-                    if position.status == PositionStatus.CLOSED:
-                        logger.debug("持仓 %s 在检查币安持仓期间已被关闭，跳过重复关闭操作", position.id)
-                        return
-                    
-                    # 检查是否有最近的系统关闭记录（5分钟内）
-                    try:
-                        from app.models.execution_log import ExecutionLog
-                        recent_time = datetime.now(timezone.utc) - timedelta(minutes=5)
-                        recent_close_log = self.db.scalar(
-                            select(ExecutionLog)
-                            .where(ExecutionLog.position_id == position.id)
-                            .where(ExecutionLog.event_type == "position_closed")
-                            .where(ExecutionLog.created_at >= recent_time)
-                            .order_by(ExecutionLog.created_at.desc())
-                            .limit(1)
-                        )
-                        if recent_close_log:
-                            # 有系统关闭记录，说明是系统刚关闭的，使用系统设置的退出原因
-                            payload = recent_close_log.payload or {}
-                            system_reason = payload.get("reason", reason)
-                            logger.info("币安上已无持仓 %s %s，但检测到系统关闭记录（原因: %s），使用系统退出原因", 
-                                      position.symbol, position.side, system_reason)
-                            # 再次检查状态（避免并发问题）
-                            self.db.refresh(position)
-                            if position.status == PositionStatus.CLOSED:
-                                logger.debug("持仓 %s 在检查关闭记录期间已被关闭，跳过重复关闭操作", position.id)
-                                return
-                            reason_used = self._finalize_missing_position(
-                                position,
-                                exit_price if exit_price else (Decimal(str(recent_close_log.price)) if recent_close_log.price else position.entry_price),
-                                default_reason=system_reason,
-                            )
-                            self.db.commit()
-                            log_key_event("INFO", f"持仓 {position.id} 已标记为已关闭（系统关闭，原因: {reason_used}）")
-                            return
-                    except Exception as exc:
-                        logger.debug("检查系统关闭记录失败: %s，继续处理", exc)
-                    
-                    # 没有系统关闭记录，可能是外部手动平仓
-                    # 再次检查状态（避免并发问题）
-                    self.db.refresh(position)
-                    if position.status == PositionStatus.CLOSED:
-                        logger.debug("持仓 %s 在检查期间已被关闭，跳过重复关闭操作", position.id)
-                        return
-                    if not self._confirm_position_absent_on_binance(position.symbol, position.side):
-                        logger.info("再次检查后发现持仓 %s %s 仍存在或无法确认，保持 ACTIVE 状态", position.symbol, position.side)
-                        return
-                    reason_used = self._finalize_missing_position(position, exit_price or position.entry_price, default_reason="external_closed")
-                    self.db.commit()
-                    if reason_used == "external_closed":
-                        log_key_event("INFO", f"持仓 {position.id} 已标记为已关闭（外部关闭）")
+                binance_snapshot = {(bp.symbol, bp.side): bp for bp in binance_positions}
+            binance_pos = binance_snapshot.get((position.symbol, position.side))
+            if binance_pos is not None:
+                actual_quantity = binance_pos.position_amt
+                position_found_on_binance = True
+                logger.info("从币安获取实际持仓数量: {} {} = {} (数据库数量: {})", 
+                           position.symbol, position.side, actual_quantity, position.entry_quantity)
+            
+            # 如果币安上已经没有这个持仓了，需要判断是系统刚关闭还是外部关闭
+            if not position_found_on_binance:
+                if positions_fetch_failed:
+                    logger.warning("无法获取币安持仓状态，暂不标记 %s %s 为外部关闭，等待下次检查", 
+                                 position.symbol, position.side)
+                    return False
+                # 检查是否有最近的系统关闭记录（5分钟内）
+                try:
+                    if self._recent_closes is not None:
+                        recent_close_log = self._recent_closes.get(position.id)
                     else:
-                        log_key_event("INFO", f"持仓 {position.id} 已标记为未执行（未检测到系统成交记录）")
-                    return
+                        recent_close_log = self._load_recent_close_logs([position.id]).get(position.id)
+                    if recent_close_log:
+                        # 有系统关闭记录，说明是系统刚关闭的，使用系统设置的退出原因
+                        payload = recent_close_log.payload or {}
+                        system_reason = payload.get("reason", reason)
+                        logger.info("币安上已无持仓 %s %s，但检测到系统关闭记录（原因: %s），使用系统退出原因", 
+                                  position.symbol, position.side, system_reason)
+                        reason_used = self._finalize_missing_position(
+                            position,
+                            exit_price if exit_price else (Decimal(str(recent_close_log.price)) if recent_close_log.price else position.entry_price),
+                            default_reason=system_reason,
+                        )
+                        self.db.commit()
+                        log_key_event("INFO", "持仓 %s 已标记为已关闭（系统关闭，原因: %s）", position.id, reason_used)
+                        return False
+                except Exception as exc:
+                    logger.debug("检查系统关闭记录失败: %s，继续处理", exc)
                 
-                # 如果无法获取实际数量，使用数据库中的数量
-                if actual_quantity is None or actual_quantity <= 0:
-                    actual_quantity = position.entry_quantity
-                    logger.warning("使用数据库中的持仓数量: %s (可能不准确)", actual_quantity)
+                # 没有系统关闭记录，可能是外部手动平仓
+                if not self._confirm_position_absent_on_binance(
+                    position.symbol, position.side, attempts=1 if fetched_fresh else 2
+                ):
+                    logger.info("再次检查后发现持仓 %s %s 仍存在或无法确认，保持 ACTIVE 状态", position.symbol, position.side)
+                    return False
+                reason_used = self._finalize_missing_position(position, exit_price or position.entry_price, default_reason="external_closed")
+                self.db.commit()
+                if reason_used == "external_closed":
+                    log_key_event("INFO", "持仓 %s 已标记为已关闭（外部关闭）", position.id)
+                else:
+                    log_key_event("INFO", "持仓 %s 已标记为未执行（未检测到系统成交记录）", position.id)
+                return False
+            
+            # 如果无法获取实际数量，使用数据库中的数量
+            if actual_quantity is None or actual_quantity <= 0:
+                actual_quantity = position.entry_quantity
+                logger.warning("使用数据库中的持仓数量: %s (可能不准确)", actual_quantity)
+            
+            # 验证数量是否有效
+            if actual_quantity <= 0:
+                error_msg = f"持仓数量无效: {actual_quantity}，无法平仓"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            
+            # 确保数量精度正确（获取交易对的stepSize并调整）
+            try:
+                symbol_info = self.client.get_symbol_info(position.symbol)
+                step_size = symbol_info.get("stepSize", Decimal("0.1"))
+                # 根据stepSize调整数量精度（10 次幂步长只需一次 quantize）
+                actual_quantity = quantize_to_step(actual_quantity, step_size, symbol_info.get("stepQuantum"))
                 
-                # 验证数量是否有效
+                # 再次验证调整后的数量
                 if actual_quantity <= 0:
-                    error_msg = f"持仓数量无效: {actual_quantity}，无法平仓"
+                    error_msg = f"调整精度后持仓数量无效: {actual_quantity}，无法平仓"
                     logger.error(error_msg)
                     raise ValueError(error_msg)
                 
-                # 确保数量精度正确（获取交易对的stepSize并调整）
-                try:
-                    symbol_info = self.client.get_symbol_info(position.symbol)
-                    step_size = symbol_info.get("stepSize", Decimal("0.1"))
-                    from decimal import ROUND_DOWN
-                    # 根据stepSize调整数量精度
-                    if step_size < 1:
-                        actual_quantity = (actual_quantity / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
-                    else:
-                        actual_quantity = (actual_quantity / step_size).quantize(Decimal("1"), rounding=ROUND_DOWN) * step_size
-                    
-                    # 再次验证调整后的数量
-                    if actual_quantity <= 0:
-                        error_msg = f"调整精度后持仓数量无效: {actual_quantity}，无法平仓"
-                        logger.error(error_msg)
-                        raise ValueError(error_msg)
-                    
-                    logger.info("数量精度已调整: 原始=%s, 调整后=%s, stepSize=%s", 
-                               position.entry_quantity, actual_quantity, step_size)
-                except Exception as exc:
-                    logger.warning("调整数量精度失败: %s，使用原始数量", exc)
-                
-                log_key_event(
-                    "INFO",
-                    f"开始平仓持仓 {position.id} ({position.symbol} {position.side}): 实际数量={actual_quantity}, 方向={close_side}, 原因={reason}",
-                )
-                
-                # 在下单前再次检查持仓状态（避免并发问题）
-                self.db.refresh(position)
-                if position.status == PositionStatus.CLOSED:
-                    logger.debug("持仓 %s 在下单前已被关闭，跳过重复下单", position.id)
-                    return
-                
-                # 使用实际持仓数量平仓，添加 reduceOnly=true 确保这是平仓而不是开新仓
-                # 这样可以避免需要额外的保证金（特别是做空持仓平仓时需要买入的情况）
-                position_side_for_exchange = "LONG" if position.side == "BUY" else "SHORT"
-                result = self.client.place_market_order(
-                    position.symbol,
-                    close_side,
-                    actual_quantity,
-                    reduce_only=True,  # 平仓时使用 reduceOnly，避免需要额外保证金（单向模式）
-                    position_side=position_side_for_exchange,
-                )
+                logger.info("数量精度已调整: 原始=%s, 调整后=%s, stepSize=%s", 
+                           position.entry_quantity, actual_quantity, step_size)
+            except Exception as exc:
+                logger.warning("调整数量精度失败: %s，使用原始数量", exc)
             
-            finally:
-                with _closing_lock:
-                    _closing_positions.discard(position_id)
+            log_key_event(
+                "INFO",
+                "开始平仓持仓 %s (%s %s): 实际数量=%s, 方向=%s, 原因=%s",
+                position.id, position.symbol, position.side, actual_quantity, close_side, reason,
+            )
+            
+            # 使用实际持仓数量平仓，添加 reduceOnly=true 确保这是平仓而不是开新仓
+            # 这样可以避免需要额外的保证金（特别是做空持仓平仓时需要买入的情况）
+            position_side_for_exchange = "LONG" if position.side == "BUY" else "SHORT"
+            result = self.client.place_market_order(
+                position.symbol,
+                close_side,
+                actual_quantity,
+                reduce_only=True,  # 平仓时使用 reduceOnly，避免需要额外保证金（单向模式）
+                position_side=position_side_for_exchange,
+            )
             
             # 记录订单ID
             order_id = result.get("orderId") or result.get("order_id") or str(result.get("clientOrderId", ""))
@@ -712,72 +899,34 @@ class PositionService:
             log_key_event("INFO", "平仓订单已提交: 订单ID=%s, 状态=%s, 结果=%s", order_id, order_status, result)
             
             # 重要：等待订单成交（市价单通常立即成交，但需要确认）
-            # 市价单可能初始返回NEW状态，需要等待并查询
-            import time
-            max_retries = 15  # 增加重试次数（15次 * 0.5秒 = 7.5秒）
-            retry_count = 0
+            # 市价单可能初始返回NEW状态：优先等待用户数据流推送（ORDER_TRADE_UPDATE），
+            # 断线时回退到 REST 轮询，最多等待 7.5 秒
             order_filled = False
             
             # 如果初始状态已经是FILLED，直接处理
-            if order_status in ["FILLED", "COMPLETED"]:
+            if order_status in _CLOSE_FILLED_STATUSES:
                 order_filled = True
                 log_key_event("INFO", "订单立即成交: 订单ID=%s", order_id)
-            else:
-                # 等待订单成交（市价单通常很快成交）
-                # 先等待0.2秒，让订单有时间成交
-                time.sleep(0.2)
-                
-                while retry_count < max_retries:
-                    try:
-                        order_info = self.client.get_order_status(position.symbol, order_id)
-                        order_status = order_info.get("status", order_status)
-                        logger.debug("查询订单状态: 订单ID=%s, 状态=%s (重试 %d/%d)", 
-                                   order_id, order_status, retry_count + 1, max_retries)
-                        
-                        if order_status in ["FILLED", "COMPLETED"]:
-                            # 订单已成交，更新实际成交价格和数量
-                            actual_price = order_info.get("avgPrice") or order_info.get("price") or exit_price
-                            actual_quantity = order_info.get("executedQty") or order_info.get("quantity") or position.entry_quantity
-                            exit_price = Decimal(str(actual_price))
-                            position.exit_quantity = Decimal(str(actual_quantity))
-                            log_key_event("INFO", "订单已成交: 订单ID=%s, 成交价=%s, 成交数量=%s", 
-                                       order_id, exit_price, position.exit_quantity)
-                            order_filled = True
-                            break
-                        elif order_status in ["CANCELED", "REJECTED", "EXPIRED"]:
-                            error_msg = f"订单被取消或拒绝: 状态={order_status}, 订单ID={order_id}"
-                            logger.error(error_msg)
-                            raise ValueError(error_msg)
-                        elif order_status == "NEW":
-                            # 订单还是新状态，继续等待
-                            logger.debug("订单仍为新状态，继续等待: 订单ID=%s", order_id)
-                        else:
-                            # 其他状态（如PARTIALLY_FILLED），继续等待
-                            logger.debug("订单状态: %s, 继续等待: 订单ID=%s", order_status, order_id)
-                            
-                    except Exception as exc:
-                        logger.warning("查询订单状态失败: %s (重试 %d/%d)", exc, retry_count + 1, max_retries)
-                        # 查询失败时，如果是最后一次重试，尝试从原始结果获取信息
-                        if retry_count == max_retries - 1:
-                            # 最后一次重试失败，检查原始结果中是否有成交信息
-                            if result.get("executedQty") and float(result.get("executedQty", 0)) > 0:
-                                # 原始结果中有成交数量，说明订单可能已成交
-                                logger.warning("订单状态查询失败，但原始结果显示有成交: 订单ID=%s, 成交数量=%s", 
-                                             order_id, result.get("executedQty"))
-                                # 尝试使用原始结果
-                                actual_price = result.get("avgPrice") or result.get("price") or exit_price
-                                actual_quantity = result.get("executedQty") or position.entry_quantity
-                                if actual_price and actual_quantity:
-                                    exit_price = Decimal(str(actual_price))
-                                    position.exit_quantity = Decimal(str(actual_quantity))
-                                    order_filled = True
-                                    log_key_event("INFO", "使用原始结果: 订单ID=%s, 成交价=%s, 成交数量=%s", 
-                                             order_id, exit_price, position.exit_quantity)
-                                    break
-                    
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        time.sleep(0.5)  # 等待0.5秒后重试
+            elif order_id:
+                order_info = self.executor.wait_for_order(
+                    position.symbol, str(order_id), _CLOSE_FILLED_STATUSES | _CLOSE_FAILED_STATUSES, _CLOSE_FILL_TIMEOUT
+                )
+                if order_info is not None:
+                    order_status = order_info.get("status", order_status)
+                    logger.debug("订单状态: 订单ID={}, 状态={}", order_id, order_status)
+                    if order_status in _CLOSE_FILLED_STATUSES:
+                        # 订单已成交，更新实际成交价格和数量
+                        actual_price = order_info.get("avgPrice") or order_info.get("price") or exit_price
+                        actual_quantity = order_info.get("executedQty") or order_info.get("quantity") or position.entry_quantity
+                        exit_price = Decimal(str(actual_price))
+                        position.exit_quantity = Decimal(str(actual_quantity))
+                        log_key_event("INFO", "订单已成交: 订单ID=%s, 成交价=%s, 成交数量=%s", 
+                                   order_id, exit_price, position.exit_quantity)
+                        order_filled = True
+                    elif order_status in _CLOSE_FAILED_STATUSES:
+                        error_msg = f"订单被取消或拒绝: 状态={order_status}, 订单ID={order_id}"
+                        logger.error(error_msg)
+                        raise ValueError(error_msg)
             
             # 检查订单是否成交
             if not order_filled:
@@ -808,8 +957,11 @@ class PositionService:
             position.exit_time = datetime.now(timezone.utc)
             position.exit_reason = reason
             
-            # 记录执行日志
-            from app.models.execution_log import ExecutionLog
+            # 记录执行日志（盈亏百分比只用于日志载荷，按 float 计算一次即可）
+            entry_price_f = float(position.entry_price)
+            exit_price_f = float(exit_price)
+            price_move = exit_price_f - entry_price_f if position.side == "BUY" else entry_price_f - exit_price_f
+            pnl_pct = price_move / entry_price_f * 100
             log = ExecutionLog(
                 position_id=position.id,
                 trade_plan_id=position.trade_plan_id,
@@ -823,22 +975,21 @@ class PositionService:
                 status="FILLED",
                 payload={
                     "reason": reason,
-                    "entry_price": float(position.entry_price),
-                    "pnl": float((exit_price - position.entry_price) / position.entry_price * 100) if position.side == "BUY" else float((position.entry_price - exit_price) / position.entry_price * 100),
+                    "entry_price": entry_price_f,
+                    "pnl": pnl_pct,
                 }
             )
             self.db.add(log)
             
             # 更新关联的计划状态
             if position.trade_plan_id:
-                from app.models.trade_plan import TradePlan
-                from app.models.enums import TradePlanStatus
                 plan = self.db.get(TradePlan, position.trade_plan_id)
                 if plan:
                     plan.status = TradePlanStatus.EXITED
                     plan.exit_time = position.exit_time
             # 更新手动计划状态（如果由手动计划触发）
-            self._finalize_manual_plan_if_needed(position.manual_plan_id, position.id)
+            if finalize_manual_plan:
+                self._finalize_manual_plan_if_needed(position.manual_plan_id, position.id)
             
             self.db.commit()
             log_key_event("INFO", "持仓 %s 已关闭，原因: %s", position.id, reason)
@@ -847,26 +998,40 @@ class PositionService:
             if self.settings.websocket_price_enabled:
                 try:
                     # 检查是否还有其他活跃持仓使用该交易对
-                    other_positions = list(self.db.scalars(
-                        select(Position)
+                    # （EXISTS 只问"有没有"，找到第一行就停止，不加载持仓对象）
+                    has_other_positions = self.db.scalar(select(
+                        exists()
                         .where(Position.status == PositionStatus.ACTIVE)
                         .where(Position.symbol == position.symbol)
                         .where(Position.id != position.id)
                     ))
                     
                     # 如果没有其他活跃持仓，取消订阅
-                    if not other_positions:
-                        from app.services.binance_websocket_service import get_websocket_price_service
+                    if not has_other_positions:
                         ws_service = get_websocket_price_service()
                         ws_service.unsubscribe_symbol(position.symbol)
                         logger.info("持仓关闭，已取消WebSocket订阅: {}", position.symbol)
                 except Exception as exc:
                     logger.debug("取消WebSocket订阅失败 ({}): {}", position.symbol, exc)
+            return True
             
         except Exception as exc:
-            logger.error("关闭持仓 %s 失败: %s", position.id, exc)
-            self.db.rollback()
+            logger.error("关闭持仓 {} 失败: {}", position.id, exc)
+            if savepoint is not None and savepoint.is_active:
+                try:
+                    savepoint.rollback()
+                except Exception:
+                    self.db.rollback()
+            else:
+                self.db.rollback()
             raise
+        finally:
+            # 提前返回（已关闭/被锁定/无法确认）时没有任何改动，直接回滚到 SAVEPOINT
+            if savepoint is not None and savepoint.is_active:
+                savepoint.rollback()
+            # 平仓登记保留到提交（或失败回滚）之后：同步任务据此跳过正在平仓的持仓
+            if closing_started is not None:
+                _end_closing(position_id, closing_started)
 
     def get_active_positions(self) -> list[Position]:
         """获取所有活跃持仓"""
@@ -887,8 +1052,11 @@ class PositionService:
             # 每次同步时重新加载系统配置，确保使用最新默认值
             current_settings = get_settings()
             self.settings = current_settings
+            # 本次同步统一使用同一个时间点（退出时间/检查时间/中断判断），不在逐持仓循环里反复取时间
+            sync_now = datetime.now(timezone.utc)
             default_trailing_pct = Decimal(str(current_settings.trailing_exit_pct))
             default_stop_loss_pct = Decimal(str(current_settings.stop_loss_pct))
+            default_max_slippage_pct = Decimal(str(current_settings.max_slippage_pct))
             
             # 从币安获取所有实际持仓
             binance_positions = self.client.get_positions_from_binance()
@@ -899,20 +1067,48 @@ class PositionService:
                 logger.warning("币安API返回None，跳过同步以避免误关闭持仓")
                 return {"created": 0, "updated": 0, "closed": 0}
             
-            # 获取数据库中所有活跃持仓（包括系统和非系统的）
-            all_active_positions = self.get_active_positions()
+            # 币安持仓快照和数据库活跃持仓都与上次完整同步时一致，且未超过完整同步间隔：跳过数据库对账
+            # （最高/最低价由监控任务按实时价格更新，这里不依赖每次同步）
+            binance_fingerprint = hash(tuple(sorted(
+                (bp.symbol, bp.side, bp.position_amt, bp.entry_price) for bp in binance_positions
+            )))
+            fingerprint = (binance_fingerprint, self._active_positions_signature())
+            full_interval = current_settings.position_sync_full_interval
+            with PositionService._sync_state_lock:
+                unchanged = (
+                    full_interval > 0
+                    and fingerprint == PositionService._sync_fingerprint
+                    and time.monotonic() - PositionService._sync_fingerprint_ts < full_interval
+                )
+            if unchanged:
+                logger.debug("币安持仓快照未变化，跳过本次同步")
+                return {"created": 0, "updated": 0, "closed": 0}
             
-            # 检查是否有重复的 (symbol, side) 持仓
+            # 检查是否有重复的 (symbol, side) 持仓：先在数据库里 GROUP BY 判断，
+            # 常见的无重复情况不需要为此加载任何持仓；有重复时只加载重复的那几组
             # 如果有重复，需要合并或关闭多余的持仓
-            position_groups = {}
-            for pos in all_active_positions:
-                key = (pos.symbol, pos.side)
-                if key not in position_groups:
-                    position_groups[key] = []
-                position_groups[key].append(pos)
+            duplicate_keys = self.db.execute(
+                select(Position.symbol, Position.side)
+                .where(Position.status == PositionStatus.ACTIVE)
+                .group_by(Position.symbol, Position.side)
+                .having(func.count() > 1)
+            ).all()
+            position_groups: list[tuple[tuple[str, str], list[Position]]] = []
+            if duplicate_keys:
+                # 数据库按 (symbol, side) 排好序，groupby 顺序切分即可，不需要再逐行 setdefault 建字典
+                duplicate_positions = self.db.scalars(
+                    select(Position)
+                    .where(Position.status == PositionStatus.ACTIVE)
+                    .where(tuple_(Position.symbol, Position.side).in_([tuple(k) for k in duplicate_keys]))
+                    .order_by(Position.symbol, Position.side)
+                )
+                position_groups = [
+                    (key, list(group))
+                    for key, group in groupby(duplicate_positions, key=attrgetter("symbol", "side"))
+                ]
             
             # 处理重复持仓：保留最新的或用户修改过的，关闭其他的
-            for key, positions in position_groups.items():
+            for key, positions in position_groups:
                 if len(positions) > 1:
                     logger.warning("检测到重复持仓: {} {} 有 {} 个活跃持仓，将合并为一个", 
                                  key[0], key[1], len(positions))
@@ -920,19 +1116,11 @@ class PositionService:
                     # 选择要保留的持仓：
                     # 1. 优先保留有用户自定义退出参数的（trailing_exit_pct 或 stop_loss_pct 不等于默认值）
                     # 2. 如果没有，保留最新的（entry_time 最晚的）
-                    settings = self.settings
-                    default_trailing = Decimal(str(settings.trailing_exit_pct))
-                    default_stop_loss = Decimal(str(settings.stop_loss_pct))
-                    
-                    # 辅助函数：比较两个Decimal是否相等（处理精度问题）
-                    def is_decimal_equal(d1, d2, epsilon=Decimal("0.0001")):
-                        return abs(d1 - d2) < epsilon
-
                     # 找出有自定义参数的持仓
                     # 使用宽松比较，防止精度问题导致误判
                     custom_positions = [p for p in positions 
-                                      if not is_decimal_equal(p.trailing_exit_pct, default_trailing) or 
-                                         not is_decimal_equal(p.stop_loss_pct, default_stop_loss)]
+                                      if not _decimal_close(p.trailing_exit_pct, default_trailing_pct) or 
+                                         not _decimal_close(p.stop_loss_pct, default_stop_loss_pct)]
                     
                     if custom_positions:
                         # 保留有自定义参数的持仓（如果有多个，保留最新的）
@@ -951,11 +1139,11 @@ class PositionService:
                         if pos.id != keep_position.id:
                             logger.info("关闭重复持仓 {} (与持仓 {} 重复)", pos.id, keep_position.id)
                             pos.status = PositionStatus.CLOSED
-                            pos.exit_time = datetime.now(timezone.utc)
+                            pos.exit_time = sync_now
                             pos.exit_reason = "duplicate_merged"  # 标记为重复合并
             
             # 如果有重复持仓被关闭，先提交更改
-            if any(len(positions) > 1 for positions in position_groups.values()):
+            if position_groups:
                 self.db.commit()
                 logger.info("已关闭重复持仓，重新获取活跃持仓列表")
             
@@ -968,29 +1156,48 @@ class PositionService:
             logger.debug("开始同步币安持仓: 数据库中有 %d 个活跃持仓（已处理重复），币安API返回 %d 个持仓", 
                         len(db_positions), len(binance_positions))
             
+            # 中断恢复：先为所有可能中断过的持仓并发提交K线请求（各自一次 REST 往返），循环里直接取结果
+            # 中断判定的时间点只算一次，之后直接比较 datetime
+            interrupt_threshold_time = sync_now - timedelta(seconds=_INTERRUPT_THRESHOLD)
+            kline_futures = {}
+            for binance_pos in binance_positions:
+                key = (binance_pos.symbol, binance_pos.side)
+                position = db_positions.get(key)
+                if position is None or position.last_check_time is None:
+                    continue
+                if position.last_check_time >= interrupt_threshold_time:
+                    continue
+                # 计算需要查询的时间范围（从上次检查到现在）
+                start_time_ms, end_time_ms, interval, limit = _kline_recovery_window(position.last_check_time, sync_now)
+                logger.info("从K线数据恢复历史价格: %s %s, 中断时间=%.1f小时, 使用K线间隔=%s, limit=%d", 
+                          key[0], key[1], (end_time_ms - start_time_ms) / (1000 * 3600), interval, limit)
+                kline_futures[key] = self._kline_pool.submit(
+                    self.client.get_klines,
+                    symbol=key[0],
+                    interval=interval,
+                    limit=limit,
+                    start_time=start_time_ms,
+                    end_time=end_time_ms,
+                )
+            
             # 币安实际持仓的键集合（用于检测已关闭的持仓）
             binance_keys = set()
             
             created_count = 0
             updated_count = 0
+            tracking_rows: list[tuple[str, Decimal | None, Decimal | None, datetime]] = []
             
             for binance_pos in binance_positions:
-                symbol = binance_pos["symbol"]
-                side = binance_pos["side"]
+                symbol = binance_pos.symbol
+                side = binance_pos.side
                 key = (symbol, side)
                 binance_keys.add(key)
                 
-                entry_price = binance_pos["entry_price"]
-                entry_quantity = binance_pos["position_amt"]
-                leverage = binance_pos["leverage"]
-                mark_price = binance_pos.get("mark_price", entry_price)  # 获取标记价格（当前价格）
-                update_time = binance_pos.get("update_time", 0)
-                
-                # 将时间戳转换为datetime
-                if update_time > 0:
-                    entry_time = datetime.fromtimestamp(update_time / 1000, tz=timezone.utc)
-                else:
-                    entry_time = datetime.now(timezone.utc)
+                # BinancePosition 在解析 positionRisk 时已转换为 Decimal/int，这里直接使用，不再经 str 重新构造
+                entry_price = binance_pos.entry_price
+                entry_quantity = binance_pos.position_amt
+                leverage = binance_pos.leverage
+                mark_price = binance_pos.mark_price  # 标记价格（当前价格）
                 
                 # 检查数据库中是否已存在
                 if key in db_positions:
@@ -1014,118 +1221,61 @@ class PositionService:
                     if position.entry_quantity != entry_quantity or position.entry_price != entry_price:
                         position.entry_quantity = entry_quantity
                         position.entry_price = entry_price
-                        position.leverage = Decimal(str(leverage))
+                        position.leverage = Decimal(leverage)
                         updated_count += 1
                         logger.debug("更新持仓: {} {} 数量={} 价格={}", symbol, side, entry_quantity, entry_price)
                     
                     # 改进2：检测系统中断（检查 last_check_time）
-                    current_price = Decimal(str(mark_price))
-                    now = datetime.now(timezone.utc)
-                    last_check = position.last_check_time or position.entry_time or now
-                    time_since_last_check = (now - last_check).total_seconds()
-                    INTERRUPT_THRESHOLD = 300  # 5分钟，超过此时间认为可能中断过
-                    is_likely_interrupted = time_since_last_check > INTERRUPT_THRESHOLD
+                    current_price = mark_price
+                    last_check = position.last_check_time or position.entry_time or sync_now
+                    is_likely_interrupted = last_check < interrupt_threshold_time
                     
                     # 改进3：如果检测到中断，尝试从K线数据恢复历史最高/最低价
                     recovered_high = None
                     recovered_low = None
-                    if is_likely_interrupted and position.last_check_time:
+                    kline_future = kline_futures.get(key)
+                    if kline_future is not None:
                         try:
-                            # 计算需要查询的时间范围（从上次检查到现在）
-                            start_time_ms = int(position.last_check_time.timestamp() * 1000)
-                            end_time_ms = int(now.timestamp() * 1000)
-                            
-                            # 根据中断时间动态选择K线精度（精度很重要，滑动退出需要精确的最高/最低价）
-                            time_range_hours = (end_time_ms - start_time_ms) / (1000 * 3600)
-                            if time_range_hours <= 1:
-                                # 1小时内：使用1分钟K线，最多1000条（约16.7小时）
-                                interval = "1m"
-                                limit = 1000
-                            elif time_range_hours <= 8:
-                                # 1-8小时：使用1分钟K线，最多500条（约8.3小时）
-                                interval = "1m"
-                                limit = 500
-                            elif time_range_hours <= 24:
-                                # 8-24小时：使用5分钟K线，最多500条（约41.7小时）
-                                interval = "5m"
-                                limit = 500
-                            else:
-                                # 超过24小时：使用15分钟K线，最多500条（约125小时）
-                                interval = "15m"
-                                limit = 500
-                            
-                            logger.info("从K线数据恢复历史价格: %s %s, 中断时间=%.1f小时, 使用K线间隔=%s, limit=%d", 
-                                      symbol, side, time_range_hours, interval, limit)
-                            
-                            # 获取K线数据（使用动态选择的精度）
-                            klines = self.client.get_klines(
-                                symbol=symbol,
-                                interval=interval,
-                                limit=limit,
-                                start_time=start_time_ms,
-                                end_time=end_time_ms
-                            )
+                            klines = kline_future.result()
                             
                             if klines:
                                 # K线格式：[开盘时间, 开盘价, 最高价, 最低价, 收盘价, ...]
                                 # 提取所有K线的最高价和最低价
-                                kline_highs = [Decimal(str(k[2])) for k in klines]  # 最高价
-                                kline_lows = [Decimal(str(k[3])) for k in klines]   # 最低价
-                                
-                                recovered_high = max(kline_highs) if kline_highs else None
-                                recovered_low = min(kline_lows) if kline_lows else None
+                                recovered_high, recovered_low = _kline_high_low(klines)
                                 
                                 if recovered_high or recovered_low:
                                     logger.info("检测到系统中断（%.1f分钟），从K线数据恢复历史价格: %s %s 最高价=%s 最低价=%s", 
-                                              time_since_last_check / 60, symbol, side,
+                                              (sync_now - last_check).total_seconds() / 60, symbol, side,
                                               recovered_high, recovered_low)
                         except Exception as exc:
                             logger.debug("从K线数据恢复历史价格失败: {}", exc)
                     
-                    # 更新最高价和最低价（优先使用恢复的数据）
-                    price_updated = False
-                    if recovered_high:
-                        # 使用恢复的最高价和当前价格中的较大值
-                        new_high = max(recovered_high, current_price)
-                        if position.highest_price is None or new_high > position.highest_price:
-                            old_highest = position.highest_price
-                            position.highest_price = new_high
-                            price_updated = True
-                            logger.info("恢复持仓 %s (%s) 历史最高价: %s -> %s (从K线数据恢复)", 
+                    # 更新最高价和最低价（优先使用恢复的数据：恢复值与当前价格取极值，没有恢复值时就是当前价格）
+                    old_highest = position.highest_price
+                    old_lowest = position.lowest_price
+                    new_high = max(current_price, recovered_high or current_price)
+                    new_low = min(current_price, recovered_low or current_price)
+                    if old_highest is None or new_high > old_highest:
+                        position.highest_price = new_high
+                        if recovered_high:
+                            logger.info("恢复持仓 {} ({}) 历史最高价: {} -> {} (从K线数据恢复)", 
                                       position.id, symbol, old_highest, new_high)
-                    else:
-                        # 正常更新（使用当前价格）
-                        if position.highest_price is None or current_price > position.highest_price:
-                            old_highest = position.highest_price
-                            position.highest_price = current_price
-                            price_updated = True
-                            if old_highest is not None:
-                                logger.debug("同步时更新持仓 %s (%s) 历史最高价: %s -> %s", 
-                                           position.id, symbol, old_highest, current_price)
-                    
-                    if recovered_low:
-                        # 使用恢复的最低价和当前价格中的较小值
-                        new_low = min(recovered_low, current_price)
-                        if position.lowest_price is None or new_low < position.lowest_price:
-                            old_lowest = position.lowest_price
-                            position.lowest_price = new_low
-                            price_updated = True
-                            logger.info("恢复持仓 %s (%s) 历史最低价: %s -> %s (从K线数据恢复)", 
+                        elif old_highest is not None:
+                            logger.debug("同步时更新持仓 {} ({}) 历史最高价: {} -> {}", 
+                                       position.id, symbol, old_highest, new_high)
+                    if old_lowest is None or new_low < old_lowest:
+                        position.lowest_price = new_low
+                        if recovered_low:
+                            logger.info("恢复持仓 {} ({}) 历史最低价: {} -> {} (从K线数据恢复)", 
                                       position.id, symbol, old_lowest, new_low)
-                    else:
-                        # 正常更新（使用当前价格）
-                        if position.lowest_price is None or current_price < position.lowest_price:
-                            old_lowest = position.lowest_price
-                            position.lowest_price = current_price
-                            price_updated = True
-                            if old_lowest is not None:
-                                logger.debug("同步时更新持仓 %s (%s) 历史最低价: %s -> %s", 
-                                           position.id, symbol, old_lowest, current_price)
+                        elif old_lowest is not None:
+                            logger.debug("同步时更新持仓 {} ({}) 历史最低价: {} -> {}", 
+                                       position.id, symbol, old_lowest, new_low)
                     
                     # 如果检测到中断但无法恢复，记录警告并采用保守策略
                     if is_likely_interrupted and not (recovered_high or recovered_low):
                         logger.warning("检测到系统中断（%.1f分钟），但无法从K线数据恢复历史价格，将采用保守策略", 
-                                     time_since_last_check / 60)
+                                     (sync_now - last_check).total_seconds() / 60)
                         # 保守策略：如果最高/最低价为None，使用入场价初始化（而不是当前价格）
                         if position.highest_price is None:
                             position.highest_price = position.entry_price
@@ -1146,14 +1296,15 @@ class PositionService:
                     was_modified = (old_trailing != saved_trailing_exit_pct or 
                                    old_stop_loss != saved_stop_loss_pct)
                     
-                    # 强制恢复用户自定义的值（无论是否被修改，都确保使用保存的值）
-                    position.trailing_exit_pct = saved_trailing_exit_pct
-                    position.stop_loss_pct = saved_stop_loss_pct
-                    if saved_max_slippage_pct is not None and hasattr(position, "max_slippage_pct"):
+                    # 只在值确实不同时才赋值恢复：赋相同的值也会把持仓标记为脏对象，flush 时还要逐个比对
+                    if (saved_max_slippage_pct is not None and hasattr(position, "max_slippage_pct")
+                            and position.max_slippage_pct != saved_max_slippage_pct):
                         position.max_slippage_pct = saved_max_slippage_pct
                     
-                    # 如果检测到被修改，记录警告
+                    # 如果检测到被修改，恢复用户自定义的值并记录警告
                     if was_modified:
+                        position.trailing_exit_pct = saved_trailing_exit_pct
+                        position.stop_loss_pct = saved_stop_loss_pct
                         logger.warning("同步时检测到持仓 %s (%s) 的退出参数被意外修改，已恢复: 滑动退出 %.2f%% -> %.2f%%, 止损 %.2f%% -> %.2f%%", 
                                      position.id, symbol, 
                                      float(old_trailing) * 100,
@@ -1161,34 +1312,43 @@ class PositionService:
                                      float(old_stop_loss) * 100,
                                      float(saved_stop_loss_pct) * 100)
                     
-                    position.last_check_time = datetime.now(timezone.utc)
+                    position.last_check_time = sync_now
+                    # 最高/最低价和检查时间统一在循环结束后用一条语句写入：
+                    # 这里把内存中的值标记为已提交，避免 flush 时逐行 UPDATE
+                    tracking_rows.append((position.id, position.highest_price, position.lowest_price, sync_now))
+                    for attr in _TRACKING_ATTRS:
+                        set_committed_value(position, attr, getattr(position, attr))
                 else:
                     # 创建新持仓（非系统下单的持仓）
                     # 使用系统默认的止损和滑动退出参数
                     # 注意：对于外部持仓，我们从当前标记价格开始追踪最高/最低价
                     # 虽然无法获取历史最高/最低价，但系统会从此刻开始正确追踪
-                    entry_price_decimal = Decimal(str(entry_price))
-                    mark_price_decimal = Decimal(str(mark_price))
+                    # 将时间戳转换为datetime（只有新建持仓需要入场时间）
+                    update_time = binance_pos.update_time
+                    if update_time > 0:
+                        entry_time = datetime.fromtimestamp(update_time / 1000, tz=timezone.utc)
+                    else:
+                        entry_time = sync_now
                     
                     # 使用标记价格（当前价格）初始化最高/最低价，而不是入场价
                     # 这样可以更准确地反映当前市场状态
-                    initial_high_low = mark_price_decimal
+                    initial_high_low = mark_price
                     
                     position = Position(
                         symbol=symbol,
                         side=side,
                         status=PositionStatus.ACTIVE,
                         is_external=True,  # 标记为非系统下单的持仓
-                        entry_price=entry_price_decimal,
+                        entry_price=entry_price,
                         entry_quantity=entry_quantity,
                         entry_time=entry_time,
-                        leverage=Decimal(str(leverage)),
+                        leverage=Decimal(leverage),
                         trailing_exit_pct=default_trailing_pct,
                         stop_loss_pct=default_stop_loss_pct,
-                        max_slippage_pct=Decimal(str(current_settings.max_slippage_pct)),
+                        max_slippage_pct=default_max_slippage_pct,
                         highest_price=initial_high_low,  # 初始最高价设为当前标记价格（从此刻开始追踪）
                         lowest_price=initial_high_low,  # 初始最低价设为当前标记价格（从此刻开始追踪）
-                        last_check_time=datetime.now(timezone.utc),
+                        last_check_time=sync_now,
                     )
                     self.db.add(position)
                     created_count += 1
@@ -1201,25 +1361,31 @@ class PositionService:
             # 检查币安上已关闭的持仓（数据库中有但币安上没有）
             # 需要更谨慎：只有在确认币安API调用成功且返回了完整数据时才关闭
             closed_count = 0
+            # 所有待确认持仓的最近系统关闭记录一次查询取回（DISTINCT ON 每个持仓只取最新一条），不再逐个查询
+            missing_ids = [
+                position.id
+                for key, position in db_positions.items()
+                if key not in binance_keys and position.status == PositionStatus.ACTIVE
+            ]
+            try:
+                recent_closes = self._load_recent_close_logs(missing_ids, now=sync_now)
+            except Exception as exc:
+                logger.debug("批量查询系统关闭记录失败: {}，继续二次确认流程", exc)
+                recent_closes = {}
             for key, position in db_positions.items():
                 if key not in binance_keys:
                     # 币安上可能已关闭，但需要二次确认以避免误关闭
                     if position.status == PositionStatus.ACTIVE:
+                        # 监控任务正在为它平仓（平仓单刚成交、尚未提交数据库）：交给平仓流程写入结果，下次同步再对账
+                        if _is_closing(position.id):
+                            logger.debug("持仓 {} 正在平仓中，本次同步不处理", position.id)
+                            continue
                         # 重要：检查该持仓是否已经被系统关闭（通过检查执行日志）
                         # 如果系统刚刚自动平仓，可能在币安API同步时已经关闭，不应该误判为外部关闭
                         is_system_closed = False
                         try:
-                            from app.models.execution_log import ExecutionLog
                             # 检查最近5分钟内是否有该持仓的系统关闭记录
-                            recent_time = datetime.now(timezone.utc) - timedelta(minutes=5)
-                            recent_close_log = self.db.scalar(
-                                select(ExecutionLog)
-                                .where(ExecutionLog.position_id == position.id)
-                                .where(ExecutionLog.event_type == "position_closed")
-                                .where(ExecutionLog.created_at >= recent_time)
-                                .order_by(ExecutionLog.created_at.desc())
-                                .limit(1)
-                            )
+                            recent_close_log = recent_closes.get(position.id)
                             if recent_close_log:
                                 # 有系统关闭记录，说明是系统关闭的，无论原因是什么
                                 # 从执行日志的payload中获取退出原因
@@ -1253,12 +1419,12 @@ class PositionService:
                         # 如果确认不存在，才标记为关闭
                         try:
                             # 重新获取该交易对的持仓信息
-                            all_positions = self.client.get_positions_from_binance()
+                            all_positions = self.client.get_positions_from_binance(position.symbol)
                             if all_positions is not None:
                                 # 检查该持仓是否真的不存在
                                 found = False
                                 for bp in all_positions:
-                                    if bp["symbol"] == position.symbol and bp["side"] == position.side:
+                                    if bp.symbol == position.symbol and bp.side == position.side:
                                         found = True
                                         logger.debug("二次确认：持仓 {} {} 在币安上仍存在，保持ACTIVE状态", 
                                                    position.symbol, position.side)
@@ -1266,7 +1432,7 @@ class PositionService:
                                 
                                 if not found:
                                     # 确认不存在，标记为关闭（可能是外部关闭或从未真正成交）
-                                    reason_used = self._finalize_missing_position(position, position.exit_price or position.entry_price, default_reason="external_closed")
+                                    reason_used = self._finalize_missing_position(position, position.exit_price or position.entry_price, default_reason="external_closed", now=sync_now)
                                     closed_count += 1
                                     logger.info("确认持仓已关闭（币安二次确认，原因: %s）: %s %s", 
                                                 reason_used, position.symbol, position.side)
@@ -1282,8 +1448,26 @@ class PositionService:
                             logger.error("二次确认持仓状态失败: {}，保持ACTIVE状态以避免误关闭持仓 {} {}", 
                                        exc, position.symbol, position.side, exc_info=True)
             
+            # 追踪字段的批量 UPDATE 放到提交前最后执行：它会锁住所有活跃持仓行，
+            # 不能在上面逐个二次确认的 REST 请求期间持有这些行锁（否则会阻塞监控任务的平仓）
+            # 只有数据库与币安快照完全对齐时才记录指纹；仍有待确认的持仓则下次继续完整同步
+            # （在提交前判断：提交后这些持仓对象会过期，逐个访问会重新加载）
+            has_unresolved = any(
+                position.status == PositionStatus.ACTIVE
+                for key, position in db_positions.items()
+                if key not in binance_keys
+            )
+            
+            self._bulk_update_tracking(tracking_rows)
             self.db.commit()
             
+            # 数据库签名取本次同步提交后的状态（本次新建/关闭的持仓不应让下次同步误判为有变化）
+            fingerprint = None if has_unresolved else (binance_fingerprint, self._active_positions_signature())
+            with PositionService._sync_state_lock:
+                PositionService._sync_fingerprint = fingerprint
+                if fingerprint is not None:
+                    PositionService._sync_fingerprint_ts = time.monotonic()
+            
             result = {
                 "created": created_count,
                 "updated": updated_count,
@@ -0,0 +1,87 @@
+"""测试公共夹具。
+
+数据库相关的测试需要 PostgreSQL（代码依赖 UPDATE ... FROM VALUES、DISTINCT ON、FOR UPDATE NOWAIT、
+GREATEST/LEAST 等 PG 语法）：设置 TEST_DATABASE_URL 使用已有实例（会清空其中的表）；
+未设置时如果安装了 pgserver（pip install pgserver）则启动一个临时实例；两者都没有时跳过这些测试。
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+# Settings 在导入应用模块前读取环境变量：测试不连接应用的全局引擎，也不启动任何 WebSocket 服务
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg://localhost/unused")
+os.environ["WEBSOCKET_PRICE_ENABLED"] = "false"
+os.environ["USER_DATA_STREAM_ENABLED"] = "false"
+os.environ["BINANCE_API_KEY"] = ""
+os.environ["BINANCE_API_SECRET"] = ""
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.models  # noqa: E402,F401  注册全部模型到 Base.metadata
+from app.db.base import Base  # noqa: E402
+from app.services.binance_service import BinanceFuturesClient  # noqa: E402
+from app.services.position_service import PositionService, _closing_positions  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def pg_url():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip("需要 PostgreSQL：设置 TEST_DATABASE_URL 或安装 pgserver")
+    server = pgserver.get_server(tempfile.mkdtemp(prefix="ye-system-pg-"), cleanup_mode="stop")
+    yield server.get_uri().replace("postgresql://", "postgresql+psycopg://", 1)
+    server.cleanup()
+
+
+@pytest.fixture(scope="session")
+def pg_engine(pg_url):
+    engine = create_engine(pg_url, future=True)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(pg_engine):
+    """与应用相同配置的会话工厂；测试结束后清空所有表"""
+    factory = sessionmaker(bind=pg_engine, autoflush=False, autocommit=False, future=True)
+    yield factory
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_shared_state():
+    """类级别缓存/指纹在测试之间互不影响"""
+    PositionService._sync_fingerprint = None
+    PositionService._sync_fingerprint_ts = 0.0
+    _closing_positions.clear()
+    with BinanceFuturesClient._cache_lock:
+        BinanceFuturesClient._balance_cache.clear()
+        BinanceFuturesClient._klines_cache.clear()
+    yield
+    _closing_positions.clear()
@@ -0,0 +1,80 @@
+"""BinanceFuturesClient 批量下单接口的测试（HTTP 请求用 mock 代替）。"""
+
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.binance_service import BATCH_ORDERS_LIMIT, BinanceFuturesClient
+
+
+def _client() -> BinanceFuturesClient:
+    settings = get_settings().model_copy(update={"binance_api_key": "key", "binance_api_secret": "secret"})
+    return BinanceFuturesClient(settings)
+
+
+def _order(symbol: str) -> dict:
+    return {"symbol": symbol, "side": "BUY", "type": "MARKET", "quantity": Decimal("0.5")}
+
+
+def test_place_batch_orders_rejects_more_than_the_batch_limit():
+    client = _client()
+    with patch.object(client, "_send_request") as send:
+        with pytest.raises(ValueError):
+            client.place_batch_orders([_order(f"S{i}USDT") for i in range(BATCH_ORDERS_LIMIT + 1)])
+    send.assert_not_called()
+
+
+def test_place_batch_orders_returns_per_order_results_in_order():
+    client = _client()
+    results = [
+        {"orderId": 1, "symbol": "AAAUSDT", "status": "NEW"},
+        {"code": -2019, "msg": "Margin is insufficient."},
+    ]
+    response = MagicMock(status_code=200)
+    response.json.return_value = results
+
+    with patch.object(client, "_send_request", return_value=response) as send:
+        assert client.place_batch_orders([_order("AAAUSDT"), _order("BBBUSDT")]) == results
+
+    method, url = send.call_args.args
+    params = send.call_args.kwargs["params"]
+    assert (method, url) == ("POST", "https://fapi.binance.com/fapi/v1/batchOrders")
+    # 币安要求每个订单参数值都是字符串
+    assert json.loads(params["batchOrders"]) == [
+        {"symbol": "AAAUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.5"},
+        {"symbol": "BBBUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.5"},
+    ]
+    assert "signature" in params
+
+
+def test_place_batch_orders_raises_on_http_error():
+    client = _client()
+    response = MagicMock(status_code=400)
+    response.json.return_value = {"code": -1102, "msg": "Mandatory parameter 'batchOrders' was not sent."}
+
+    with patch.object(client, "_send_request", return_value=response):
+        with pytest.raises(ValueError, match="-1102"):
+            client.place_batch_orders([_order("AAAUSDT")])
+
+
+def _kline(open_time: int, high: str, low: str) -> list:
+    return [open_time, "100", high, low, "100", "1"]
+
+
+def test_get_klines_cache_hit_refetches_bars_up_to_the_exact_end_time():
+    client = _client()
+    first = [_kline(0, "101", "99"), _kline(60_000, "102", "98")]
+    # 第二次查询的结束时间落在同一分钟内：缓存之后新出现的价格（最后一根K线被推高）也必须返回
+    tail = [_kline(60_000, "110", "98")]
+    responses = [MagicMock(**{"json.return_value": first}), MagicMock(**{"json.return_value": tail})]
+
+    with patch.object(client, "_send_request", side_effect=responses) as send:
+        assert client.get_klines("BTCUSDT", "1m", 500, start_time=1, end_time=100_000) == first
+        klines = client.get_klines("BTCUSDT", "1m", 500, start_time=1, end_time=110_000)
+
+    assert klines == [first[0], tail[0]]
+    tail_params = send.call_args_list[1].kwargs["params"]
+    assert (tail_params["startTime"], tail_params["endTime"]) == (60_000, 110_000)
@@ -0,0 +1,76 @@
+"""用户数据流订单推送与等待的测试（直接向 _handle_message 输入合成事件，不建立连接）。"""
+
+import json
+
+import pytest
+
+from app.services.binance_user_data_service import (
+    RECENT_ORDER_EVENTS_LIMIT,
+    BinanceUserDataStreamService,
+)
+
+_FILLED = frozenset({"FILLED"})
+
+
+def _order_event(order_id: int, status: str, symbol: str = "BTCUSDT") -> str:
+    return json.dumps({
+        "e": "ORDER_TRADE_UPDATE",
+        "T": 1700000000000,
+        "o": {"s": symbol, "i": order_id, "S": "SELL", "o": "MARKET", "X": status, "ap": "50000", "z": "0.001"},
+    })
+
+
+@pytest.fixture
+def stream() -> BinanceUserDataStreamService:
+    return BinanceUserDataStreamService()
+
+
+def test_event_before_wait_resolves_from_recent_orders(stream):
+    stream._handle_message(_order_event(1, "FILLED"))
+
+    waiter = stream.wait_for_order("1", _FILLED)
+
+    assert waiter.done()
+    order = waiter.result()
+    assert (order["orderId"], order["status"], order["avgPrice"]) == (1, "FILLED", "50000")
+    assert stream.get_status()["pending_orders"] == 0
+
+
+def test_waiter_resolves_only_on_wanted_status(stream):
+    waiter = stream.wait_for_order("7", _FILLED)
+
+    stream._handle_message(_order_event(7, "NEW"))
+    assert not waiter.done()
+    assert stream.get_status()["pending_orders"] == 1
+
+    stream._handle_message(_order_event(7, "FILLED"))
+    assert waiter.result(timeout=0)["status"] == "FILLED"
+    assert stream.get_status()["pending_orders"] == 0
+
+
+def test_recent_orders_evict_oldest_beyond_limit(stream):
+    for order_id in range(RECENT_ORDER_EVENTS_LIMIT + 1):
+        stream._handle_message(_order_event(order_id, "FILLED"))
+
+    assert len(stream._recent_orders) == RECENT_ORDER_EVENTS_LIMIT
+    assert "0" not in stream._recent_orders
+    assert not stream.wait_for_order("0", _FILLED).done()
+    assert stream.wait_for_order(str(RECENT_ORDER_EVENTS_LIMIT), _FILLED).done()
+
+
+def test_cancelled_waiter_is_removed(stream):
+    waiter = stream.wait_for_order("9", _FILLED)
+    assert stream.get_status()["pending_orders"] == 1
+
+    waiter.cancel()
+
+    assert stream.get_status()["pending_orders"] == 0
+    # 取消后才到达的推送不会再尝试完成这个 Future
+    stream._handle_message(_order_event(9, "FILLED"))
+    assert waiter.cancelled()
+
+
+def test_handle_message_reports_expired_listen_key(stream):
+    assert stream._handle_message(json.dumps({"e": "listenKeyExpired"})) is True
+    assert stream._handle_message("not json") is False
+    assert stream._handle_message(json.dumps({"e": "ACCOUNT_UPDATE"})) is False
@@ -0,0 +1,41 @@
+"""WebSocket 标记价格缓存的测试（直接向 _handle_message 输入合成消息，不建立连接）。"""
+
+import json
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from app.services.binance_websocket_service import PRICE_TTL_SECONDS, BinanceWebSocketPriceService
+
+
+@pytest.fixture
+def price_service():
+    service = BinanceWebSocketPriceService()
+    yield service
+    with service._cache_lock:
+        service._price_cache.clear()
+
+
+def _mark_price(symbol: str, price: str) -> str:
+    return json.dumps({"stream": f"{symbol.lower()}@markPrice", "data": {"e": "markPriceUpdate", "s": symbol, "p": price}})
+
+
+def test_get_price_returns_fresh_price(price_service):
+    price_service._handle_message(_mark_price("BTCUSDT", "50000.5"))
+
+    assert price_service.get_price("btcusdt") == Decimal("50000.5")
+    assert price_service.is_price_available("BTCUSDT")
+    assert price_service.get_all_prices() == {"BTCUSDT": Decimal("50000.5")}
+
+
+def test_stale_price_expires_on_read_without_janitor(price_service):
+    # 服务未启动（没有事件循环和清理任务），过期判断只能靠读取时比较时间戳
+    price_service._handle_message(_mark_price("BTCUSDT", "50000.5"))
+    later = time.monotonic() + PRICE_TTL_SECONDS + 1
+
+    with patch("app.services.binance_websocket_service.time.monotonic", return_value=later):
+        assert price_service.get_price("BTCUSDT") is None
+        assert not price_service.is_price_available("BTCUSDT")
+        assert price_service.get_all_prices() == {}
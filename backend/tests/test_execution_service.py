@@ -0,0 +1,202 @@
+"""ExecutionService 的测试：批量执行手动计划（真实 PostgreSQL）与订单等待，币安客户端用 mock 代替。"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import func, select
+
+from app.core.config import get_settings
+from app.models.enums import ManualPlanStatus
+from app.models.execution_log import ExecutionLog
+from app.models.manual_plan import ManualPlan
+from app.models.position import Position
+from app.services.binance_service import BATCH_ORDERS_LIMIT
+from app.services.binance_user_data_service import BinanceUserDataStreamService
+from app.services.execution_service import ExecutionService
+
+
+def _add_plan(session, symbol: str) -> ManualPlan:
+    plan = ManualPlan(
+        symbol=symbol,
+        side="BUY",
+        listing_time=datetime.now(timezone.utc),
+        leverage=Decimal("5"),
+        position_pct=Decimal("0.1"),
+        trailing_exit_pct=Decimal("0.15"),
+        stop_loss_pct=Decimal("0.05"),
+        max_slippage_pct=Decimal("0.5"),
+        status=ManualPlanStatus.EXECUTING,
+    )
+    session.add(plan)
+    session.commit()
+    return plan
+
+
+def _filled(order_id: int, symbol: str, **extra) -> dict:
+    return {"orderId": order_id, "symbol": symbol, "status": "FILLED", "avgPrice": "10", "executedQty": "5", **extra}
+
+
+def _batch_service(db) -> ExecutionService:
+    service = ExecutionService(db)
+    service.client = MagicMock()
+    service.client.get_futures_balance.return_value = Decimal("1000")
+    service.client.get_mark_price.return_value = Decimal("10")
+    service.client.build_market_order_params.side_effect = (
+        lambda symbol, side, quantity: {"symbol": symbol, "side": side, "quantity": str(quantity)}
+    )
+    return service
+
+
+def _position_count(db, plan: ManualPlan) -> int:
+    return db.scalar(select(func.count()).select_from(Position).where(Position.manual_plan_id == plan.id))
+
+
+def test_batch_rolls_back_only_the_plan_whose_records_fail(db):
+    ok_plan = _add_plan(db, "AAAUSDT")
+    bad_plan = _add_plan(db, "BBBUSDT")
+    service = _batch_service(db)
+    # 持仓行已经写入后执行日志的 payload 无法序列化：这个计划的持仓必须随 SAVEPOINT 一起回滚
+    service.client.place_batch_orders.return_value = [
+        _filled(1, "AAAUSDT"),
+        _filled(2, "BBBUSDT", updateTime=object()),
+    ]
+
+    results = service.execute_manual_plans_batch([ok_plan, bad_plan])
+
+    assert results[ok_plan.id] is None
+    assert isinstance(results[bad_plan.id], Exception)
+    db.expire_all()
+    assert _position_count(db, ok_plan) == 1
+    assert _position_count(db, bad_plan) == 0
+    assert db.scalar(select(func.count()).select_from(ExecutionLog)) == 1
+
+
+def test_batch_defers_second_plan_for_the_same_symbol(db):
+    first = _add_plan(db, "AAAUSDT")
+    second = _add_plan(db, "AAA")  # 无 USDT 后缀，规范化后是同一交易对
+    service = _batch_service(db)
+    service.client.place_batch_orders.return_value = [_filled(1, "AAAUSDT")]
+    service.client.place_market_order.return_value = _filled(2, "AAAUSDT")
+
+    results = service.execute_manual_plans_batch([first, second])
+
+    assert results == {first.id: None, second.id: None}
+    (orders,), _ = service.client.place_batch_orders.call_args
+    assert [order["symbol"] for order in orders] == ["AAAUSDT"]
+    service.client.place_market_order.assert_called_once()
+    # 批量成交后余额缓存已丢弃，逐个执行的计划按下单后的余额重新计算数量
+    service.client.invalidate_futures_balance.assert_called()
+    db.expire_all()
+    assert _position_count(db, first) == 1
+    assert _position_count(db, second) == 1
+
+
+
+def test_batch_splits_orders_into_chunks_of_the_batch_limit(db):
+    plans = [_add_plan(db, f"S{i}USDT") for i in range(BATCH_ORDERS_LIMIT + 1)]
+    service = _batch_service(db)
+    service.client.place_batch_orders.side_effect = lambda orders: [
+        _filled(index, order["symbol"]) for index, order in enumerate(orders)
+    ]
+
+    results = service.execute_manual_plans_batch(plans)
+
+    assert results == {plan.id: None for plan in plans}
+    chunk_sizes = [len(call.args[0]) for call in service.client.place_batch_orders.call_args_list]
+    assert chunk_sizes == [BATCH_ORDERS_LIMIT, 1]
+    db.expire_all()
+    assert db.scalar(select(func.count()).select_from(Position)) == len(plans)
+
+
+def test_batch_maps_per_order_error_back_to_its_plan(db):
+    plans = [_add_plan(db, symbol) for symbol in ("AAAUSDT", "BBBUSDT", "CCCUSDT")]
+    service = _batch_service(db)
+    # batchOrders 按提交顺序返回；单个订单失败时对应位置是 {code, msg}
+    service.client.place_batch_orders.side_effect = lambda orders: [
+        {"code": -2019, "msg": "Margin is insufficient."} if order["symbol"] == "BBBUSDT"
+        else _filled(index, order["symbol"])
+        for index, order in enumerate(orders)
+    ]
+
+    results = service.execute_manual_plans_batch(plans)
+
+    assert results[plans[0].id] is None
+    assert results[plans[2].id] is None
+    assert isinstance(results[plans[1].id], ValueError)
+    assert "-2019" in str(results[plans[1].id])
+    db.expire_all()
+    assert [_position_count(db, plan) for plan in plans] == [1, 0, 1]
+
+
+# ---------------------------------------------------------------------------
+# wait_for_order：用户数据流推送优先，断线时回退到 REST 查单
+# ---------------------------------------------------------------------------
+
+_FILLED_ONLY = frozenset({"FILLED"})
+
+
+def _order_event(order_id: int, status: str) -> str:
+    return json.dumps({"e": "ORDER_TRADE_UPDATE", "T": 1, "o": {"s": "BTCUSDT", "i": order_id, "X": status}})
+
+
+def _streaming_service(connected: bool) -> tuple[ExecutionService, BinanceUserDataStreamService]:
+    settings = get_settings().model_copy(update={"user_data_stream_enabled": True})
+    service = ExecutionService(MagicMock(), settings)
+    service.client = MagicMock()
+    stream = BinanceUserDataStreamService(settings)
+    stream._connected = connected
+    return service, stream
+
+
+def test_wait_for_order_returns_pushed_event_without_rest_query():
+    service, stream = _streaming_service(connected=True)
+    timer = threading.Timer(0.05, stream._handle_message, args=(_order_event(42, "FILLED"),))
+
+    with patch("app.services.execution_service.get_user_data_stream_service", return_value=stream):
+        timer.start()
+        order = service.wait_for_order("BTCUSDT", "42", _FILLED_ONLY, 5.0)
+
+    assert order["status"] == "FILLED"
+    service.client.get_order_status.assert_not_called()
+    assert stream.get_status()["pending_orders"] == 0
+
+
+def test_wait_for_order_uses_event_that_arrived_before_waiting():
+    service, stream = _streaming_service(connected=True)
+    stream._handle_message(_order_event(42, "FILLED"))
+
+    with patch("app.services.execution_service.get_user_data_stream_service", return_value=stream):
+        order = service.wait_for_order("BTCUSDT", "42", _FILLED_ONLY, 5.0)
+
+    assert order["orderId"] == 42
+    service.client.get_order_status.assert_not_called()
+
+
+def test_wait_for_order_timeout_queries_rest_once_and_drops_waiter():
+    service, stream = _streaming_service(connected=True)
+    service.client.get_order_status.return_value = {"orderId": 42, "status": "NEW"}
+
+    with patch("app.services.execution_service.get_user_data_stream_service", return_value=stream):
+        order = service.wait_for_order("BTCUSDT", "42", _FILLED_ONLY, 0.05)
+
+    assert order["status"] == "NEW"
+    service.client.get_order_status.assert_called_once_with("BTCUSDT", "42")
+    assert stream.get_status()["pending_orders"] == 0
+
+
+def test_wait_for_order_falls_back_to_rest_polling_when_disconnected():
+    service, stream = _streaming_service(connected=False)
+    service.client.get_order_status.side_effect = [
+        {"orderId": 42, "status": "NEW"},
+        {"orderId": 42, "status": "FILLED"},
+    ]
+
+    with patch("app.services.execution_service.get_user_data_stream_service", return_value=stream):
+        order = service.wait_for_order("BTCUSDT", "42", _FILLED_ONLY, 5.0)
+
+    assert order["status"] == "FILLED"
+    assert service.client.get_order_status.call_count == 2
+    assert stream.get_status()["pending_orders"] == 0
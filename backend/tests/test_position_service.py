@@ -0,0 +1,333 @@
+"""PositionService 手动计划批量完成判断的测试（数据库会话用 mock 代替）。"""
+
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.position_service import PositionService
+
+
+def _service_with_db(db: MagicMock) -> PositionService:
+    service = PositionService.__new__(PositionService)
+    service.db = db
+    return service
+
+
+def _in_list_params(statement) -> list[set]:
+    params = statement.compile(dialect=postgresql.dialect()).params
+    return [set(value) for value in params.values() if isinstance(value, (list, tuple, set, frozenset))]
+
+
+def test_finalize_manual_plans_skips_plan_with_another_active_position():
+    db = MagicMock()
+    # 第一次查询：仍有活跃持仓的计划；第二次：UPDATE ... RETURNING 返回被完成的计划
+    db.scalars.side_effect = [iter(["plan-a"]), iter(["plan-b"])]
+    service = _service_with_db(db)
+
+    service._finalize_manual_plans({"plan-a", "plan-b"})
+
+    assert db.scalars.call_count == 2
+    update_stmt = db.scalars.call_args_list[1].args[0]
+    in_lists = _in_list_params(update_stmt)
+    assert {"plan-b"} in in_lists
+    assert not any("plan-a" in values for values in in_lists)
+    db.commit.assert_called_once()
+
+
+def test_finalize_manual_plans_does_nothing_when_every_plan_still_active():
+    db = MagicMock()
+    db.scalars.side_effect = [iter(["plan-a"])]
+    service = _service_with_db(db)
+
+    service._finalize_manual_plans({"plan-a"})
+
+    assert db.scalars.call_count == 1
+    db.commit.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# 以下测试在真实 PostgreSQL 上运行（见 conftest.py 的 pg_url），币安客户端用 mock 代替
+# ---------------------------------------------------------------------------
+
+import uuid  # noqa: E402
+from datetime import datetime, timedelta, timezone  # noqa: E402
+from decimal import Decimal  # noqa: E402
+from unittest.mock import patch  # noqa: E402
+
+from sqlalchemy import select  # noqa: E402
+
+from app.models.enums import PositionStatus  # noqa: E402
+from app.models.execution_log import ExecutionLog  # noqa: E402
+from app.models.position import Position  # noqa: E402
+from app.services.binance_service import BinancePosition  # noqa: E402
+from app.services.position_service import (  # noqa: E402
+    _CLOSING_STALE_AFTER,
+    _begin_closing,
+    _closing_positions,
+    _end_closing,
+    _is_closing,
+)
+
+
+def _add_position(session, **overrides) -> str:
+    now = datetime.now(timezone.utc)
+    values = dict(
+        id=str(uuid.uuid4()),
+        symbol="BTCUSDT",
+        side="BUY",
+        status=PositionStatus.ACTIVE,
+        entry_price=Decimal("100"),
+        entry_quantity=Decimal("1"),
+        entry_time=now - timedelta(minutes=1),
+        leverage=Decimal("5"),
+        trailing_exit_pct=Decimal("0.15"),
+        stop_loss_pct=Decimal("0.05"),
+        max_slippage_pct=Decimal("0.5"),
+        highest_price=Decimal("100"),
+        lowest_price=Decimal("100"),
+        last_check_time=now,
+    )
+    values.update(overrides)
+    session.add(Position(**values))
+    session.commit()
+    return values["id"]
+
+
+def _binance_position(symbol="BTCUSDT", side="BUY", amount="1", entry="100", mark="100") -> BinancePosition:
+    return BinancePosition(
+        symbol=symbol,
+        side=side,
+        position_side="BOTH",
+        position_amt=Decimal(amount),
+        entry_price=Decimal(entry),
+        mark_price=Decimal(mark),
+        unrealized_profit=Decimal("0"),
+        leverage=5,
+        update_time=0,
+    )
+
+
+def _pg_service(db) -> PositionService:
+    service = PositionService(db)
+    service.client = MagicMock()
+    service.client.get_symbol_info.return_value = {"stepSize": Decimal("0.001")}
+    return service
+
+
+def _filled(order_id=1, price="90", qty="1") -> dict:
+    return {"orderId": order_id, "status": "FILLED", "avgPrice": price, "executedQty": qty}
+
+
+def test_close_position_skips_row_locked_by_another_session(db, session_factory):
+    position_id = _add_position(db)
+    service = _pg_service(db)
+    position = db.get(Position, position_id)
+    other = session_factory()
+    try:
+        other.execute(select(Position).where(Position.id == position_id).with_for_update())
+
+        assert service._close_position(position, Decimal("90"), "stop_loss") is False
+    finally:
+        other.rollback()
+        other.close()
+
+    service.client.place_market_order.assert_not_called()
+    assert position_id not in _closing_positions
+    db.expire_all()
+    assert db.get(Position, position_id).status == PositionStatus.ACTIVE
+
+
+def test_close_position_releases_row_lock_before_placing_order(db, session_factory):
+    position_id = _add_position(db)
+    service = _pg_service(db)
+    service.client.get_positions_from_binance.return_value = [_binance_position()]
+    lock_acquired = []
+
+    def place_market_order(*args, **kwargs):
+        # 下单（网络 I/O）期间其他会话必须能立即拿到这一行的锁
+        other = session_factory()
+        try:
+            other.execute(
+                select(Position.id).where(Position.id == position_id).with_for_update(nowait=True)
+            )
+            lock_acquired.append(True)
+        finally:
+            other.rollback()
+            other.close()
+        return _filled()
+
+    service.client.place_market_order.side_effect = place_market_order
+
+    assert service._close_position(db.get(Position, position_id), Decimal("90"), "stop_loss") is True
+
+    assert lock_acquired == [True]
+    assert position_id not in _closing_positions
+    db.expire_all()
+    position = db.get(Position, position_id)
+    assert position.status == PositionStatus.CLOSED
+    assert position.exit_price == Decimal("90")
+    logs = db.scalars(select(ExecutionLog).where(ExecutionLog.position_id == position_id)).all()
+    assert [log.event_type for log in logs] == ["position_closed"]
+
+
+def test_monitor_closes_duplicate_positions_with_a_single_order(db):
+    first_id = _add_position(db)
+    second_id = _add_position(db)
+    service = _pg_service(db)
+    service.client.get_mark_prices_batch.return_value = {"BTCUSDT": Decimal("90")}
+    # 不带交易对的批量快照里还有持仓；第一笔平仓后按交易对重新查询时已经没有了
+    service.client.get_positions_from_binance.side_effect = (
+        lambda symbol=None: [_binance_position(mark="90")] if symbol is None else []
+    )
+    service.client.place_market_order.return_value = _filled()
+
+    service.monitor_positions(sync_from_binance=False)
+
+    service.client.place_market_order.assert_called_once()
+    db.expire_all()
+    statuses = {db.get(Position, pid).status for pid in (first_id, second_id)}
+    assert statuses == {PositionStatus.CLOSED}
+
+
+def test_sync_skips_unchanged_snapshot_until_database_changes(db, session_factory):
+    _add_position(db)
+    service = _pg_service(db)
+    service.client.get_positions_from_binance.return_value = [_binance_position()]
+
+    with patch.object(service, "get_active_positions", wraps=service.get_active_positions) as full_sync:
+        service.sync_positions_from_binance()
+        service.sync_positions_from_binance()
+        assert full_sync.call_count == 1
+
+        # 其他会话（执行服务）新建的持仓改变数据库签名，即使币安快照相同也要完整同步
+        other = session_factory()
+        try:
+            _add_position(other, symbol="ETHUSDT")
+        finally:
+            other.close()
+        service.sync_positions_from_binance()
+        assert full_sync.call_count == 2
+
+
+def test_sync_does_not_hold_row_locks_during_missing_position_recheck(db, session_factory):
+    tracked_id = _add_position(db)
+    _add_position(db, symbol="ETHUSDT")
+    service = _pg_service(db)
+    lock_acquired = []
+
+    def get_positions(symbol=None):
+        if symbol is None:
+            return [_binance_position(mark="105")]
+        # 二次确认的 REST 请求期间，监控任务的平仓必须能立即锁住仍在币安上的持仓
+        other = session_factory()
+        try:
+            other.execute(
+                select(Position.id).where(Position.id == tracked_id).with_for_update(nowait=True)
+            )
+            lock_acquired.append(symbol)
+        finally:
+            other.rollback()
+            other.close()
+        return []
+
+    service.client.get_positions_from_binance.side_effect = get_positions
+
+    result = service.sync_positions_from_binance()
+
+    assert lock_acquired == ["ETHUSDT"]
+    assert result["closed"] == 1
+    db.expire_all()
+    assert db.get(Position, tracked_id).highest_price == Decimal("105")
+
+
+def test_bulk_update_tracking_updates_only_listed_rows(db):
+    updated_id = _add_position(db)
+    untouched_id = _add_position(db, symbol="ETHUSDT")
+    service = _pg_service(db)
+    checked_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+    service._bulk_update_tracking([(updated_id, Decimal("120"), Decimal("95"), checked_at)])
+    db.commit()
+
+    db.expire_all()
+    updated = db.get(Position, updated_id)
+    assert (updated.highest_price, updated.lowest_price, updated.last_check_time) == (
+        Decimal("120"), Decimal("95"), checked_at,
+    )
+    untouched = db.get(Position, untouched_id)
+    assert (untouched.highest_price, untouched.lowest_price) == (Decimal("100"), Decimal("100"))
+    assert untouched.last_check_time != checked_at
+
+
+def test_bulk_update_tracking_never_moves_watermarks_backwards(db, session_factory):
+    raised_id = _add_position(db)
+    unset_id = _add_position(db, symbol="ETHUSDT", highest_price=None, lowest_price=None)
+    service = _pg_service(db)
+    # 写入前另一个会话（监控任务）已把最高价推高、最低价压低
+    other = session_factory()
+    try:
+        other.get(Position, raised_id).highest_price = Decimal("130")
+        other.get(Position, raised_id).lowest_price = Decimal("80")
+        other.commit()
+    finally:
+        other.close()
+    checked_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+    service._bulk_update_tracking([
+        (raised_id, Decimal("120"), Decimal("95"), checked_at),
+        (unset_id, Decimal("101"), Decimal("99"), checked_at),
+    ])
+    db.commit()
+
+    db.expire_all()
+    raised = db.get(Position, raised_id)
+    assert (raised.highest_price, raised.lowest_price, raised.last_check_time) == (
+        Decimal("130"), Decimal("80"), checked_at,
+    )
+    # 库中为 NULL 时直接写入新值（GREATEST/LEAST 忽略 NULL）
+    unset = db.get(Position, unset_id)
+    assert (unset.highest_price, unset.lowest_price) == (Decimal("101"), Decimal("99"))
+
+
+def test_sync_does_not_revert_highest_price_raised_by_monitor(db, session_factory):
+    tracked_id = _add_position(db)
+    _add_position(db, symbol="ETHUSDT")
+    service = _pg_service(db)
+
+    def get_positions(symbol=None):
+        if symbol is None:
+            return [_binance_position(mark="105")]
+        # 同步已按加载时的最高价算好写入值，此时监控任务提交了更高的最高价
+        other = session_factory()
+        try:
+            other.get(Position, tracked_id).highest_price = Decimal("112")
+            other.commit()
+        finally:
+            other.close()
+        return []
+
+    service.client.get_positions_from_binance.side_effect = get_positions
+
+    service.sync_positions_from_binance()
+
+    db.expire_all()
+    assert db.get(Position, tracked_id).highest_price == Decimal("112")
+
+
+def test_begin_closing_rejects_fresh_registration_and_takes_over_stale_one():
+    first = _begin_closing("p1")
+    assert first is not None
+    assert _begin_closing("p1") is None
+    assert _is_closing("p1")
+
+    # 平仓线程崩溃后登记一直没有移除：超过有效期后不再阻止平仓
+    _closing_positions["p1"] = first - _CLOSING_STALE_AFTER - 1
+    assert not _is_closing("p1")
+    second = _begin_closing("p1")
+    assert second is not None
+
+    # 失效登记的原持有者结束时不能移除接管后的登记
+    _end_closing("p1", first - _CLOSING_STALE_AFTER - 1)
+    assert _is_closing("p1")
+    _end_closing("p1", second)
+    assert "p1" not in _closing_positions